@@ -0,0 +1,228 @@
+# benchmarks/bench_db.py
+"""
+Бенчмарк запросов к базе на синтетической истории разного размера (см. datagen.py).
+
+Для каждого масштаба создается временная база, наполняется генератором с
+фиксированным seed и замеряются отчеты, статус смены, закрытие смены и задачи
+планировщика. "Сейчас" заморожено на вечер последнего дня истории, кэш отчетов
+сбрасывается перед каждым замером — меряем путь до базы, а не попадание в кэш.
+Рассылка в задачах идет в пустой бот без лимитов Telegram.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_db --scales small,medium --out bench.json
+    python -m benchmarks.bench_db --out new.json --baseline bench.json --threshold 0.25
+
+С --baseline сравнивает медианы с прошлым прогоном и завершается с кодом 1,
+если что-то стало медленнее больше чем на threshold.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from unittest.mock import patch
+
+import database as db
+from benchmarks.datagen import DataSet, DataSpec, generate
+from scheduler import jobs
+from scheduler.broadcast import Broadcaster
+
+SCALES: Dict[str, DataSpec] = {
+    "small": DataSpec(users=10, roles=3, years=1),
+    "medium": DataSpec(users=50, roles=5, years=2),
+    "large": DataSpec(users=200, roles=8, years=3),
+}
+REPEAT = 20
+THRESHOLD = 0.2
+# Разница меньше этого считается шумом, как бы ни вырос процент
+MIN_DELTA_MS = 0.05
+
+
+class _NullBot:
+    async def send_message(self, chat_id, text, **kwargs):
+        return None
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "median_ms": round(statistics.median(ms), 4),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        "min_ms": round(ms[0], 4),
+        "runs": len(ms),
+    }
+
+
+async def _measure(op: Callable[[], Awaitable], repeat: int,
+                   setup: Optional[Callable[[], Awaitable]] = None) -> Dict[str, float]:
+    samples = []
+    for i in range(repeat + 1):
+        db.current_shard().report_cache.clear()
+        if setup is not None:
+            await setup()
+        started = time.perf_counter()
+        await op()
+        if i:  # первый прогон — прогрев
+            samples.append(time.perf_counter() - started)
+    return _stats(samples)
+
+
+def _operations(data: DataSet, rnd: random.Random):
+    """[(имя, операция, подготовка)]: подготовка в замер не входит."""
+    end = data.spec.end_day
+    month = (end.replace(day=1), end)
+    year = (end - timedelta(days=364), end)
+    idle = [uid for uid in data.user_ids if uid not in set(data.open_user_ids)] or data.user_ids
+    any_user = functools.partial(rnd.choice, data.user_ids)
+    idle_user = functools.partial(rnd.choice, idle)
+    bot = _NullBot()
+    state = {}
+
+    async def start_idle():
+        state["uid"] = idle_user()
+        await db.record_shift_start(state["uid"], 1)
+
+    async def reopen():
+        for uid in data.open_user_ids:
+            await db.record_shift_start(uid, 1)
+
+    return [
+        ("get_user_shifts_report.month", lambda: db.get_user_shifts_report(any_user(), *month), None),
+        ("get_user_shifts_report.year", lambda: db.get_user_shifts_report(any_user(), *year), None),
+        ("get_total_summary_report.month", lambda: db.get_total_summary_report(*month), None),
+        ("get_total_summary_report.year", lambda: db.get_total_summary_report(*year), None),
+        ("get_shift_status", lambda: db.get_shift_status(any_user()), None),
+        ("close_shift", lambda: db.close_shift(state["uid"]), start_idle),
+        ("jobs.remind_end_shift", lambda: jobs.remind_end_shift(bot), None),
+        ("jobs.cron_auto_close_shifts", lambda: jobs.cron_auto_close_shifts(bot), reopen),
+    ]
+
+
+async def run_scale(spec: DataSpec, repeat: int = REPEAT) -> Dict[str, object]:
+    """Замеры одного масштаба на свежей временной базе."""
+    evening = datetime.combine(spec.end_day, datetime.min.time()).replace(hour=19)
+    with tempfile.TemporaryDirectory() as tmp, \
+            patch.object(db, "DB_NAME", os.path.join(tmp, "bench.db")), \
+            patch.object(jobs, "Broadcaster", functools.partial(Broadcaster, global_rate=1e9)):
+        db.configure_locations([])
+        db.locale_cache.clear()
+        db.day_prefix.clear()
+        db.report_cache.clear()
+        with patch.object(db, "get_now", return_value=db.TZ.localize(evening)):
+            await db.init_db()
+            await db.init_pool()
+            try:
+                started = time.perf_counter()
+                data = await generate(spec)
+                generated = time.perf_counter() - started
+                await db.load_day_prefix(force=True)
+                rnd = random.Random(spec.seed)
+                ops = {name: await _measure(op, repeat, setup) for name, op, setup in _operations(data, rnd)}
+            finally:
+                await db.close_pool()
+                db.day_prefix.clear()
+                db.report_cache.clear()
+    return {"spec": spec.as_dict(), "data": data.as_dict(), "generate_s": round(generated, 2), "ops": ops}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+async def run(scales: List[str], repeat: int = REPEAT) -> Dict[str, object]:
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "repeat": repeat,
+        },
+        "scales": {name: await run_scale(SCALES[name], repeat) for name in scales},
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = THRESHOLD) -> List[dict]:
+    """
+    Сравнивает медианы операций, которые есть в обоих прогонах.
+    Возвращает строки [{scale, op, base_ms, new_ms, ratio, regression}, ...].
+    """
+    rows = []
+    for scale, result in current["scales"].items():
+        base_ops = baseline["scales"].get(scale, {}).get("ops", {})
+        for op, stats in result["ops"].items():
+            if op not in base_ops:
+                continue
+            base, new = base_ops[op]["median_ms"], stats["median_ms"]
+            ratio = new / base if base else float("inf")
+            rows.append({
+                "scale": scale, "op": op, "base_ms": base, "new_ms": new, "ratio": round(ratio, 3),
+                "regression": ratio > 1 + threshold and new - base > MIN_DELTA_MS,
+            })
+    return rows
+
+
+def _print_results(results: dict):
+    for scale, result in results["scales"].items():
+        data = result["data"]
+        print(f"\n{scale}: {data['users']} сотрудников, {data['shifts']} смен, "
+              f"{data['manual']} корректировок, {data['open_shifts']} открытых "
+              f"(генерация {result['generate_s']} с)")
+        for op, s in result["ops"].items():
+            print(f"  {op:<34} медиана {s['median_ms']:9.3f} мс   p95 {s['p95_ms']:9.3f} мс")
+
+
+def _print_comparison(rows: List[dict]):
+    print("\nСравнение с базовым прогоном:")
+    for r in rows:
+        mark = "  РЕГРЕССИЯ" if r["regression"] else ""
+        print(f"  {r['scale']:<7} {r['op']:<34} {r['base_ms']:9.3f} → {r['new_ms']:9.3f} мс  "
+              f"x{r['ratio']:.2f}{mark}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк запросов к базе")
+    parser.add_argument("--scales", default="small,medium",
+                        help=f"через запятую, из: {', '.join(SCALES)}")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="замеров на операцию")
+    parser.add_argument("--out", help="куда сохранить результаты (JSON)")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="допустимое замедление медианы, доля (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        parser.error(f"неизвестный масштаб: {', '.join(unknown)}")
+
+    results = asyncio.run(run(scales, args.repeat))
+    _print_results(results)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            rows = compare(json.load(f), results, args.threshold)
+        _print_comparison(rows)
+        if any(r["regression"] for r in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
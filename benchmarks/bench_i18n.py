@@ -0,0 +1,51 @@
+# benchmarks/bench_i18n.py
+"""
+Микробенчмарк LocaleManager.get: рендер через Fluent против кэша.
+
+Запуск из корня репозитория: python -m benchmarks.bench_i18n
+"""
+import timeit
+
+from middlewares.locales_manager import i18n
+
+STATIC_KEYS = [
+    "button_start_shift", "button_end_shift", "button_my_stats",
+    "button_admin_panel", "admin_panel_welcome", "stats_button_week",
+]
+NUMBER = 20_000
+
+
+def _static_uncached():
+    for key in STATIC_KEYS:
+        i18n._render(key, "ru", {})
+
+
+def _static_cached():
+    for key in STATIC_KEYS:
+        i18n.get(key, locale="ru")
+
+
+def _args_uncached():
+    i18n._render("welcome", "ru", {"user_name": "Ана"})
+
+
+def _args_cached():
+    i18n.get("welcome", locale="ru", user_name="Ана")
+
+
+def _report(name, uncached, cached, calls_per_run):
+    t_raw = timeit.timeit(uncached, number=NUMBER)
+    t_hot = timeit.timeit(cached, number=NUMBER)
+    per_call = 1e6 / (NUMBER * calls_per_run)
+    print(f"{name:<12} fluent: {t_raw * per_call:7.2f} мкс/вызов   "
+          f"кэш: {t_hot * per_call:7.2f} мкс/вызов   x{t_raw / t_hot:.1f}")
+
+
+def main():
+    _report("без аргументов", _static_uncached, _static_cached, len(STATIC_KEYS))
+    _report("с аргументами", _args_uncached, _args_cached, 1)
+    print(i18n.cache_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+# benchmarks/bench_load.py
+"""
+Нагрузочный прогон бота целиком: тот же Dispatcher, что в main.main() (роутеры,
+LocationMiddleware, SimpleI18nMiddleware, SQLiteStorage), получает синтетические
+обновления через dp.feed_update от тысяч сотрудников и нескольких админов.
+Вместо Telegram — сессия, которая только записывает вызовы API (с необязательной
+задержкой), так что меряется сам бот: хендлеры, middleware и база.
+
+Сценарий сотрудника: /start (и выбор должностей, если их нет), начать смену,
+статистика за неделю и месяц, закончить смену. Админ: панель, отчет за месяц,
+общий итог, отчет по сотруднику. Часы идут от 09:00 следующего за историей дня.
+
+Отчет: пропускная способность, p50/p95/p99 по хендлерам и доля времени,
+проведенного в базе (от запроса соединения из пула до его возврата), отдельно —
+сколько из нее ушло на ожидание свободного соединения.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_load --users 2000 --admins 5 --years 1 --out load.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.enums import ParseMode
+from aiogram.types import Chat, Message, Update
+
+import database as db
+from benchmarks.datagen import END_DAY, DataSpec, generate
+from config import BotConfig
+from handlers import user_handlers
+from middlewares.locales_manager import i18n
+
+TOKEN = "42:TEST"
+USERS = 1000
+ADMINS = 5
+CONCURRENCY = 100
+
+
+class RecordingSession(AiohttpSession):
+    """Сессия Bot API без сети: считает вызовы и отвечает "успехом" через latency секунд."""
+
+    def __init__(self, latency: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = 0
+
+    async def make_request(self, bot: Bot, method, timeout: Optional[int] = None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method.__returning__ is bool:
+            return True
+        self._message_ids += 1
+        chat = Chat(id=getattr(method, "chat_id", None) or 0, type="private")
+        return Message(message_id=self._message_ids, date=datetime.now(), chat=chat,
+                       text=getattr(method, "text", None)).as_(bot)
+
+
+class _Sample:
+    """Одно обновление: какой хендлер его обработал и сколько времени ушло на базу."""
+
+    def __init__(self):
+        self.handler = "unhandled"
+        self.db_time = 0.0  # с ожиданием соединения из пула
+        self.db_wait = 0.0  # только ожидание
+        self.open = True
+
+
+_sample: ContextVar[Optional[_Sample]] = ContextVar("load_sample", default=None)
+
+
+class HandlerNameMiddleware:
+    async def __call__(self, handler, event, data):
+        sample = _sample.get()
+        if sample is not None:
+            sample.handler = data["handler"].callback.__name__
+        return await handler(event, data)
+
+
+def _timed_connect(connect):
+    @asynccontextmanager
+    async def timed():
+        started = acquired = time.perf_counter()
+        try:
+            async with connect() as conn:
+                acquired = time.perf_counter()
+                yield conn
+        finally:
+            sample = _sample.get()
+            # Фоновые задачи (запись FSM) наследуют контекст уже завершенного обновления
+            if sample is not None and sample.open:
+                sample.db_time += time.perf_counter() - started
+                sample.db_wait += acquired - started
+    return timed
+
+
+def _percentile(ms: List[float], q: float) -> float:
+    return round(ms[max(0, math.ceil(q * len(ms)) - 1)], 3)
+
+
+class LoadRun:
+    def __init__(self, dp: Dispatcher, bot: Bot, concurrency: int = CONCURRENCY, seed: int = 1):
+        self.dp = dp
+        self.bot = bot
+        self._slots = asyncio.Semaphore(concurrency)
+        self._rnd = random.Random(seed)
+        self._ids = 0
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.db_time: Dict[str, float] = defaultdict(float)
+        self.db_wait: Dict[str, float] = defaultdict(float)
+        self.errors: Counter = Counter()
+
+    # --- Обновления ---
+
+    def _update(self, user_id: int, text: Optional[str] = None, data: Optional[str] = None) -> Update:
+        self._ids += 1
+        user = {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "language_code": "ru"}
+        message = {"message_id": self._ids, "date": int(time.time()), "text": text,
+                   "chat": {"id": user_id, "type": "private"}, "from": user}
+        if text and text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        raw = {"update_id": self._ids}
+        if data is None:
+            raw["message"] = message
+        else:
+            raw["callback_query"] = {"id": str(self._ids), "from": user, "chat_instance": "1",
+                                     "message": message, "data": data}
+        return Update.model_validate(raw, context={"bot": self.bot})
+
+    async def send(self, user_id: int, text: Optional[str] = None, data: Optional[str] = None):
+        update = self._update(user_id, text, data)
+        sample = _Sample()
+        async with self._slots:
+            token = _sample.set(sample)
+            started = time.perf_counter()
+            try:
+                result = await self.dp.feed_update(self.bot, update)
+                if result is UNHANDLED:
+                    sample.handler = "unhandled"
+            except Exception as e:
+                self.errors[f"{sample.handler}: {type(e).__name__}"] += 1
+            finally:
+                elapsed = time.perf_counter() - started
+                sample.open = False
+                _sample.reset(token)
+        self.latency[sample.handler].append(elapsed)
+        self.db_time[sample.handler] += sample.db_time
+        self.db_wait[sample.handler] += sample.db_wait
+
+    async def press(self, user_id: int, key: str):
+        await self.send(user_id, text=i18n.get(key, locale="ru"))
+
+    # --- Сценарии ---
+
+    async def employee(self, user_id: int, rounds: int = 1):
+        await self.send(user_id, "/start")
+        roles = [r[0] for r in await db.get_user_roles(user_id)]
+        if not roles:
+            roles = self._rnd.sample([1, 2, 3], k=self._rnd.randint(1, 2))
+            for role_id in roles:
+                await self.send(user_id, data=f"setup_toggle_role_{role_id}")
+            await self.send(user_id, data="setup_finish_roles")
+        for _ in range(rounds):
+            await self.press(user_id, "button_start_shift")
+            if len(roles) > 1:
+                await self.send(user_id, data=f"start_with_role:{self._rnd.choice(roles)}")
+            await self.press(user_id, "button_my_stats")
+            await self.send(user_id, data="usr_st:week")
+            await self.send(user_id, data="usr_st:month")
+            await self.press(user_id, "button_end_shift")
+
+    async def admin(self, user_id: int, employee_ids: List[int], rounds: int = 1):
+        await self.employee(user_id)
+        for _ in range(rounds):
+            await self.press(user_id, "button_admin_panel")
+            await self.send(user_id, data="admin_rep:month")
+            await self.send(user_id, data="total_view:month")
+            await self.send(user_id, data=f"view_rep:month:{self._rnd.choice(employee_ids)}")
+            await self.send(user_id, data="total_view:week")
+
+    async def run(self, employee_ids: List[int], admin_ids: List[int], rounds: int = 1) -> Dict[str, object]:
+        """Все сценарии одновременно; в обработке не больше concurrency обновлений."""
+        calls = getattr(self.bot.session, "calls", Counter())
+        calls_before = Counter(calls)
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(self.employee(uid, rounds) for uid in employee_ids),
+            *(self.admin(uid, employee_ids, rounds) for uid in admin_ids),
+        )
+        wall = time.perf_counter() - started
+        return self.report(wall, calls - calls_before)
+
+    def report(self, wall: float, api_calls: Counter) -> Dict[str, object]:
+        handlers = {}
+        for name, samples in sorted(self.latency.items()):
+            ms = sorted(s * 1000 for s in samples)
+            handlers[name] = {
+                "count": len(ms),
+                "p50_ms": _percentile(ms, 0.50),
+                "p95_ms": _percentile(ms, 0.95),
+                "p99_ms": _percentile(ms, 0.99),
+                "db_ms_mean": round(self.db_time[name] * 1000 / len(ms), 3),
+                "db_wait_ms_mean": round(self.db_wait[name] * 1000 / len(ms), 3),
+            }
+        updates = sum(h["count"] for h in handlers.values())
+        busy = sum(sum(samples) for samples in self.latency.values())
+        return {
+            "updates": updates,
+            "wall_s": round(wall, 3),
+            "throughput_ups": round(updates / wall, 1) if wall else 0.0,
+            "db_share": round(sum(self.db_time.values()) / busy, 3) if busy else 0.0,
+            "db_wait_share": round(sum(self.db_wait.values()) / busy, 3) if busy else 0.0,
+            "errors": dict(self.errors),
+            "handlers": handlers,
+            "api_calls": dict(api_calls),
+        }
+
+
+@asynccontextmanager
+async def instrumented(dp: Dispatcher, start: datetime):
+    """
+    Подключает замеры к dp и пускает часы бота от start. Хендлеры смен сверяются
+    со временем (с 08:30), поэтому часы не берутся с машины, где идет прогон.
+    """
+    middleware = HandlerNameMiddleware()
+    dp.message.middleware(middleware)
+    dp.callback_query.middleware(middleware)
+    t0 = time.perf_counter()
+
+    def now():
+        return start + timedelta(seconds=time.perf_counter() - t0)
+
+    try:
+        with patch.object(db, "connect", _timed_connect(db.connect)), \
+                patch.object(db, "get_now", side_effect=now), \
+                patch.object(user_handlers, "get_now", side_effect=now):
+            yield
+    finally:
+        dp.message.middleware.unregister(middleware)
+        dp.callback_query.middleware.unregister(middleware)
+
+
+async def run(users: int = USERS, admins: int = ADMINS, years: int = 0, rounds: int = 1,
+              concurrency: int = CONCURRENCY, latency_ms: float = 0.0, pool_size: int = 4,
+              seed: int = 1) -> Dict[str, object]:
+    """Прогон на свежей временной базе; years > 0 — сотрудники с историей из datagen."""
+    # Роутеры подключаются к Dispatcher один раз на процесс, поэтому main — только здесь
+    import main
+
+    start = db.TZ.localize(datetime.combine(END_DAY + timedelta(days=1), datetime.min.time()).replace(hour=9))
+    with tempfile.TemporaryDirectory() as tmp, patch.object(db, "DB_NAME", os.path.join(tmp, "load.db")):
+        db.configure_locations([])
+        db.locale_cache.clear()
+        db.day_prefix.clear()
+        db.report_cache.clear()
+        await db.init_db()
+        await db.init_pool(size=pool_size)
+        bot = Bot(TOKEN, session=RecordingSession(latency_ms / 1000),
+                  default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+        try:
+            if years:
+                data = await generate(DataSpec(users=users + admins, years=years, open_share=0, seed=seed))
+                user_ids = data.user_ids
+            else:
+                user_ids = list(range(1, users + admins + 1))
+            await db.load_day_prefix(force=True)
+            admin_ids, employee_ids = user_ids[:admins], user_ids[admins:]
+            dp = main.build_dispatcher(BotConfig(token=TOKEN, admin_ids=admin_ids))
+            try:
+                async with instrumented(dp, start):
+                    result = await LoadRun(dp, bot, concurrency, seed).run(employee_ids, admin_ids, rounds)
+            finally:
+                await dp.fsm.storage.close()
+        finally:
+            await bot.session.close()
+            await db.close_pool()
+            db.day_prefix.clear()
+            db.report_cache.clear()
+    result["params"] = {"users": users, "admins": admins, "years": years, "rounds": rounds,
+                        "concurrency": concurrency, "latency_ms": latency_ms, "pool_size": pool_size,
+                        "seed": seed}
+    return result
+
+
+def _print_report(result: dict):
+    print(f"\nОбновлений: {result['updates']} за {result['wall_s']} с — "
+          f"{result['throughput_ups']} обн/с, доля базы {result['db_share']:.0%} "
+          f"(из них ожидание пула {result['db_wait_share']:.0%})")
+    print(f"  {'хендлер':<32} {'кол-во':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} "
+          f"{'база, мс':>9} {'пул, мс':>9}")
+    for name, h in result["handlers"].items():
+        print(f"  {name:<32} {h['count']:>7} {h['p50_ms']:>9.2f} {h['p95_ms']:>9.2f} "
+              f"{h['p99_ms']:>9.2f} {h['db_ms_mean']:>9.2f} {h['db_wait_ms_mean']:>9.2f}")
+    print("Вызовы API: " + ", ".join(f"{m} {n}" for m, n in sorted(result["api_calls"].items())))
+    if result["errors"]:
+        print("Ошибки: " + ", ".join(f"{e} ×{n}" for e, n in result["errors"].items()))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон Dispatcher")
+    parser.add_argument("--users", type=int, default=USERS, help="сотрудников")
+    parser.add_argument("--admins", type=int, default=ADMINS, help="админов")
+    parser.add_argument("--years", type=int, default=0, help="лет истории смен (0 — новые сотрудники)")
+    parser.add_argument("--rounds", type=int, default=1, help="повторов сценария на пользователя")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="обновлений в обработке одновременно")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="задержка ответа Bot API, мс")
+    parser.add_argument("--pool-size", type=int, default=4, help="соединений в пуле базы")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="куда сохранить результаты (JSON)")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args.users, args.admins, args.years, args.rounds, args.concurrency,
+                             args.latency_ms, args.pool_size, args.seed))
+    _print_report(result)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
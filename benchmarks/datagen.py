@@ -0,0 +1,134 @@
+# benchmarks/datagen.py
+"""
+Генератор синтетической истории смен для бенчмарков.
+
+Одинаковые параметры и seed дают одну и ту же базу: N сотрудников, M должностей,
+Y лет смен до end_day включительно, ручные корректировки и открытые смены
+последнего дня. Строки пишутся напрямую в shifts одной транзакцией (через
+record_shift_start это заняло бы часы), итоги потом пересчитываются
+rebuild_day_totals — так же, как после ремонта базы через manage.py.
+"""
+import random
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List
+
+import database as db
+
+# Последний день истории: фиксирован, чтобы результаты разных коммитов были сравнимы
+END_DAY = date(2025, 6, 30)
+
+FIRST_NAMES = ["Ана", "Марко", "Јелена", "Никола", "Милица", "Стефан", "Ивана", "Лука",
+               "Мария", "Петар", "Софија", "Душан", "Катарина", "Алексей", "Ольга"]
+
+
+@dataclass(frozen=True)
+class DataSpec:
+    users: int = 20
+    roles: int = 3
+    years: int = 1
+    work_share: float = 0.6     # доля дней, когда сотрудник выходит на смену
+    double_share: float = 0.1   # доля рабочих дней со второй сменой на другой должности
+    manual_share: float = 0.02  # доля дней с ручной корректировкой
+    open_share: float = 0.3     # доля сотрудников, у которых в end_day идет смена
+    seed: int = 1
+    end_day: date = END_DAY
+
+    def as_dict(self) -> Dict[str, object]:
+        return {**asdict(self), "end_day": self.end_day.isoformat()}
+
+
+@dataclass
+class DataSet:
+    spec: DataSpec
+    user_ids: List[int]
+    open_user_ids: List[int]
+    shifts: int
+    manual: int
+
+    def as_dict(self) -> Dict[str, object]:
+        return {"users": len(self.user_ids), "open_shifts": len(self.open_user_ids),
+                "shifts": self.shifts, "manual": self.manual}
+
+
+_SHIFT_INSERT = """
+    INSERT INTO shifts (user_id, role_id, shift_date, start_time, end_time, start_ts, end_ts,
+                        minutes_worked, rate_at_time, rate_minor, earned_minor, entry_type)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _roles(spec: DataSpec, rnd: random.Random) -> Dict[int, Decimal]:
+    # Должности 1..3 создают миграции, остальные добавляем со ставкой 5.00–12.00 за минуту
+    rates = {1: Decimal("6.7"), 2: Decimal("6.7"), 3: Decimal("6.2")}
+    for role_id in range(4, spec.roles + 1):
+        rates[role_id] = Decimal(rnd.randint(500, 1200)).scaleb(-2)
+    return {rid: rates[rid] for rid in range(1, spec.roles + 1)}
+
+
+def _shift_row(user_id: int, role_id: int, rate: Decimal, day: date, start_h: float,
+               minutes: int, rnd: random.Random, open_: bool = False) -> tuple:
+    start = db.day_start(day) + timedelta(hours=start_h, minutes=rnd.randint(0, 59))
+    rate_minor = int(rate * 100)
+    if open_:
+        return (user_id, role_id, day.isoformat(), start.isoformat(), None, db.to_ts(start), None,
+                0, str(rate), rate_minor, None, "auto")
+    end = start + timedelta(minutes=minutes)
+    return (user_id, role_id, day.isoformat(), start.isoformat(), end.isoformat(),
+            db.to_ts(start), db.to_ts(end), minutes, str(rate), rate_minor, minutes * rate_minor, "auto")
+
+
+def _manual_row(user_id: int, role_id: int, rate: Decimal, day: date, minutes: int) -> tuple:
+    moment = db.day_start(day) + timedelta(hours=21)
+    rate_minor = int(rate * 100)
+    return (user_id, role_id, day.isoformat(), moment.isoformat(), moment.isoformat(),
+            db.to_ts(moment), db.to_ts(moment), minutes, str(rate), rate_minor, minutes * rate_minor, "manual")
+
+
+async def generate(spec: DataSpec) -> DataSet:
+    """Наполняет текущую базу (после init_db) историей по spec."""
+    rnd = random.Random(spec.seed)
+    rates = _roles(spec, rnd)
+    user_ids = [100_000 + i for i in range(spec.users)]
+    user_roles = {uid: rnd.sample(sorted(rates), k=min(len(rates), rnd.randint(1, 2))) for uid in user_ids}
+    first_day = spec.end_day - timedelta(days=365 * spec.years - 1)
+
+    rows, manual = [], 0
+    for uid in user_ids:
+        roles = user_roles[uid]
+        day = first_day
+        while day < spec.end_day:
+            if rnd.random() < spec.work_share:
+                role_id = rnd.choice(roles)
+                rows.append(_shift_row(uid, role_id, rates[role_id], day, rnd.uniform(7, 10),
+                                       rnd.randint(240, 600), rnd))
+                others = [r for r in roles if r != role_id]
+                if others and rnd.random() < spec.double_share:
+                    other = rnd.choice(others)
+                    rows.append(_shift_row(uid, other, rates[other], day, 17, rnd.randint(60, 180), rnd))
+            if rnd.random() < spec.manual_share:
+                role_id = rnd.choice(roles)
+                rows.append(_manual_row(uid, role_id, rates[role_id], day, rnd.choice([-60, -30, 15, 30, 90])))
+                manual += 1
+            day += timedelta(days=1)
+
+    open_user_ids = sorted(rnd.sample(user_ids, k=round(len(user_ids) * spec.open_share)))
+    for uid in open_user_ids:
+        role_id = user_roles[uid][0]
+        rows.append(_shift_row(uid, role_id, rates[role_id], spec.end_day, 8, 0, rnd, open_=True))
+
+    async with db.connect() as conn:
+        await conn.executemany(
+            "INSERT INTO roles (role_id, name, rate, rate_minor) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (role_id) DO NOTHING",
+            [(rid, f"Должность {rid}", str(rate), int(rate * 100)) for rid, rate in rates.items()])
+        await conn.executemany(
+            "INSERT INTO users (user_id, username, first_name) VALUES (?, ?, ?)",
+            [(uid, f"user{uid}", f"{rnd.choice(FIRST_NAMES)} {i}") for i, uid in enumerate(user_ids)])
+        await conn.executemany("INSERT INTO user_roles (user_id, role_id) VALUES (?, ?)",
+                               [(uid, rid) for uid, roles in user_roles.items() for rid in roles])
+        await conn.executemany(_SHIFT_INSERT, rows)
+        await conn.commit()
+    await db.rebuild_day_totals()
+    return DataSet(spec, user_ids, open_user_ids, shifts=len(rows) - manual, manual=manual)
@@ -0,0 +1,131 @@
+# cache.py
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+# Отличает "ключа нет в кэше" от закэшированного None
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру LRU-кэш с необязательным TTL.
+    Считает попадания и промахи, чтобы было видно, работает ли он.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if maxsize < 1:
+            raise ValueError("maxsize должен быть не меньше 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        item = self._data.get(key)
+        if item is not None:
+            value, expires_at = item
+            if expires_at is None or expires_at > self._clock():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Any = MISSING):
+        """ttl — срок жизни именно этой записи (None — бессрочно), по умолчанию self.ttl."""
+        ttl = self.ttl if ttl is MISSING else ttl
+        expires_at = self._clock() + ttl if ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def keys(self) -> List[Hashable]:
+        return list(self._data)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+        }
+
+
+class ReportCache:
+    """
+    Кэш готовых отчетов. Ключ — (вид отчета, user_id или None для общих, начало, конец),
+    даты — ISO-строки. Отчеты за закрытые периоды (конец раньше сегодня) хранятся
+    без срока: их меняет только запись задним числом, и она их сбрасывает.
+    Периоды с сегодняшним днем живут live_ttl секунд, потому что идущие смены
+    в них считаются на текущий момент.
+    """
+
+    def __init__(self, maxsize: int = 256, live_ttl: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.live_ttl = live_ttl
+        self._cache = LRUCache(maxsize, clock=clock)
+        # Растет при каждом сбросе: отчет, который считали до записи, не попадет в кэш после нее
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(self, kind: str, user_id: Optional[int], start: Optional[str] = None,
+            end: Optional[str] = None) -> Any:
+        return self._cache.get((kind, user_id, start, end))
+
+    def set(self, kind: str, user_id: Optional[int], start: Optional[str], end: Optional[str],
+            value: Any, today: str, generation: Optional[int] = None):
+        """generation — значение self.generation до расчета отчета; если с тех пор был сброс, не кэшируем."""
+        if generation is not None and generation != self.generation:
+            return
+        ttl = None if end is not None and end < today else self.live_ttl
+        self._cache.set((kind, user_id, start, end), value, ttl=ttl)
+
+    def invalidate(self, user_id: int, day: Optional[str] = None):
+        """
+        Сбрасывает отчеты сотрудника и общие отчеты, в период которых попадает day.
+        Без day — все отчеты сотрудника и все общие, в том числе без периода (список сотрудников).
+        """
+        self.generation += 1
+        for key in self._cache.keys():
+            kind, uid, start, end = key
+            if uid is not None and uid != user_id:
+                continue
+            if day is not None and (start is None or not start <= day <= end):
+                continue
+            self._cache.pop(key)
+
+    def clear(self):
+        self.generation += 1
+        self._cache.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        return self._cache.hit_ratio
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
@@ -1,5 +1,7 @@
 # config.py
 from dataclasses import dataclass
+from datetime import time
+from typing import List, Optional
 from environs import Env
 
 @dataclass
@@ -7,9 +9,76 @@ class BotConfig:
     token: str
     admin_ids: list[int]
 
+@dataclass
+class DbConfig:
+    pool_size: int
+    acquire_timeout: float
+    profile: str
+    checkpoint_minutes: int
+    fsm_ttl_hours: int
+    fsm_flush_seconds: float
+
+@dataclass
+class WebhookConfig:
+    url: str  # публичный адрес за прокси (https://bot.example.com); пусто — long polling
+    path: str
+    host: str
+    port: int
+    secret: str
+    max_connections: int  # соединений, которые Telegram держит к нам одновременно
+    max_updates: int      # обновлений в обработке одновременно
+    max_body_size: int    # байт в теле запроса
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+@dataclass
+class MetricsConfig:
+    host: str  # только локально: /metrics без авторизации
+    port: int  # 0 — метрики не отдаются
+
+    @property
+    def enabled(self) -> bool:
+        return self.port > 0
+
+@dataclass
+class LocationConfig:
+    code: str
+    title: str
+    db_path: str  # пусто — database.DB_NAME (только для точки по умолчанию "main")
+    tz: str
+    remind_at: time
+    close_at: time
+
 @dataclass
 class Config:
     bot: BotConfig
+    db: DbConfig
+    webhook: WebhookConfig
+    metrics: MetricsConfig
+    locations: List[LocationConfig]
+
+def load_locations(env: Optional[Env] = None, path: str = ".env") -> List[LocationConfig]:
+    """
+    Точки из LOCATIONS=main,novi_sad и переменных LOCATION_<КОД>_TITLE / _DB / _TZ /
+    _REMIND_AT / _CLOSE_AT. Без LOCATIONS — одна точка "main" с прежними настройками.
+    """
+    if env is None:
+        env = Env()
+        env.read_env(path)
+    locations = []
+    for code in env.list("LOCATIONS", ["main"]):
+        prefix = f"LOCATION_{code.upper()}_"
+        locations.append(LocationConfig(
+            code=code,
+            title=env.str(prefix + "TITLE", code),
+            db_path=env.str(prefix + "DB", "" if code == "main" else f"coffee_bot_{code}.db"),
+            tz=env.str(prefix + "TZ", "Europe/Belgrade"),
+            remind_at=time.fromisoformat(env.str(prefix + "REMIND_AT", "20:00")),
+            close_at=time.fromisoformat(env.str(prefix + "CLOSE_AT", "20:30")),
+        ))
+    return locations
 
 def load_config(path: str = ".env") -> Config:
     env = Env()
@@ -19,7 +88,30 @@ def load_config(path: str = ".env") -> Config:
         bot=BotConfig(
             token=env.str("BOT_TOKEN"),
             admin_ids=list(map(int, env.list("ADMIN_IDS"))),
-        )
+        ),
+        db=DbConfig(
+            pool_size=env.int("DB_POOL_SIZE", 4),
+            acquire_timeout=env.float("DB_ACQUIRE_TIMEOUT", 5.0),
+            profile=env.str("DB_PROFILE", "wal"),
+            checkpoint_minutes=env.int("DB_CHECKPOINT_MINUTES", 15),
+            fsm_ttl_hours=env.int("FSM_TTL_HOURS", 24),
+            fsm_flush_seconds=env.float("FSM_FLUSH_SECONDS", 1.0),
+        ),
+        webhook=WebhookConfig(
+            url=env.str("WEBHOOK_URL", ""),
+            path=env.str("WEBHOOK_PATH", "/webhook"),
+            host=env.str("WEBHOOK_HOST", "127.0.0.1"),
+            port=env.int("WEBHOOK_PORT", 8080),
+            secret=env.str("WEBHOOK_SECRET", ""),
+            max_connections=env.int("WEBHOOK_MAX_CONNECTIONS", 40),
+            max_updates=env.int("WEBHOOK_MAX_UPDATES", 20),
+            max_body_size=env.int("WEBHOOK_MAX_BODY_SIZE", 1024 * 1024),
+        ),
+        metrics=MetricsConfig(
+            host=env.str("METRICS_HOST", "127.0.0.1"),
+            port=env.int("METRICS_PORT", 9108),
+        ),
+        locations=load_locations(env),
     )
 
 # Максимальное кол-во часов в день (для валидации админа)
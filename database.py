@@ -1,119 +1,258 @@
+import asyncio
 import logging
 import aiosqlite
-from datetime import date, datetime, timedelta
-from typing import Optional, List, Tuple, Dict
-from decimal import Decimal, ROUND_HALF_UP
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, AsyncIterator, Optional, List, NamedTuple, Tuple, Dict
+from decimal import Decimal
 import pytz
 
-# Настраиваем часовой пояс
+from cache import LRUCache, MISSING, ReportCache
+from db_pool import ConnectionPool
+from prefix_sums import PrefixSums
+from migration import apply_migrations
+
+# Часовой пояс точки по умолчанию (у остальных точек — свой, см. configure_locations)
 TZ = pytz.timezone('Europe/Belgrade')
 
 
 def get_now():
-    return datetime.now(TZ)
+    return datetime.now(current_shard().tz)
 
 
 def get_today():
     return get_now().date()
 
 
+def to_ts(dt: datetime) -> int:
+    """Aware datetime → секунды Unix (так время смен хранится в start_ts / end_ts)."""
+    return int(dt.timestamp())
+
+
+def format_ts(ts: int, fmt: str = "%H:%M") -> str:
+    """Секунды Unix → местное время для вывода."""
+    return datetime.fromtimestamp(ts, current_shard().tz).strftime(fmt)
+
+
+def day_start(day: date) -> datetime:
+    """Местная полночь указанного дня."""
+    return current_shard().tz.localize(datetime.combine(day, time.min))
+
+
+# Файл базы точки по умолчанию
 DB_NAME = 'coffee_bot.db'
 
-# СТАВКА ЗА 1 МИНУТУ (Например: 11.0 RSD)
-ROLES_DATA = [
-    (1, 'Помощник повара', "6.7"),
-    (2, 'Повар', "6.7"),
-    (3, 'Бариста', "6.2")
-]
 
 
-async def init_db():
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("PRAGMA foreign_keys = ON")
+@dataclass(frozen=True)
+class StorageProfile:
+    """Набор PRAGMA, которые выполняются на каждом новом соединении."""
+    journal_mode: str
+    synchronous: str
+    mmap_size: int  # байт, 0 — mmap выключен
+    cache_size: int  # отрицательное значение — размер в КиБ
+    temp_store: str
+    busy_timeout: int  # мс
+
+    def pragmas(self) -> Tuple[str, ...]:
+        return (
+            "PRAGMA foreign_keys = ON",
+            f"PRAGMA journal_mode = {self.journal_mode}",
+            f"PRAGMA synchronous = {self.synchronous}",
+            f"PRAGMA mmap_size = {self.mmap_size}",
+            f"PRAGMA cache_size = {self.cache_size}",
+            f"PRAGMA temp_store = {self.temp_store}",
+            f"PRAGMA busy_timeout = {self.busy_timeout}",
+        )
+
+
+STORAGE_PROFILES = {
+    # Настройки SQLite по умолчанию: rollback-журнал, читатели блокируют писателей
+    "default": StorageProfile(
+        journal_mode="DELETE",
+        synchronous="FULL",
+        mmap_size=0,
+        cache_size=-2000,
+        temp_store="DEFAULT",
+        busy_timeout=5000,
+    ),
+    # WAL: длинный отчет не блокирует запись смен, и наоборот
+    "wal": StorageProfile(
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        mmap_size=256 * 1024 * 1024,
+        cache_size=-16000,
+        temp_store="MEMORY",
+        busy_timeout=5000,
+    ),
+}
+
+_profile: StorageProfile = STORAGE_PROFILES["wal"]
+
+# user_id -> locale (или None, если пользователя нет в базе).
+# Middleware спрашивает язык на каждый апдейт, поэтому держим его в памяти;
+# все записи в users.locale идут через set_user_locale и обновляют кэш.
+locale_cache = LRUCache(maxsize=10_000, ttl=6 * 60 * 60)
+
+# --- ТОЧКИ (шарды) ---
+# У каждой кофейни своя база: свой файл, пул соединений, часовой пояс, расписание
+# и кэши итогов. Точка, с которой сейчас работаем, хранится в contextvar: ее
+# выставляет middlewares.location на время обработки обновления, use_location() —
+# в задачах планировщика. По умолчанию это DEFAULT_LOCATION с файлом DB_NAME,
+# так что с одной точкой все работает как раньше.
+
+DEFAULT_LOCATION = "main"
+
+
+class Shard:
+    def __init__(self, code: str, tz, path: Optional[str] = None, title: Optional[str] = None,
+                 remind_at: time = time(20, 0), close_at: time = time(20, 30)):
+        self.code = code
+        self.tz = tz
+        self._path = path
+        self.title = title or code
+        self.remind_at = remind_at  # напоминание закрыть смену
+        self.close_at = close_at    # автозакрытие смен
+        self.pool: Optional[ConnectionPool] = None
+        # Копия user_day_prefix в памяти: итог за любой период — два бинарных поиска.
+        # Загружается load_day_prefix(), дальше обновляется сразу после commit() каждой записи.
+        self.day_prefix = PrefixSums()
+        # Готовые отчеты: ключ — (вид, user_id или None, начало, конец).
+        # Сбрасываются точечно каждой записью смены (см. _on_totals_committed, record_shift_start)
+        # и изменением списка сотрудников.
+        self.report_cache = ReportCache(maxsize=256, live_ttl=60.0)
+
+    @property
+    def path(self) -> str:
+        # Файл точки по умолчанию — DB_NAME (его подменяют тесты и скрипты)
+        return self._path or DB_NAME
+
+
+_shards: Dict[str, Shard] = {DEFAULT_LOCATION: Shard(DEFAULT_LOCATION, TZ)}
+_current_location: ContextVar[str] = ContextVar("location", default=DEFAULT_LOCATION)
+
+# Кэши точки по умолчанию (для скриптов и тестов, где точка одна)
+day_prefix = _shards[DEFAULT_LOCATION].day_prefix
+report_cache = _shards[DEFAULT_LOCATION].report_cache
+
+
+def configure_locations(locations) -> None:
+    """
+    Реестр точек из config.LocationConfig. Точка по умолчанию есть всегда;
+    вызывать до init_db() и init_pool().
+    """
+    default = _shards[DEFAULT_LOCATION]
+    shards = {DEFAULT_LOCATION: default}
+    for loc in locations:
+        tz = pytz.timezone(loc.tz)
+        if loc.code == DEFAULT_LOCATION:
+            default.tz, default._path, default.title = tz, loc.db_path or None, loc.title or loc.code
+            default.remind_at, default.close_at = loc.remind_at, loc.close_at
+        else:
+            shards[loc.code] = Shard(loc.code, tz, loc.db_path, loc.title, loc.remind_at, loc.close_at)
+    _shards.clear()
+    _shards.update(shards)
 
-        # 1. ТАБЛИЦА ПОЛЬЗОВАТЕЛЕЙ
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY, 
-                username TEXT, 
-                first_name TEXT,
-                locale TEXT DEFAULT 'ru'
-            )
-        ''')
-
-        try:
-            await db.execute("ALTER TABLE users ADD COLUMN locale TEXT DEFAULT 'ru'")
-            await db.commit()
-            print("✅ База данных обновлена: добавлена колонка locale")
-        except aiosqlite.OperationalError:
-            # Если колонка уже есть, SQLite выдаст ошибку, которую мы просто игнорируем
-            pass
 
-        # 2. ТАБЛИЦА РОЛЕЙ
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS roles (
-                role_id INTEGER PRIMARY KEY, 
-                name TEXT UNIQUE NOT NULL, 
-                rate TEXT NOT NULL
-            )
-        ''')
-
-        # 3. ТАБЛИЦА СМЕН (Единая)
-        # Проверяем структуру: если end_time обязателен (NOT NULL), пересоздаем
-        async with db.execute("PRAGMA table_info(shifts)") as cursor:
-            columns = await cursor.fetchall()
-            is_dirty = False
-            if columns:
-                end_time_col = next((c for c in columns if c[1] == 'end_time'), None)
-                if end_time_col and end_time_col[3] == 1:
-                    is_dirty = True
-
-            if is_dirty or not columns:
-                logging.info("Миграция таблицы shifts...")
-                if columns:
-                    await db.execute("ALTER TABLE shifts RENAME TO shifts_old")
-
-                await db.execute('''
-                    CREATE TABLE shifts (
-                        shift_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL, 
-                        role_id INTEGER NOT NULL,
-                        shift_date TEXT NOT NULL, 
-                        start_time TEXT NOT NULL, 
-                        end_time TEXT, 
-                        minutes_worked INTEGER DEFAULT 0, 
-                        rate_at_time TEXT NOT NULL, 
-                        entry_type TEXT NOT NULL DEFAULT 'auto'
-                    )
-                ''')
-                if columns:
-                    # Пытаемся перенести что можно (старые часы станут минутами)
-                    await db.execute('''
-                        INSERT INTO shifts (user_id, role_id, shift_date, start_time, end_time, minutes_worked, rate_at_time, entry_type)
-                        SELECT user_id, role_id, shift_date, start_time, end_time, 
-                               CAST(COALESCE(hours_worked, 0) * 60 AS INTEGER), 
-                               CAST(rate_at_time AS TEXT), entry_type 
-                        FROM shifts_old
-                    ''')
-                    await db.execute("DROP TABLE shifts_old")
-
-        # 4. ТАБЛИЦА СВЯЗИ РОЛЕЙ
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS user_roles (
-                user_id INTEGER NOT NULL, 
-                role_id INTEGER NOT NULL,
-                PRIMARY KEY (user_id, role_id)
-            )
-        ''')
-
-        # Обновляем ставки из конфига
-        for rid, name, rate in ROLES_DATA:
-            await db.execute('''
-                INSERT INTO roles (role_id, name, rate) VALUES (?, ?, ?)
-                ON CONFLICT(role_id) DO UPDATE SET rate = excluded.rate, name = excluded.name
-            ''', (rid, name, rate))
+def locations() -> List[Shard]:
+    return list(_shards.values())
 
-        await db.commit()
+
+def current_shard() -> Shard:
+    return _shards[_current_location.get()]
+
+
+@contextmanager
+def use_location(code: Optional[str]):
+    """Все запросы внутри блока идут в базу точки code (None — точка по умолчанию)."""
+    code = code or DEFAULT_LOCATION
+    if code not in _shards:
+        raise ValueError(f"Неизвестная точка: {code}")
+    token = _current_location.set(code)
+    try:
+        yield _shards[code]
+    finally:
+        _current_location.reset(token)
+
+
+async def run_in_location(code: Optional[str], func, *args, **kwargs):
+    with use_location(code):
+        return await func(*args, **kwargs)
+
+
+async def gather_locations(func, *args, **kwargs) -> Dict[str, Any]:
+    """
+    func(*args, **kwargs) во всех точках одновременно → {код точки: результат}.
+    У каждой точки свой файл и свой пул, так что запросы друг друга не ждут.
+    """
+    codes = list(_shards)
+    results = await asyncio.gather(*(run_in_location(code, func, *args, **kwargs) for code in codes))
+    return dict(zip(codes, results))
+
+
+def use_storage_profile(name: str):
+    """Выбирает профиль PRAGMA. Вызывать до init_db() и init_pool()."""
+    global _profile
+    if name not in STORAGE_PROFILES:
+        raise ValueError(f"Неизвестный профиль хранилища: {name}")
+    _profile = STORAGE_PROFILES[name]
+
+
+def is_wal_enabled() -> bool:
+    return _profile.journal_mode.upper() == "WAL"
+
+
+async def init_pool(size: int = 4, acquire_timeout: float = 5.0):
+    """Открывает пулы соединений всех точек (size на точку). Вызывается один раз при старте бота."""
+    for shard in _shards.values():
+        if shard.pool is not None:
+            continue
+        pool = ConnectionPool(shard.path, size=size, acquire_timeout=acquire_timeout, pragmas=_profile.pragmas())
+        await pool.open()
+        shard.pool = pool
+
+
+async def close_pool():
+    for shard in _shards.values():
+        pool, shard.pool = shard.pool, None
+        if pool is not None:
+            await pool.close()
+
+
+@asynccontextmanager
+async def connect():
+    """
+    Выдает соединение из пула текущей точки.
+    Если пул не открыт (скрипты, тесты), открывает разовое соединение.
+    """
+    shard = current_shard()
+    if shard.pool is not None:
+        async with shard.pool.acquire() as conn:
+            yield conn
+        return
+    async with aiosqlite.connect(shard.path) as conn:
+        for pragma in _profile.pragmas():
+            await conn.execute(pragma)
+        yield conn
+
+
+async def checkpoint_wal(mode: str = "PASSIVE") -> Tuple[int, int, int]:
+    """
+    Переносит содержимое WAL-файла в основную базу.
+    Возвращает (busy, страниц в WAL, перенесено страниц).
+    """
+    async with connect() as db:
+        async with db.execute(f"PRAGMA wal_checkpoint({mode})") as c:
+            return tuple(await c.fetchone())
+
+async def init_db():
+    """Доводит схему базы каждой точки до последней версии (см. migration.py)."""
+    for code in _shards:
+        with use_location(code):
+            async with connect() as db:
+                await apply_migrations(db)
 
 
 # --- ЛОГИКА СМЕН ---
@@ -121,7 +260,7 @@ async def init_db():
 async def get_used_role_ids_today(user_id: int) -> List[int]:
     """Возвращает список ID ролей, по которым сегодня уже были ЗАКРЫТЫЕ смены."""
     today = get_today().isoformat()
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with connect() as db:
         async with db.execute(
                 "SELECT role_id FROM shifts WHERE user_id = ? AND shift_date = ? AND end_time IS NOT NULL",
                 (user_id, today)
@@ -131,26 +270,34 @@ async def get_used_role_ids_today(user_id: int) -> List[int]:
 
 
 async def get_shift_status(user_id: int) -> str:
-    """Определяет статус, используя проверку активности."""
-    # 1. Сначала проверяем, идет ли смена прямо сейчас
-    if await is_shift_active(user_id):
-        return 'active'
-
-    # 2. Если активной нет, проверяем, остались ли неиспользованные роли на сегодня
-    user_roles = await get_user_roles(user_id)
-    used_roles = await get_used_role_ids_today(user_id)
-
-    # Если список отработанных ролей меньше, чем список всех ролей юзера
-    if len(used_roles) < len(user_roles):
-        return 'none'
-
-    # Если всё отработано
-    return 'finished_all'
+    """
+    Статус одним запросом:
+    'active' — идет смена; 'none' — есть должность, по которой сегодня еще не работали;
+    'finished_all' — все должности на сегодня отработаны.
+    """
+    query = """
+        SELECT CASE
+            WHEN EXISTS (SELECT 1 FROM shifts WHERE user_id = :uid AND end_time IS NULL) THEN 'active'
+            WHEN EXISTS (
+                SELECT 1 FROM user_roles ur
+                WHERE ur.user_id = :uid
+                  AND ur.role_id NOT IN (
+                      SELECT role_id FROM shifts
+                      WHERE user_id = :uid AND shift_date = :today AND end_time IS NOT NULL
+                  )
+            ) THEN 'none'
+            ELSE 'finished_all'
+        END
+    """
+    today = get_today().isoformat()
+    async with connect() as db:
+        async with db.execute(query, {"uid": user_id, "today": today}) as c:
+            return (await c.fetchone())[0]
 
 
 async def is_shift_active(user_id: int) -> bool:
     """ПРЯМОЙ запрос в базу без вызова других функций."""
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with connect() as db:
         async with db.execute(
                 "SELECT 1 FROM shifts WHERE user_id = ? AND end_time IS NULL LIMIT 1",
                 (user_id,)
@@ -160,47 +307,77 @@ async def is_shift_active(user_id: int) -> bool:
 
 
 async def record_shift_start(user_id: int, role_id: int):
-    now_iso = get_now().isoformat()
+    now = get_now()
     today = get_today().isoformat()
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute("SELECT rate FROM roles WHERE role_id = ?", (role_id,)) as rc:
-            rate_str = (await rc.fetchone())[0]
+    async with connect() as db:
+        async with db.execute("SELECT rate, rate_minor FROM roles WHERE role_id = ?", (role_id,)) as rc:
+            rate_str, rate_minor = await rc.fetchone()
         await db.execute('''
-            INSERT INTO shifts (user_id, role_id, shift_date, start_time, rate_at_time, entry_type)
-            VALUES (?, ?, ?, ?, ?, 'auto')
-        ''', (user_id, role_id, today, now_iso, rate_str))
+            INSERT INTO shifts (user_id, role_id, shift_date, start_time, start_ts, rate_at_time, rate_minor, entry_type)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'auto')
+        ''', (user_id, role_id, today, now.isoformat(), to_ts(now), rate_str, rate_minor))
         await db.commit()
+    current_shard().report_cache.invalidate(user_id, today)
 
 
 async def close_shift(user_id: int, end_dt: Optional[datetime] = None):
-    now = get_now()  # Aware datetime (с часовым поясом)
-    now_iso = now.isoformat()
-    async with aiosqlite.connect(DB_NAME) as db:
+    now = end_dt if end_dt is not None else get_now()  # Aware datetime (с часовым поясом)
+    end_ts = to_ts(now)
+    async with connect() as db:
         async with db.execute(
-                "SELECT shift_id, start_time FROM shifts WHERE user_id = ? AND end_time IS NULL LIMIT 1",
+                "SELECT shift_id, start_ts FROM shifts WHERE user_id = ? AND end_time IS NULL LIMIT 1",
                 (user_id,)
         ) as c:
             row = await c.fetchone()
             if not row:
                 return None
-            sid, start_iso = row
-            start_dt = datetime.fromisoformat(start_iso)
-            end_dt_naive = now.replace(tzinfo=None)
-            start_dt_naive = start_dt.replace(tzinfo=None)
-            diff = end_dt_naive - start_dt_naive
-            mins = int(diff.total_seconds() // 60)
-            if mins < 0:
-                mins = 0
-            await db.execute(
-                "UPDATE shifts SET end_time = ?, minutes_worked = ? WHERE user_id = ? AND end_time IS NULL",
-                (now_iso, mins, user_id)
-            )
+            sid, start_ts = row
+            mins = max((end_ts - start_ts) // 60, 0)
+            async with db.execute(
+                "UPDATE shifts SET end_time = ?, end_ts = ?, minutes_worked = ?, earned_minor = ? * rate_minor "
+                "WHERE user_id = ? AND end_time IS NULL "
+                "RETURNING user_id, shift_date, role_id, minutes_worked, earned_minor",
+                (now.isoformat(), end_ts, mins, mins, user_id)
+            ) as uc:
+                totals = await _add_to_day_totals(db, await uc.fetchall())
             await db.commit()
-            t_start = start_dt.strftime("%H:%M:%S")
+            _on_totals_committed(totals)
+            t_start = format_ts(start_ts, "%H:%M:%S")
             t_end = now.strftime("%H:%M:%S")
             return mins, t_start, t_end
 
 
+async def close_open_shifts(cutoff: datetime) -> List[Tuple[int, int, str, str]]:
+    """
+    Закрывает ВСЕ открытые смены моментом cutoff одним UPDATE (одна транзакция).
+    Минуты считаются в SQL вычитанием секунд: cutoff - start_ts.
+    Возвращает [(user_id, минуты, "ЧЧ:ММ:СС" начала, "ЧЧ:ММ:СС" конца), ...].
+    """
+    minutes = "MAX(0, (:end_ts - start_ts) / 60)"
+    query = f"""
+        UPDATE shifts
+        SET end_time = :end_iso,
+            end_ts = :end_ts,
+            minutes_worked = {minutes},
+            earned_minor = {minutes} * rate_minor
+        WHERE end_time IS NULL
+        RETURNING user_id, shift_date, role_id, minutes_worked, earned_minor, start_ts
+    """
+    async with connect() as db:
+        async with db.execute(query, {"end_iso": cutoff.isoformat(), "end_ts": to_ts(cutoff)}) as c:
+            rows = await c.fetchall()
+        totals = await _add_to_day_totals(db, [row[:5] for row in rows])
+        await db.commit()
+        _on_totals_committed(totals)
+    t_end = cutoff.strftime("%H:%M:%S")
+    return [(uid, mins, format_ts(start_ts, "%H:%M:%S"), t_end) for uid, _, _, mins, _, start_ts in rows]
+
+
+def minor_to_decimal(minor: int) -> Decimal:
+    """Целое число пар → сумма в RSD с двумя знаками (12345 → Decimal('123.45'))."""
+    return Decimal(minor).scaleb(-2)
+
+
 def format_minutes_to_str(total_minutes: int) -> str:
     """Вспомогательная функция для красивого вывода времени (в т.ч. отрицательного)."""
     abs_mins = abs(total_minutes)
@@ -210,73 +387,208 @@ def format_minutes_to_str(total_minutes: int) -> str:
 
 
 
+_SHIFT_LINE_COLUMNS = """
+    s.shift_id, s.shift_date, s.start_time, s.end_time, s.start_ts, s.end_ts,
+    s.minutes_worked, s.rate_minor, s.earned_minor, r.name, s.entry_type
+"""
+
+
+def _shift_amounts(row, now_ts: int) -> Tuple[Optional[int], Optional[int], int, int]:
+    """
+    Колонки _SHIFT_LINE_COLUMNS → (начало, конец в секундах Unix, минуты, пары).
+    Для идущей смены минуты и деньги считаются "вживую" на now_ts, конца у нее нет.
+    """
+    _, _, _, e_t, s_ts, e_ts, mins, rate_minor, earned_minor, _, entry_type = row
+    if e_t is None and entry_type != 'manual':
+        # "Живой" расчет для открытой смены
+        mins = max((now_ts - s_ts) // 60, 0)
+    # Для закрытых и КОРРЕКТИРОВОК берем готовые минуты из базы.
+    # Деньги считаем в целых парах, в Decimal переводим только для вывода
+    if earned_minor is None:
+        earned_minor = mins * rate_minor
+    return s_ts, e_ts, mins, earned_minor
+
+
+def _render_shift_line(row, now_ts: int) -> Tuple[str, int, int]:
+    """Строка отчета по смене (колонки _SHIFT_LINE_COLUMNS) → (текст, минуты, пары)."""
+    s_date, e_t, r_name, entry_type = row[1], row[3], row[9], row[10]
+    s_ts, e_ts, display_mins, earned_minor = _shift_amounts(row, now_ts)
+    role_label = r_name if r_name else "???"
+    if entry_type == 'manual' or s_ts is None:
+        t_range = "[Корр.]"
+    elif e_t is None:
+        t_range = f"{format_ts(s_ts)} - 🟢"
+    else:
+        t_range = f"{format_ts(s_ts)} - {format_ts(e_ts)}"
+    time_label = "⚡️ <b>В процессе:</b>" if e_t is None and entry_type != 'manual' else ""
+
+    earn = minor_to_decimal(earned_minor)
+    h_str = format_minutes_to_str(display_mins)
+    text = (
+        f"📅 {s_date} | {t_range} | {role_label}\n"
+        f"      └ {time_label} {h_str} | {earn} RSD"
+    )
+    return text, display_mins, earned_minor
+
+
+_USER_SHIFTS_QUERY = f"""
+    SELECT {_SHIFT_LINE_COLUMNS}
+    FROM shifts s
+    LEFT JOIN roles r ON s.role_id = r.role_id
+    WHERE s.user_id = ? AND s.shift_date BETWEEN ? AND ?
+    ORDER BY s.shift_date ASC, s.shift_id ASC
+"""
+
+
 async def get_user_shifts_report(user_id: int, start_date: date, end_date: date):
-    query = """
-            SELECT 
-                s.shift_date, 
-                s.start_time, 
-                s.end_time, 
-                s.minutes_worked, 
-                s.rate_at_time, 
-                r.name, 
-                s.entry_type
-            FROM shifts s
-            LEFT JOIN roles r ON s.role_id = r.role_id
-            WHERE s.user_id = ? AND s.shift_date BETWEEN ? AND ?
-            ORDER BY s.shift_date ASC, s.start_time ASC
-        """
-    total_min, total_money, shifts_list = 0, Decimal('0.00'), []
-    current_time = get_now()
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute(query, (user_id, start_date.isoformat(), end_date.isoformat())) as cursor:
+    start, end = start_date.isoformat(), end_date.isoformat()
+    cache = current_shard().report_cache
+    cached = cache.get("user_shifts", user_id, start, end)
+    if cached is not MISSING:
+        return cached
+    generation = cache.generation
+    total_min, total_minor, shifts_list = 0, 0, []
+    now_ts = to_ts(get_now())
+    async with connect() as db:
+        async with db.execute(_USER_SHIFTS_QUERY, (user_id, start, end)) as cursor:
             async for row in cursor:
-                s_date, s_t, e_t, mins, rate_str, r_name, entry_type = row
-                rate = Decimal(rate_str)
-                role_label = r_name if r_name else "???"
-                if entry_type == 'manual' or str(s_t).startswith('manual'):
-                    t_range = "[Корр.]"
-                elif e_t is None:
-                    # Если T в строке нет (мало ли), берем как есть, иначе режем время
-                    t_start = s_t.split('T')[-1][:5] if 'T' in s_t else s_t[:5]
-                    t_range = f"{t_start} - 🟢"
-                else:
-                    t_start = s_t.split('T')[-1][:5] if 'T' in s_t else s_t[:5]
-                    t_end = e_t.split('T')[-1][:5] if 'T' in e_t else e_t[:5]
-                    t_range = "[Корр.]" if t_start == "manua" else f"{t_start} - {t_end}"
-
-                if e_t is None and entry_type != 'manual':
-                    # "Живой" расчет для открытой смены
-                    start_dt = datetime.fromisoformat(s_t).replace(tzinfo=None)
-                    now_naive = current_time.replace(tzinfo=None)
-                    diff = now_naive - start_dt
-                    display_mins = int(diff.total_seconds() // 60)
-                    if display_mins < 0: display_mins = 0
-                    time_label = "⚡️ <b>В процессе:</b>"
-                else:
-                    # Для закрытых и КОРРЕКТИРОВОК берем готовые минуты из базы
-                    display_mins = mins
-                    time_label = ""
-
-                earn = (Decimal(display_mins) * rate).quantize(Decimal('0.01'), ROUND_HALF_UP)
-
+                text, display_mins, earned_minor = _render_shift_line(row, now_ts)
                 # Суммируем только то, что влияет на итог
                 total_min += display_mins
-                total_money += earn
+                total_minor += earned_minor
+                shifts_list.append(text)
+
+    result = (total_min, minor_to_decimal(total_minor), shifts_list)
+    cache.set("user_shifts", user_id, start, end, result, get_today().isoformat(), generation)
+    return result
+
+
+_PAYROLL_SHIFTS_QUERY = f"""
+    SELECT u.user_id, u.first_name, {_SHIFT_LINE_COLUMNS}
+    FROM users u
+    JOIN shifts s ON s.user_id = u.user_id
+    LEFT JOIN roles r ON s.role_id = r.role_id
+    WHERE s.shift_date BETWEEN ? AND ?
+    ORDER BY u.first_name, u.user_id, s.shift_date, s.shift_id
+"""
+
+
+class PayrollShift(NamedTuple):
+    user_id: int
+    name: str
+    shift_date: str
+    start_ts: Optional[int]   # None у корректировок
+    end_ts: Optional[int]     # None у корректировок и идущих смен
+    role: str
+    entry_type: str
+    rate_minor: int
+    minutes: int
+    earned_minor: int
+
+
+async def iter_payroll_shifts(start_date: date, end_date: date) -> AsyncIterator[PayrollShift]:
+    """
+    Все смены за период для зарплатной ведомости: сотрудники по имени, у каждого —
+    смены по порядку, с теми же минутами и деньгами, что и в get_user_shifts_report.
+    Строки читаются из курсора по мере обхода, весь период в память не загружается.
+    """
+    now_ts = to_ts(get_now())
+    async with connect() as db:
+        # Один запрос на весь период: сотрудники без смен в него не попадают,
+        # а строки одного сотрудника идут подряд — группирует вызывающий
+        async with db.execute(_PAYROLL_SHIFTS_QUERY, (start_date.isoformat(), end_date.isoformat())) as cursor:
+            async for row in cursor:
+                uid, name, row = row[0], row[1], row[2:]
+                s_ts, e_ts, mins, earned_minor = _shift_amounts(row, now_ts)
+                yield PayrollShift(uid, name, row[1], s_ts, e_ts, row[9] or "???", row[10],
+                                   row[7], mins, earned_minor)
+
+
+SHIFTS_PAGE_SIZE = 15
+
 
-                h_str = format_minutes_to_str(display_mins)
+class ShiftsPage(NamedTuple):
+    shifts: List[Tuple[int, str]]  # (shift_id, готовая строка отчета)
+    has_prev: bool
+    has_next: bool
 
-                shifts_list.append(
-                    f"📅 {s_date} | {t_range} | {role_label}\n"
-                    f"      └ {time_label} {h_str} | {earn} RSD"
-                )
+    @property
+    def first_id(self) -> Optional[int]:
+        return self.shifts[0][0] if self.shifts else None
 
-    return total_min, total_money, shifts_list
+    @property
+    def last_id(self) -> Optional[int]:
+        return self.shifts[-1][0] if self.shifts else None
+
+
+async def get_user_shifts_page(user_id: int, start_date: date, end_date: date,
+                               after: Optional[int] = None, before: Optional[int] = None,
+                               limit: int = SHIFTS_PAGE_SIZE) -> ShiftsPage:
+    """
+    Страница детального отчета: смены по (shift_date, shift_id), курсор — shift_id
+    крайней смены соседней страницы. Читает и рендерит только limit строк.
+    """
+    cursor_sql = "(SELECT shift_date, shift_id FROM shifts WHERE shift_id = :cursor)"
+    where = "s.user_id = :uid AND s.shift_date BETWEEN :start AND :end"
+    order = "s.shift_date, s.shift_id"
+    if before is not None:
+        where += f" AND (s.shift_date, s.shift_id) < {cursor_sql}"
+        order = "s.shift_date DESC, s.shift_id DESC"
+    elif after is not None:
+        where += f" AND (s.shift_date, s.shift_id) > {cursor_sql}"
+    query = f"""
+        SELECT {_SHIFT_LINE_COLUMNS}
+        FROM shifts s
+        LEFT JOIN roles r ON s.role_id = r.role_id
+        WHERE {where}
+        ORDER BY {order}
+        LIMIT :limit
+    """
+    params = {"uid": user_id, "start": start_date.isoformat(), "end": end_date.isoformat(),
+              "cursor": before if before is not None else after, "limit": limit + 1}
+    async with connect() as db:
+        async with db.execute(query, params) as c:
+            rows = await c.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+    now_ts = to_ts(get_now())
+    shifts = [(row[0], _render_shift_line(row, now_ts)[0]) for row in rows]
+    if before is not None:
+        return ShiftsPage(shifts, has_prev=more, has_next=bool(shifts))
+    return ShiftsPage(shifts, has_prev=after is not None and bool(shifts), has_next=more)
+
+
+async def get_user_period_totals(user_id: int, start_date: date, end_date: date) -> Tuple[int, Decimal, int, bool]:
+    """
+    Итоги сотрудника за период для шапки постраничного отчета, не читая сами смены:
+    закрытые — из накопленных итогов, идущие — "вживую".
+    Возвращает (минуты, деньги, число записей, есть ли идущая смена).
+    """
+    await load_day_prefix()
+    start, end = start_date.isoformat(), end_date.isoformat()
+    mins, minor, count = current_shard().day_prefix.range(user_id, start, end)
+    now_ts = to_ts(get_now())
+    has_open = False
+    async with connect() as db:
+        async with db.execute(
+                "SELECT rate_minor, start_ts FROM shifts "
+                "WHERE user_id = ? AND end_time IS NULL AND shift_date BETWEEN ? AND ? AND entry_type != 'manual'",
+                (user_id, start, end)) as c:
+            async for rate_minor, s_ts in c:
+                live = max((now_ts - s_ts) // 60, 0)
+                mins += live
+                minor += live * rate_minor
+                count += 1
+                has_open = True
+    return mins, minor_to_decimal(minor), count, has_open
 
 
 # --- ВСПОМОГАТЕЛЬНЫЕ ---
 
 async def get_user_roles(user_id: int):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with connect() as db:
         async with db.execute(
                 "SELECT r.role_id, r.name, r.rate FROM user_roles ur JOIN roles r ON ur.role_id = r.role_id WHERE ur.user_id = ?",
                 (user_id,)) as c:
@@ -284,12 +596,12 @@ async def get_user_roles(user_id: int):
 
 
 async def get_roles():
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with connect() as db:
         async with db.execute("SELECT role_id, name, rate FROM roles") as c: return await c.fetchall()
 
 
 async def set_user_roles(user_id: int, role_ids: List[int]):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with connect() as db:
         await db.execute("DELETE FROM user_roles WHERE user_id = ?", (user_id,))
         await db.executemany("INSERT INTO user_roles (user_id, role_id) VALUES (?, ?)",
                              [(user_id, rid) for rid in role_ids])
@@ -297,21 +609,89 @@ async def set_user_roles(user_id: int, role_ids: List[int]):
 
 
 async def add_or_update_user(user_id: int, username: str, first_name: str):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "INSERT INTO users (user_id, username, first_name) VALUES (?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET username=excluded.username, first_name=excluded.first_name",
+    async with connect() as db:
+        # Без изменений в имени строка не перезаписывается (rowcount = 0)
+        cursor = await db.execute(
+            "INSERT INTO users (user_id, username, first_name) VALUES (?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET username=excluded.username, first_name=excluded.first_name, active=1 "
+            "WHERE username IS NOT excluded.username OR first_name IS NOT excluded.first_name OR NOT active",
             (user_id, username or '', first_name or ''))
         await db.commit()
+    if cursor.rowcount:
+        # Новый пользователь получает locale по умолчанию, а в кэше мог остаться None
+        locale_cache.pop(user_id)
+        current_shard().report_cache.invalidate(user_id)
 
 
 async def get_all_users():
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute("SELECT user_id, first_name FROM users") as c: return await c.fetchall()
+    cache = current_shard().report_cache
+    cached = cache.get("users", None)
+    if cached is not MISSING:
+        return cached
+    generation = cache.generation
+    async with connect() as db:
+        async with db.execute("SELECT user_id, first_name FROM users WHERE active") as c:
+            users = await c.fetchall()
+    cache.set("users", None, None, None, users, get_today().isoformat(), generation)
+    return users
+
+
+USERS_PAGE_SIZE = 20
+
+
+class UsersPage(NamedTuple):
+    users: List[Tuple[int, str]]
+    has_prev: bool
+    has_next: bool
+
+    @property
+    def first_id(self) -> Optional[int]:
+        return self.users[0][0] if self.users else None
+
+    @property
+    def last_id(self) -> Optional[int]:
+        return self.users[-1][0] if self.users else None
+
+
+async def get_users_page(after: Optional[int] = None, before: Optional[int] = None,
+                         limit: int = USERS_PAGE_SIZE) -> UsersPage:
+    """
+    Страница сотрудников по (first_name, user_id). Курсор — user_id последнего (after)
+    или первого (before) сотрудника соседней страницы. Один запрос по idx_users_name.
+    Если сотрудника-курсора уже нет, страница пустая — показывайте первую.
+    """
+    cursor_sql = "(SELECT first_name, user_id FROM users WHERE user_id = :cursor)"
+    if before is not None:
+        query = f"""
+            SELECT user_id, first_name FROM users
+            WHERE active AND (first_name, user_id) < {cursor_sql}
+            ORDER BY first_name DESC, user_id DESC LIMIT :limit
+        """
+        params = {"cursor": before, "limit": limit + 1}
+    elif after is not None:
+        query = f"""
+            SELECT user_id, first_name FROM users
+            WHERE active AND (first_name, user_id) > {cursor_sql}
+            ORDER BY first_name, user_id LIMIT :limit
+        """
+        params = {"cursor": after, "limit": limit + 1}
+    else:
+        query = "SELECT user_id, first_name FROM users WHERE active ORDER BY first_name, user_id LIMIT :limit"
+        params = {"limit": limit + 1}
+
+    async with connect() as db:
+        async with db.execute(query, params) as c:
+            rows = await c.fetchall()
+    # Лишняя (limit + 1) строка только показывает, есть ли еще страница в эту сторону
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        return UsersPage(rows[::-1], has_prev=more, has_next=bool(rows))
+    return UsersPage(rows, has_prev=after is not None and bool(rows), has_next=more)
 
 
 async def get_user_by_id(user_id: int) -> Optional[str]:
     """Возвращает first_name пользователя по user_id."""
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with connect() as db:
         async with db.execute("SELECT first_name FROM users WHERE user_id = ?", (user_id,)) as c:
             row = await c.fetchone()
             return row[0] if row else None
@@ -319,35 +699,49 @@ async def get_user_by_id(user_id: int) -> Optional[str]:
 
 async def get_month_hours_for_user(user_id: int, m_start: date) -> int:
     """Возвращает количество МИНУТ за месяц."""
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute("SELECT SUM(minutes_worked) FROM shifts WHERE user_id = ? AND shift_date >= ?",
+    async with connect() as db:
+        async with db.execute("SELECT SUM(minutes) FROM user_day_totals WHERE user_id = ? AND day >= ?",
                               (user_id, m_start.isoformat())) as c:
             res = await c.fetchone()
             return res[0] if res and res[0] else 0
 
 
 async def add_manual_adjustment(user_id: int, role_id: int, minutes: int):
-    now_iso = get_now().isoformat()
+    now = get_now()
     today_iso = get_today().isoformat()
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute("SELECT rate FROM roles WHERE role_id = ?", (role_id,)) as rc:
-            rate_str = (await rc.fetchone())[0]
+    async with connect() as db:
+        async with db.execute("SELECT rate, rate_minor FROM roles WHERE role_id = ?", (role_id,)) as rc:
+            rate_str, rate_minor = await rc.fetchone()
         await db.execute("""
-            INSERT INTO shifts (user_id, role_id, shift_date, start_time, end_time, minutes_worked, rate_at_time, entry_type)
-            VALUES (?, ?, ?, ?, ?, ?, ?, 'manual')
-        """, (user_id, role_id, today_iso, now_iso, now_iso, minutes, rate_str))
+            INSERT INTO shifts (user_id, role_id, shift_date, start_time, end_time, start_ts, end_ts,
+                                minutes_worked, rate_at_time, rate_minor, earned_minor, entry_type)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'manual')
+        """, (user_id, role_id, today_iso, now.isoformat(), now.isoformat(), to_ts(now), to_ts(now),
+              minutes, rate_str, rate_minor, minutes * rate_minor))
+        totals = await _add_to_day_totals(db, [(user_id, today_iso, role_id, minutes, minutes * rate_minor)])
         await db.commit()
+        _on_totals_committed(totals)
 
 
 async def delete_user(user_id: int):
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with connect() as db:
         await db.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
         await db.commit()
+    locale_cache.pop(user_id)
+    current_shard().report_cache.invalidate(user_id)
+
+
+async def deactivate_user(user_id: int):
+    """Убирает сотрудника из списков точки; смены и итоги остаются для отчетов за прошлые периоды."""
+    async with connect() as db:
+        await db.execute("UPDATE users SET active = 0 WHERE user_id = ?", (user_id,))
+        await db.commit()
+    current_shard().report_cache.invalidate(user_id)
 
 
 async def check_user_has_roles(user_id: int) -> bool:
     """Проверяет, привязана ли к пользователю хотя бы одна роль."""
-    async with aiosqlite.connect(DB_NAME) as db:
+    async with connect() as db:
         async with db.execute(
                 "SELECT 1 FROM user_roles WHERE user_id = ? LIMIT 1",
                 (user_id,)
@@ -357,66 +751,341 @@ async def check_user_has_roles(user_id: int) -> bool:
 
 
 async def get_total_summary_report(start_date: date, end_date: date):
-    """Возвращает общую сумму и время по всем сотрудникам за период."""
-    query = """
-        SELECT u.first_name, s.start_time, s.end_time, s.minutes_worked, s.rate_at_time, s.entry_type
+    """
+    Возвращает общую сумму и время по всем сотрудникам за период.
+    Итоги: { user_id: {"name": str, "mins": int, "money": Decimal} }, минуты, деньги.
+    """
+    params = (start_date.isoformat(), end_date.isoformat())
+    shard = current_shard()
+    cache = shard.report_cache
+    cached = cache.get("total_summary", None, *params)
+    if cached is not MISSING:
+        return cached
+    generation = cache.generation
+    # Закрытые смены и корректировки берутся из накопленных итогов:
+    # по два поиска на сотрудника, какой бы длинной ни была история и период.
+    # Идущие смены считаются "вживую" на текущий момент
+    open_query = """
+        SELECT s.user_id, u.first_name, s.rate_minor, s.start_ts
         FROM shifts s
         JOIN users u ON s.user_id = u.user_id
         WHERE s.shift_date BETWEEN ? AND ?
+          AND s.end_time IS NULL AND s.entry_type != 'manual'
     """
 
-    user_totals = {}  # { "Имя": {"mins": 0, "money": Decimal} }
+    user_totals = {}
     grand_total_mins = 0
-    grand_total_money = Decimal('0.00')
-    now_naive = get_now().replace(tzinfo=None)
+    grand_total_minor = 0
+    now_ts = to_ts(get_now())
+
+    def _add(uid, name, mins, minor):
+        nonlocal grand_total_mins, grand_total_minor
+        totals = user_totals.setdefault(uid, {"name": name, "mins": 0, "money": 0})
+        totals["mins"] += mins
+        totals["money"] += minor
+        grand_total_mins += mins
+        grand_total_minor += minor
+
+    await load_day_prefix()
+    async with connect() as db:
+        async with db.execute("SELECT user_id, first_name FROM users") as cursor:
+            async for uid, name in cursor:
+                mins, minor, shifts = shard.day_prefix.range(uid, *params)
+                if shifts:
+                    _add(uid, name, mins, minor)
+        async with db.execute(open_query, params) as cursor:
+            async for uid, name, rate_minor, s_ts in cursor:
+                current_mins = max((now_ts - s_ts) // 60, 0)
+                _add(uid, name, current_mins, current_mins * rate_minor)
+
+    for totals in user_totals.values():
+        totals["money"] = minor_to_decimal(totals["money"])
+    user_totals = dict(sorted(user_totals.items(), key=lambda item: (item[1]["name"] or "", item[0])))
+    result = (user_totals, grand_total_mins, minor_to_decimal(grand_total_minor))
+    cache.set("total_summary", None, *params, result, get_today().isoformat(), generation)
+    return result
+
+
+# --- ДНЕВНЫЕ ИТОГИ (user_day_totals) ---
+# Закрытые смены и корректировки, свернутые по (сотрудник, день, должность).
+# Пишутся в той же транзакции, что и сама смена; rebuild/check — для обслуживания
+# (python manage.py rebuild-totals / check-totals).
+
+_DAY_TOTALS_UPSERT = """
+    INSERT INTO user_day_totals (user_id, day, role_id, minutes, earned_minor, shifts)
+    VALUES (?, ?, ?, ?, ?, 1)
+    ON CONFLICT (user_id, day, role_id) DO UPDATE SET
+        minutes = minutes + excluded.minutes,
+        earned_minor = earned_minor + excluded.earned_minor,
+        shifts = shifts + excluded.shifts
+"""
+
+_DAY_TOTALS_FROM_SHIFTS = """
+    SELECT user_id, shift_date, role_id,
+           SUM(COALESCE(minutes_worked, 0)), SUM(COALESCE(earned_minor, 0)), COUNT(*)
+    FROM shifts
+    WHERE shift_date BETWEEN :start AND :end
+      AND (end_time IS NOT NULL OR entry_type = 'manual')
+    GROUP BY user_id, shift_date, role_id
+"""
+
+
+# Накопленные итоги (user_day_prefix): строка дня создается со значением предыдущего дня,
+# затем к этому дню и всем следующим прибавляется новая запись
+_DAY_PREFIX_INSERT = """
+    INSERT OR IGNORE INTO user_day_prefix (user_id, day, cum_minutes, cum_earned_minor, cum_shifts)
+    SELECT :user_id, :day, COALESCE(p.cum_minutes, 0), COALESCE(p.cum_earned_minor, 0), COALESCE(p.cum_shifts, 0)
+    FROM (SELECT 1) LEFT JOIN (
+        SELECT cum_minutes, cum_earned_minor, cum_shifts FROM user_day_prefix
+        WHERE user_id = :user_id AND day < :day
+        ORDER BY day DESC LIMIT 1
+    ) p ON 1
+"""
+
+_DAY_PREFIX_SHIFT = """
+    UPDATE user_day_prefix
+    SET cum_minutes = cum_minutes + :minutes,
+        cum_earned_minor = cum_earned_minor + :earned_minor,
+        cum_shifts = cum_shifts + 1
+    WHERE user_id = :user_id AND day >= :day
+"""
+
+_DAY_PREFIX_FROM_TOTALS = """
+    SELECT user_id, day,
+           SUM(SUM(minutes)) OVER w, SUM(SUM(earned_minor)) OVER w, SUM(SUM(shifts)) OVER w
+    FROM user_day_totals
+    GROUP BY user_id, day
+    WINDOW w AS (PARTITION BY user_id ORDER BY day)
+"""
+
+
+async def _add_to_day_totals(db: aiosqlite.Connection, rows) -> List[Tuple[int, str, int, int, int]]:
+    """
+    rows: [(user_id, day, role_id, minutes, earned_minor), ...]. Обновляет user_day_totals
+    и user_day_prefix в текущей транзакции; коммит делает вызывающий.
+    Возвращает rows для _on_totals_committed после коммита.
+    """
+    rows = [(*row[:4], row[4] or 0) for row in rows]
+    await db.executemany(_DAY_TOTALS_UPSERT, rows)
+    params = [{"user_id": uid, "day": day, "minutes": mins, "earned_minor": earned}
+              for uid, day, _, mins, earned in rows]
+    await db.executemany(_DAY_PREFIX_INSERT, params)
+    await db.executemany(_DAY_PREFIX_SHIFT, params)
+    return rows
+
+
+def _on_totals_committed(rows):
+    # Вызывается сразу после commit(), без await между ними: иначе load_day_prefix
+    # может успеть прочитать уже закоммиченные итоги, и запись учтется дважды.
+    shard = current_shard()
+    for uid, day, _, mins, earned in rows:
+        shard.day_prefix.add(uid, day, mins, earned)
+        shard.report_cache.invalidate(uid, day)
+
+
+async def load_day_prefix(force: bool = False):
+    """Загружает user_day_prefix в память (если еще не загружено или force)."""
+    prefix = current_shard().day_prefix
+    if force:
+        prefix.clear()
+    while not prefix.loaded:
+        generation = prefix.generation
+        async with connect() as db:
+            async with db.execute("""
+                SELECT user_id, day, cum_minutes, cum_earned_minor, cum_shifts
+                FROM user_day_prefix ORDER BY user_id, day
+            """) as c:
+                rows = await c.fetchall()
+        # Пока читали, кто-то записал новые итоги — читаем заново
+        if prefix.generation == generation:
+            prefix.load(rows)
+
+
+async def get_range_totals(user_id: int, start_date: date, end_date: date) -> Tuple[int, Decimal, int]:
+    """
+    Минуты, деньги и число записей (закрытых смен и корректировок) сотрудника за
+    произвольный период. Идущие смены не учитываются.
+    """
+    await load_day_prefix()
+    mins, minor, shifts = current_shard().day_prefix.range(user_id, start_date.isoformat(), end_date.isoformat())
+    return mins, minor_to_decimal(minor), shifts
 
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute(query, (start_date.isoformat(), end_date.isoformat())) as cursor:
-            async for row in cursor:
-                name, s_t, e_t, mins, rate_str, entry_type = row
-                rate = Decimal(rate_str)
 
-                if name not in user_totals:
-                    user_totals[name] = {"mins": 0, "money": Decimal('0.00')}
+def _day_range(start: Optional[date], end: Optional[date]) -> Dict[str, str]:
+    return {"start": start.isoformat() if start else "0000-01-01",
+            "end": end.isoformat() if end else "9999-12-31"}
 
-                # Логика расчета (как в детальном отчете)
-                if e_t is None and entry_type != 'manual':
-                    start_dt = datetime.fromisoformat(s_t).replace(tzinfo=None)
-                    current_mins = int((now_naive - start_dt).total_seconds() // 60)
-                    if current_mins < 0: current_mins = 0
-                else:
-                    current_mins = mins
 
-                current_money = (Decimal(current_mins) * rate).quantize(Decimal('0.01'), ROUND_HALF_UP)
+async def rebuild_day_totals(start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Пересчитывает итоги из shifts за период (по умолчанию — за все время), а накопленные
+    итоги — целиком, так как они зависят от всех предыдущих дней. Возвращает число строк итогов.
+    """
+    params = _day_range(start, end)
+    async with connect() as db:
+        await db.execute("DELETE FROM user_day_totals WHERE day BETWEEN :start AND :end", params)
+        cursor = await db.execute(f"""
+            INSERT INTO user_day_totals (user_id, day, role_id, minutes, earned_minor, shifts)
+            {_DAY_TOTALS_FROM_SHIFTS}
+        """, params)
+        await db.execute("DELETE FROM user_day_prefix")
+        await db.execute(f"""
+            INSERT INTO user_day_prefix (user_id, day, cum_minutes, cum_earned_minor, cum_shifts)
+            {_DAY_PREFIX_FROM_TOTALS}
+        """)
+        await db.commit()
+        shard = current_shard()
+        shard.day_prefix.clear()
+        shard.report_cache.clear()
+        return cursor.rowcount
 
-                # Плюсуем сотруднику
-                user_totals[name]["mins"] += current_mins
-                user_totals[name]["money"] += current_money
 
-                # Плюсуем в общий итог
-                grand_total_mins += current_mins
-                grand_total_money += current_money
+async def check_day_totals(start: Optional[date] = None, end: Optional[date] = None) -> List[tuple]:
+    """
+    Сверяет итоги с shifts. Возвращает расхождения:
+    [((user_id, day, role_id), (минуты, пары, смен) в итогах, то же по shifts), ...]
+    """
+    params = _day_range(start, end)
+    async with connect() as db:
+        async with db.execute("""
+            SELECT user_id, day, role_id, minutes, earned_minor, shifts
+            FROM user_day_totals WHERE day BETWEEN :start AND :end
+        """, params) as c:
+            stored = {tuple(row[:3]): tuple(row[3:]) for row in await c.fetchall()}
+        async with db.execute(_DAY_TOTALS_FROM_SHIFTS, params) as c:
+            expected = {tuple(row[:3]): tuple(row[3:]) for row in await c.fetchall()}
+    return [(key, stored.get(key), expected.get(key))
+            for key in sorted(stored.keys() | expected.keys())
+            if stored.get(key) != expected.get(key)]
+
+
+async def check_day_prefix() -> List[tuple]:
+    """
+    Сверяет накопленные итоги с дневными. Возвращает расхождения:
+    [((user_id, day), (минуты, пары, смен) в user_day_prefix, то же по user_day_totals), ...]
+    """
+    async with connect() as db:
+        async with db.execute("""
+            SELECT user_id, day, cum_minutes, cum_earned_minor, cum_shifts FROM user_day_prefix
+        """) as c:
+            stored = {tuple(row[:2]): tuple(row[2:]) for row in await c.fetchall()}
+        async with db.execute(_DAY_PREFIX_FROM_TOTALS) as c:
+            expected = {tuple(row[:2]): tuple(row[2:]) for row in await c.fetchall()}
+    return [(key, stored.get(key), expected.get(key))
+            for key in sorted(stored.keys() | expected.keys())
+            if stored.get(key) != expected.get(key)]
 
-    return user_totals, grand_total_mins, grand_total_money
+
+def cache_stats() -> Dict[str, dict]:
+    """Попадания и промахи кэшей базы — для метрик."""
+    return {"locale": locale_cache.stats(), "reports": current_shard().report_cache.stats()}
 
 
 # --- Функции для планировщика и логики смен ---
-async def get_users_with_active_shifts():
-    """Возвращает список всех открытых смен: [(user_id, role_id, start_time_str), ...]"""
+async def get_users_with_active_shifts(started_since: Optional[datetime] = None):
+    """
+    Возвращает список открытых смен: [(user_id, role_id, start_time_str), ...].
+    started_since — только смены, начатые не раньше этого момента.
+    """
     query = "SELECT user_id, role_id, start_time FROM shifts WHERE end_time IS NULL"
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute(query) as cursor:
+    params = ()
+    if started_since is not None:
+        query += " AND start_ts >= ?"
+        params = (to_ts(started_since),)
+    async with connect() as db:
+        async with db.execute(query, params) as cursor:
             return await cursor.fetchall()
 
 
+# --- ТОЧКА СОТРУДНИКА ---
+# Справочник хранится в базе точки по умолчанию, а в памяти — целиком: точку
+# нужно знать на каждом обновлении, до первого запроса к базе сотрудника.
+
+class UserLocations:
+    def __init__(self):
+        self._codes: Dict[int, str] = {}
+        self.loaded = False
+
+    def load(self, rows):
+        self._codes = dict(rows)
+        self.loaded = True
+
+    def clear(self):
+        self._codes.clear()
+        self.loaded = False
+
+    def get(self, user_id: int) -> Optional[str]:
+        return self._codes.get(user_id)
+
+    def set(self, user_id: int, code: str):
+        self._codes[user_id] = code
+
+
+user_locations = UserLocations()
+
+
+async def load_user_locations():
+    with use_location(DEFAULT_LOCATION):
+        async with connect() as db:
+            async with db.execute("SELECT user_id, location FROM user_locations") as c:
+                user_locations.load(await c.fetchall())
+
+
+async def get_user_location(user_id: int) -> str:
+    """Код точки сотрудника; точка по умолчанию, если он не привязан или точку убрали из конфига."""
+    if not user_locations.loaded:
+        await load_user_locations()
+    code = user_locations.get(user_id)
+    return code if code in _shards else DEFAULT_LOCATION
+
+
+async def set_user_location(user_id: int, code: str):
+    """Привязывает сотрудника к точке; в базе прежней точки он становится неактивным."""
+    if code not in _shards:
+        raise ValueError(f"Неизвестная точка: {code}")
+    previous = await get_user_location(user_id)
+    with use_location(DEFAULT_LOCATION):
+        async with connect() as db:
+            await db.execute(
+                "INSERT INTO user_locations (user_id, location) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET location = excluded.location",
+                (user_id, code))
+            await db.commit()
+    user_locations.set(user_id, code)
+    if previous != code:
+        with use_location(previous):
+            await deactivate_user(user_id)
+
+
 async def set_user_locale(user_id: int, locale: str):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("UPDATE users SET locale = ? WHERE user_id = ?", (locale, user_id))
+    async with connect() as db:
+        cursor = await db.execute("UPDATE users SET locale = ? WHERE user_id = ?", (locale, user_id))
         await db.commit()
+        if cursor.rowcount:
+            locale_cache.set(user_id, locale)
 
 
 async def get_user_locale(user_id: int):
-    async with aiosqlite.connect(DB_NAME) as db:
+    cached = locale_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
+    async with connect() as db:
         async with db.execute("SELECT locale FROM users WHERE user_id = ?", (user_id,)) as cursor:
             row = await cursor.fetchone()
-            return row[0] if row else None
+    locale = row[0] if row else None
+    locale_cache.set(user_id, locale)
+    return locale
+
+
+async def get_users_locales(user_ids: List[int]) -> Dict[int, Optional[str]]:
+    """Языки сразу для многих пользователей (для рассылок планировщика)."""
+    ids = list(dict.fromkeys(user_ids))
+    result = {}
+    async with connect() as db:
+        # SQLite ограничивает число параметров в запросе
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            async with db.execute(f"SELECT user_id, locale FROM users WHERE user_id IN ({placeholders})", chunk) as c:
+                result.update(await c.fetchall())
+    return result
@@ -0,0 +1,103 @@
+# db_pool.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Sequence
+
+import aiosqlite
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за acquire_timeout секунд."""
+
+
+class ConnectionPool:
+    """
+    Пул долгоживущих соединений aiosqlite.
+
+    Каждое соединение открывается один раз (вместе со своим рабочим потоком
+    aiosqlite) и переиспользуется всеми запросами. Соединение выдается
+    эксклюзивно: пока оно у одного корутина, другой его не получит,
+    поэтому транзакции не перемешиваются.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            size: int = 4,
+            acquire_timeout: float = 5.0,
+            pragmas: Sequence[str] = (),
+    ):
+        if size < 1:
+            raise ValueError("Размер пула должен быть не меньше 1")
+        self.path = path
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.pragmas = tuple(pragmas)
+        self._connections: List[aiosqlite.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._idle is not None
+
+    @property
+    def in_use(self) -> int:
+        """Сколько соединений сейчас выдано."""
+        if self._idle is None:
+            return 0
+        return self.size - self._idle.qsize()
+
+    async def open(self):
+        if self.is_open:
+            return
+        idle = asyncio.Queue()
+        try:
+            for _ in range(self.size):
+                conn = await aiosqlite.connect(self.path)
+                self._connections.append(conn)
+                for pragma in self.pragmas:
+                    await conn.execute(pragma)
+                idle.put_nowait(conn)
+        except Exception:
+            await self._close_all()
+            raise
+        self._idle = idle
+        logging.info(f"DB pool: открыто {self.size} соединений к {self.path}")
+
+    async def close(self):
+        if not self.is_open:
+            return
+        self._idle = None
+        await self._close_all()
+        logging.info("DB pool: соединения закрыты")
+
+    async def _close_all(self):
+        for conn in self._connections:
+            try:
+                await conn.close()
+            except Exception as e:
+                logging.error(f"DB pool: ошибка при закрытии соединения: {e}")
+        self._connections.clear()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self._idle is None:
+            raise RuntimeError("Пул соединений не открыт")
+        idle = self._idle
+        try:
+            conn = await asyncio.wait_for(idle.get(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError(
+                f"Нет свободных соединений к {self.path} за {self.acquire_timeout} с"
+            ) from None
+        try:
+            yield conn
+        finally:
+            # Незакоммиченная транзакция не должна уехать к следующему владельцу
+            if conn.in_transaction:
+                try:
+                    await conn.rollback()
+                except Exception as e:
+                    logging.error(f"DB pool: не удалось откатить транзакцию: {e}")
+            idle.put_nowait(conn)
@@ -3,6 +3,8 @@ from aiogram.filters import Filter
 from aiogram.types import Message
 from typing import Callable
 
+from middlewares.locales_manager import i18n as i18n_obj
+
 
 class MagicI18nFilter(Filter):
     def __init__(self, key: str):
@@ -12,5 +14,10 @@ class MagicI18nFilter(Filter):
         if not message.text:
             return False
 
+        # Тексты всех кнопок на всех языках отрендерены заранее:
+        # узнаем кнопку одним поиском в словаре, без форматирования Fluent
+        if self.key in i18n_obj.button_keys:
+            return i18n_obj.button_key(message.text) == self.key
+
         translated_text = _(self.key)
-        return message.text == translated_text
\ No newline at end of file
+        return message.text == translated_text
@@ -0,0 +1,185 @@
+# fsm_storage.py
+"""
+Хранилище состояний FSM в базе бота (таблица fsm_states) вместо MemoryStorage.
+
+Незаконченные диалоги (корректировка часов, удаление сотрудника, выбор ролей)
+переживают перезапуск бота. Чтение — из памяти: горячие записи лежат в LRU,
+в базу идем только за тем, чего там нет. Запись — отложенная: изменения
+копятся и раз в flush_interval секунд пишутся одной транзакцией (и еще раз при
+остановке). Состояния, которые не менялись дольше ttl секунд, считаются
+заброшенными: они не выдаются и периодически удаляются из базы.
+"""
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+import database
+from cache import LRUCache, MISSING
+
+# Как часто удалять из базы заброшенные состояния, секунд
+PURGE_INTERVAL = 600
+
+_UPSERT = """
+    INSERT INTO fsm_states (key, state, data, updated_ts) VALUES (?, ?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        state = excluded.state, data = excluded.data, updated_ts = excluded.updated_ts
+"""
+
+
+class _Record(NamedTuple):
+    state: Optional[str]
+    data: Dict[str, Any]
+    updated_ts: int
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+_EMPTY = _Record(None, {}, 0)
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, maxsize: int = 1024, ttl: float = 24 * 3600, flush_interval: float = 1.0,
+                 clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._hot = LRUCache(maxsize)
+        # Изменения, еще не записанные в базу (пустая запись — удалить строку)
+        self._dirty: Dict[str, _Record] = {}
+        # Пачка, которая пишется сейчас: до commit() в базе еще старые строки
+        self._inflight: Dict[str, _Record] = {}
+        # Растет при каждой записи: прочитанное из базы во время записи в кэш не кладем
+        self._writes = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._last_purge = 0.0
+
+    @asynccontextmanager
+    async def _connect(self):
+        # Состояния пользователей всех точек живут в базе точки по умолчанию
+        with database.use_location(database.DEFAULT_LOCATION):
+            async with database.connect() as db:
+                yield db
+
+    # --- Чтение ---
+
+    def _expired(self, record: _Record) -> bool:
+        return record.updated_ts < self._clock() - self.ttl
+
+    async def _load(self, key: str) -> _Record:
+        async with self._connect() as db:
+            async with db.execute("SELECT state, data, updated_ts FROM fsm_states WHERE key = ?", (key,)) as c:
+                row = await c.fetchone()
+        if row is None:
+            return _EMPTY
+        return _Record(row[0], json.loads(row[1]), row[2])
+
+    async def _get(self, key: StorageKey) -> _Record:
+        k = self._key_builder.build(key)
+        while True:
+            record = self._dirty.get(k) or self._inflight.get(k) or self._hot.get(k)
+            if record is not MISSING:
+                break
+            writes = self._writes
+            record = await self._load(k)
+            if writes == self._writes:
+                # "Пустой" ответ тоже кэшируем: состояние спрашивают на каждом обновлении
+                self._hot.set(k, record)
+                break
+        return _EMPTY if record is not _EMPTY and self._expired(record) else record
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get(key)).state
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get(key)).data.copy()
+
+    # --- Запись ---
+
+    def _put(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]):
+        k = self._key_builder.build(key)
+        record = _Record(state, data, int(self._clock()))
+        self._writes += 1
+        self._hot.set(k, record)
+        self._dirty[k] = record
+        self._ensure_flusher()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(key)
+        self._put(key, state.state if isinstance(state, State) else state, record.data)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._get(key)
+        self._put(key, record.state, data.copy())
+
+    # --- Сброс в базу ---
+
+    def _ensure_flusher(self):
+        task = self._flush_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # Остановка не должна оборвать запись на середине транзакции
+                await asyncio.shield(self.flush())
+                if self._clock() - self._last_purge >= PURGE_INTERVAL:
+                    await self.purge_expired()
+            except Exception as e:
+                logging.error(f"❌ Не удалось сохранить состояния FSM: {e}")
+
+    async def flush(self) -> int:
+        """Записывает накопленные изменения одной транзакцией. Возвращает их число."""
+        async with self._flush_lock:
+            return await self._flush()
+
+    async def _flush(self) -> int:
+        if not self._dirty:
+            return 0
+        batch = self._inflight = self._dirty
+        self._dirty = {}
+        upserts = [(k, r.state, json.dumps(r.data, ensure_ascii=False), r.updated_ts)
+                   for k, r in batch.items() if not r.empty]
+        deletes = [(k,) for k, r in batch.items() if r.empty]
+        try:
+            async with self._connect() as db:
+                await db.executemany(_UPSERT, upserts)
+                await db.executemany("DELETE FROM fsm_states WHERE key = ?", deletes)
+                await db.commit()
+        except BaseException:
+            # Вернем пачку, не затирая то, что успели изменить за время записи
+            for k, record in batch.items():
+                self._dirty.setdefault(k, record)
+            raise
+        finally:
+            self._inflight = {}
+        return len(batch)
+
+    async def purge_expired(self) -> int:
+        """Удаляет из базы состояния, которые не менялись дольше ttl."""
+        self._last_purge = self._clock()
+        async with self._connect() as db:
+            cursor = await db.execute("DELETE FROM fsm_states WHERE updated_ts < ?",
+                                      (int(self._clock() - self.ttl),))
+            await db.commit()
+        return cursor.rowcount
+
+    async def close(self) -> None:
+        task, self._flush_task = self._flush_task, None
+        if task is not None and not task.get_loop().is_closed():
+            task.cancel()
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._hot.stats(), "dirty": len(self._dirty)}
@@ -1,4 +1,5 @@
 from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.context import FSMContext
@@ -9,6 +10,7 @@ from filters import MagicI18nFilter
 import database as db
 import keyboards as kb
 from states import AdminManualAdd, AdminDeleteUser
+from payroll_export import build_payroll_csv, SpooledInputFile
 from config import BotConfig
 from database import get_today
 
@@ -31,12 +33,119 @@ def get_dates_by_period(period: str):
         e_date = first_day_this_month - timedelta(days=1)
         s_date = e_date.replace(day=1)
         return s_date, e_date, "прошлый месяц"
+    elif period == "quarter":
+        s_date = today.replace(month=(today.month - 1) // 3 * 3 + 1, day=1)
+        return s_date, today, "этот квартал"
+    elif period == "year":
+        s_date = today.replace(month=1, day=1)
+        return s_date, today, "этот год"
     return today, today, "период"
 
 
+RANGE_PERIODS = ("today", "week", "month", "prev_month", "quarter", "year")
+
+
+def parse_range_args(args: str):
+    """
+    Период для /range: "quarter", "year" (и другие периоды get_dates_by_period)
+    или две даты "2024-01-01 2024-03-31". None, если разобрать не удалось.
+    """
+    parts = (args or "").split()
+    if len(parts) == 1 and parts[0] in RANGE_PERIODS:
+        return get_dates_by_period(parts[0])
+    if len(parts) == 2:
+        try:
+            s_date, e_date = date.fromisoformat(parts[0]), date.fromisoformat(parts[1])
+        except ValueError:
+            return None
+        if s_date <= e_date:
+            return s_date, e_date, "период"
+    return None
+
+
+def format_total_report(p_name: str, s_date: date, e_date: date, user_totals: dict, g_money) -> str:
+    report = [
+        f"🧾 <b>ОБЩИЙ ОТЧЕТ: {p_name.upper()}</b>",
+        f"📅 {s_date} — {e_date}",
+        "---"
+    ]
+
+    for data in user_totals.values():
+        h_str = db.format_minutes_to_str(data["mins"])
+        report.append(f"👤 {data['name']}: <b>{h_str}</b> | {data['money']} RSD")
+
+    report.append("---")
+    report.append(f"💰 <b>ИТОГО К ВЫПЛАТЕ: {g_money} RSD</b>")
+    return "\n".join(report)
+
+
+def format_locations_report(p_name: str, s_date: date, e_date: date, results: dict) -> str:
+    """Общий отчет по нескольким точкам: results — {код точки: итог get_total_summary_report}."""
+    titles = {shard.code: shard.title for shard in db.locations()}
+    report = [
+        f"🧾 <b>ОБЩИЙ ОТЧЕТ: {p_name.upper()}</b>",
+        f"📅 {s_date} — {e_date}",
+    ]
+    grand_money = 0
+    for code, (user_totals, g_mins, g_money) in results.items():
+        if not user_totals:
+            continue
+        report.append("---")
+        report.append(f"📍 <b>{titles.get(code, code)}</b>")
+        for data in user_totals.values():
+            h_str = db.format_minutes_to_str(data["mins"])
+            report.append(f"👤 {data['name']}: <b>{h_str}</b> | {data['money']} RSD")
+        report.append(f"💵 По точке: {db.format_minutes_to_str(g_mins)} | {g_money} RSD")
+        grand_money += g_money
+
+    report.append("---")
+    report.append(f"💰 <b>ИТОГО К ВЫПЛАТЕ: {grand_money} RSD</b>")
+    return "\n".join(report)
+
+
+async def total_report_text(p_name: str, s_date: date, e_date: date):
+    """
+    Текст общего отчета за период или None, если данных нет.
+    Если точек несколько — по всем сразу, запросы к их базам идут параллельно.
+    """
+    if len(db.locations()) == 1:
+        user_totals, g_mins, g_money = await db.get_total_summary_report(s_date, e_date)
+        return format_total_report(p_name, s_date, e_date, user_totals, g_money) if user_totals else None
+    results = await db.gather_locations(db.get_total_summary_report, s_date, e_date)
+    if not any(user_totals for user_totals, unused, unused in results.values()):
+        return None
+    return format_locations_report(p_name, s_date, e_date, results)
+
+
+async def user_range_report_text(user_id: int, p_name: str, s_date: date, e_date: date):
+    """
+    Итог одного сотрудника за период по накопленным итогам — в базе его точки.
+    None, если закрытых смен и корректировок за период нет.
+    """
+    code = await db.get_user_location(user_id)
+    minutes, money, records = await db.run_in_location(code, db.get_range_totals, user_id, s_date, e_date)
+    if not records:
+        return None
+    user_name = await db.run_in_location(code, db.get_user_by_id, user_id) or "Сотрудник"
+    return "\n".join([
+        f"👤 <b>{user_name}</b>: {p_name}",
+        f"📅 {s_date} — {e_date}",
+        f"⏱ Итого времени: <b>{db.format_minutes_to_str(minutes)}</b>",
+        f"🧾 Записей: {records} (без идущих смен)",
+        f"💰 <b>К ВЫПЛАТЕ: {money} RSD</b>",
+    ])
+
+
+async def _users_page_from_callback(direction: str, user_id: str) -> db.UsersPage:
+    """Страница по кнопке ◀️ / ▶️; если сотрудник-курсор удален — первая страница."""
+    cursor = {"before": int(user_id)} if direction == "p" else {"after": int(user_id)}
+    page = await db.get_users_page(**cursor)
+    return page if page.users else await db.get_users_page()
+
+
 # --- Главное меню админа ---
 @router.message(MagicI18nFilter("button_admin_panel"))
-async def admin_panel(message: Message, _: Callable, config: BotConfig):
+async def admin_panel(message: Message, _: Callable, locale: str, config: BotConfig):
     user_id = message.from_user.id
     await db.add_or_update_user(
         user_id=user_id,
@@ -45,7 +154,7 @@ async def admin_panel(message: Message, _: Callable, config: BotConfig):
     )
     await message.answer(
         _("admin_panel_welcome"),
-        reply_markup=kb.get_admin_panel_keyboard(_)
+        reply_markup=kb.get_admin_panel_keyboard(locale)
     )
 
 
@@ -55,69 +164,120 @@ async def admin_report_select_type(callback: CallbackQuery, _: Callable):
     period = callback.data.split(":")[1]
     s, e, p_text = get_dates_by_period(period)
 
-    users = await db.get_all_users()
-    if not users:
+    page = await db.get_users_page()
+    if not page.users:
         await callback.answer("Сотрудники не найдены", show_alert=True)
         return
 
     # Передаем _ в клавиатуру
     await callback.message.edit_text(
         f"📋 Отчеты за <b>{p_text}</b>.\nВыберите сотрудника или посмотрите общий итог:",
-        reply_markup=kb.get_users_report_keyboard(_, period, users)
+        reply_markup=kb.get_users_report_keyboard(_, period, page)
     )
     await callback.answer()
 
 
+@router.callback_query(F.data.startswith("rep_pg:"))
+async def admin_report_users_page(callback: CallbackQuery, _: Callable):
+    unused, period, direction, uid = callback.data.split(":")
+    page = await _users_page_from_callback(direction, uid)
+    await callback.message.edit_reply_markup(reply_markup=kb.get_users_report_keyboard(_, period, page))
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("users_pg:"))
+async def admin_users_page(callback: CallbackQuery, _: Callable):
+    unused, prefix, direction, uid = callback.data.split(":")
+    page = await _users_page_from_callback(direction, uid)
+    await callback.message.edit_reply_markup(reply_markup=kb.get_user_selection_keyboard(_, page, prefix))
+    await callback.answer()
+
+
 # --- 2. ОБЩИЙ ИТОГ ПО ВСЕМ ---
 @router.callback_query(F.data.startswith("total_view:"))
 async def admin_total_report_by_period(callback: CallbackQuery, _: Callable):
     period = callback.data.split(":")[1]
     s_date, e_date, p_name = get_dates_by_period(period)
 
-    user_totals, g_mins, g_money = await db.get_total_summary_report(s_date, e_date)
-
-    if not user_totals:
+    text = await total_report_text(p_name, s_date, e_date)
+    if text is None:
         await callback.answer(f"За {p_name} данных нет", show_alert=True)
         return
 
-    report = [
-        f"🧾 <b>ОБЩИЙ ОТЧЕТ: {p_name.upper()}</b>",
-        f"📅 {s_date} — {e_date}",
-        "---"
-    ]
-
-    for name, data in user_totals.items():
-        h_str = db.format_minutes_to_str(data["mins"])
-        report.append(f"👤 {name}: <b>{h_str}</b> | {data['money']} RSD")
-
-    report.append("---")
-    report.append(f"💰 <b>ИТОГО К ВЫПЛАТЕ: {g_money} RSD</b>")
-
     back_kb = InlineKeyboardBuilder()
     back_kb.button(text=_("admin_button_back"), callback_data=f"admin_rep:{period}")
 
-    await callback.message.edit_text("\n".join(report), reply_markup=back_kb.as_markup())
+    await callback.message.edit_text(text, reply_markup=back_kb.as_markup())
     await callback.answer()
 
 
-# --- 3. ДЕТАЛЬНЫЙ ОТЧЕТ ПО СОТРУДНИКУ ---
-@router.callback_query(F.data.startswith("view_rep:"))
-async def admin_report_detailed(callback: CallbackQuery, _: Callable):
-    unused, period, uid = callback.data.split(":")
-    uid = int(uid)
-    s_date, e_date, unused = get_dates_by_period(period)
+# --- ВЕДОМОСТЬ ЗА ПЕРИОД В CSV ---
+@router.callback_query(F.data.startswith("export:"))
+async def admin_export_payroll(callback: CallbackQuery):
+    period = callback.data.split(":")[1]
+    s_date, e_date, p_name = get_dates_by_period(period)
 
-    minutes, total_money, shifts = await db.get_user_shifts_report(uid, s_date, e_date)
+    export = await build_payroll_csv(s_date, e_date)
+    try:
+        if not export.shifts:
+            await callback.answer(f"За {p_name} данных нет", show_alert=True)
+            return
+        await callback.answer()
+        await callback.message.answer_document(
+            SpooledInputFile(export.file, filename=f"payroll_{s_date}_{e_date}.csv"),
+            caption=(
+                f"🧾 Ведомость за <b>{p_name}</b>: {s_date} — {e_date}\n"
+                f"👥 Сотрудников: {export.users}, записей: {export.shifts}\n"
+                f"💰 <b>ИТОГО К ВЫПЛАТЕ: {db.minor_to_decimal(export.earned_minor)} RSD</b>"
+            )
+        )
+    finally:
+        export.file.close()
 
-    user_name = await db.get_user_by_id(uid) or "Сотрудник"
 
-    if not shifts:
-        await callback.message.edit_text(
-            f"❌ У <b>{user_name}</b> нет смен за период {s_date} — {e_date}.",
-            reply_markup=kb.get_admin_panel_keyboard(_)
+# --- ИТОГ ЗА ПРОИЗВОЛЬНЫЙ ПЕРИОД: /range [ID сотрудника] quarter | year | 2024-01-01 2024-03-31 ---
+@router.message(Command("range"))
+async def admin_range_report(message: Message, command: CommandObject):
+    parts = (command.args or "").split()
+    user_id = int(parts.pop(0)) if parts and parts[0].isdigit() else None
+    parsed = parse_range_args(" ".join(parts))
+    if parsed is None:
+        await message.answer(
+            "Использование:\n"
+            "<code>/range quarter</code> — текущий квартал\n"
+            "<code>/range year</code> — текущий год\n"
+            "<code>/range 2024-01-01 2024-03-31</code> — с даты по дату\n"
+            "<code>/range 123456789 year</code> — по одному сотруднику (ID в Telegram)"
         )
         return
+    s_date, e_date, p_name = parsed
+
+    if user_id is not None:
+        text = await user_range_report_text(user_id, p_name, s_date, e_date)
+    else:
+        text = await total_report_text(p_name, s_date, e_date)
+    if text is None:
+        await message.answer(f"За период {s_date} — {e_date} данных нет")
+        return
 
+    await message.answer(text)
+
+
+# --- 3. ДЕТАЛЬНЫЙ ОТЧЕТ ПО СОТРУДНИКУ (постранично) ---
+async def _detailed_report_page(_: Callable, period: str, uid: int, direction: str = None, shift_id: str = None):
+    """Текст и клавиатура одной страницы отчета. (None, None), если смен за период нет."""
+    s_date, e_date, unused = get_dates_by_period(period)
+    page = None
+    if direction:
+        cursor = {"before": int(shift_id)} if direction == "p" else {"after": int(shift_id)}
+        page = await db.get_user_shifts_page(uid, s_date, e_date, **cursor)
+    if page is None or not page.shifts:
+        page = await db.get_user_shifts_page(uid, s_date, e_date)
+    if not page.shifts:
+        return None, None
+
+    minutes, total_money, unused, has_open = await db.get_user_period_totals(uid, s_date, e_date)
+    user_name = await db.get_user_by_id(uid) or "Сотрудник"
     h_str = db.format_minutes_to_str(minutes)
 
     report_lines = [
@@ -126,31 +286,51 @@ async def admin_report_detailed(callback: CallbackQuery, _: Callable):
         f"⏱ Итого времени: <b>{h_str}</b>",
         "---"
     ]
-    report_lines.extend(shifts)
+    report_lines.extend(text for unused, text in page.shifts)
     report_lines.append("---")
     report_lines.append(f"💰 <b>ИТОГО К ВЫПЛАТЕ: {total_money} RSD</b>")
 
-    if any("🟢" in s or "⚡️" in s for s in shifts):
+    if has_open:
         report_lines.append("\n🟢 <i>Смена ещё идет, расчет актуален на текущий момент.</i>")
 
-    back_kb = InlineKeyboardBuilder()
-    back_kb.button(text=_("admin_button_back"), callback_data=f"admin_rep:{period}")
+    markup = kb.get_shifts_page_keyboard(_, page, f"rep_sh:{period}:{uid}", back_callback=f"admin_rep:{period}")
+    return "\n".join(report_lines), markup
 
-    text = "\n".join(report_lines)
-    if len(text) > 4000:
-        for x in range(0, len(text), 4000):
-            await callback.message.answer(text[x:x + 4000])
-    else:
-        await callback.message.edit_text(text, reply_markup=back_kb.as_markup())
+
+@router.callback_query(F.data.startswith("view_rep:"))
+async def admin_report_detailed(callback: CallbackQuery, _: Callable, locale: str):
+    unused, period, uid = callback.data.split(":")
+    uid = int(uid)
+
+    text, markup = await _detailed_report_page(_, period, uid)
+    if text is None:
+        s_date, e_date, unused = get_dates_by_period(period)
+        user_name = await db.get_user_by_id(uid) or "Сотрудник"
+        await callback.message.edit_text(
+            f"❌ У <b>{user_name}</b> нет смен за период {s_date} — {e_date}.",
+            reply_markup=kb.get_admin_panel_keyboard(locale)
+        )
+        return
+
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("rep_sh:"))
+async def admin_report_detailed_page(callback: CallbackQuery, _: Callable):
+    unused, period, uid, direction, shift_id = callback.data.split(":")
+    text, markup = await _detailed_report_page(_, period, int(uid), direction, shift_id)
+    if text is not None:
+        await callback.message.edit_text(text, reply_markup=markup)
     await callback.answer()
 
 
 # --- Кнопка "Назад" в админ-панель (общая) ---
 @router.callback_query(F.data == "admin_panel")
-async def back_to_admin_main(callback: CallbackQuery, _: Callable):
+async def back_to_admin_main(callback: CallbackQuery, _: Callable, locale: str):
     await callback.message.edit_text(
         _("admin_panel_welcome"),
-        reply_markup=kb.get_admin_panel_keyboard(_)
+        reply_markup=kb.get_admin_panel_keyboard(locale)
     )
     await callback.answer()
 
@@ -158,14 +338,14 @@ async def back_to_admin_main(callback: CallbackQuery, _: Callable):
 # --- РУЧНАЯ КОРРЕКТИРОВКА ---
 @router.callback_query(F.data == "admin_manual_add")
 async def start_manual_add(callback: CallbackQuery, state: FSMContext, _: Callable):
-    users = await db.get_all_users()
-    if not users:
+    page = await db.get_users_page()
+    if not page.users:
         await callback.message.edit_text("В базе нет пользователей.")
         return
     await state.set_state(AdminManualAdd.waiting_for_user)
     await callback.message.edit_text(
         _("admin_select_user_adjust"),
-        reply_markup=kb.get_user_selection_keyboard(_, users, prefix="manual_user")
+        reply_markup=kb.get_user_selection_keyboard(_, page, prefix="manual_user")
     )
 
 
@@ -235,14 +415,14 @@ async def manual_add_minutes_entered(message: Message, state: FSMContext, _: Cal
 # --- УДАЛЕНИЕ ПОЛЬЗОВАТЕЛЯ ---
 @router.callback_query(F.data == "admin_delete_start")
 async def start_delete_user(callback: CallbackQuery, state: FSMContext, _: Callable):
-    users = await db.get_all_users()
-    if not users:
+    page = await db.get_users_page()
+    if not page.users:
         await callback.message.edit_text("В базе нет пользователей.")
         return
     await state.set_state(AdminDeleteUser.waiting_for_user)
     await callback.message.edit_text(
         _("admin_select_user_delete"),
-        reply_markup=kb.get_user_selection_keyboard(_, users, prefix="delete_user")
+        reply_markup=kb.get_user_selection_keyboard(_, page, prefix="delete_user")
     )
 
 
@@ -1,7 +1,7 @@
 # handlers/common.py
 from aiogram import Bot, Router, F
 from aiogram.types import Message, CallbackQuery, BotCommand, BotCommandScopeChat
-from aiogram.filters import CommandStart, Command
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from typing import Callable
 
@@ -14,9 +14,38 @@ from states import UserSetup
 
 router = Router()
 
+# Ссылка t.me/<бот>?start=loc_<код точки> (QR-код на стойке) привязывает сотрудника к точке
+LOCATION_LINK_PREFIX = "loc_"
+
+
+@router.message(CommandStart(deep_link=True, magic=F.args.startswith(LOCATION_LINK_PREFIX)))
+async def cmd_start_location(message: Message, command: CommandObject, state: FSMContext,
+                             config: BotConfig, _: Callable, locale: str):
+    user_id = message.from_user.id
+    code = command.args[len(LOCATION_LINK_PREFIX):]
+    shard = next((s for s in db.locations() if s.code == code), None)
+    if shard is None:
+        await message.answer(_("location_unknown"))
+        return
+
+    saved_locale = await db.get_user_locale(user_id)
+    if code != await db.get_user_location(user_id):
+        # Открытая смена осталась бы в базе прежней точки без закрытия
+        if await db.is_shift_active(user_id):
+            await message.answer(_("location_switch_active_shift"))
+            return
+        await db.set_user_location(user_id, code)
+
+    with db.use_location(code):
+        await message.answer(_("location_set", location=shard.title))
+        await cmd_start(message, state, config, _, locale)
+        if saved_locale:
+            await db.set_user_locale(user_id, saved_locale)
+
+
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext, config: BotConfig, _: Callable):
+async def cmd_start(message: Message, state: FSMContext, config: BotConfig, _: Callable, locale: str):
     await state.clear()
     user_id = message.from_user.id
 
@@ -45,7 +74,7 @@ async def cmd_start(message: Message, state: FSMContext, config: BotConfig, _: C
         is_admin = user_id in config.admin_ids
         await message.answer(
             _("welcome", user_name=message.from_user.first_name),
-            reply_markup=await kb.get_main_menu_keyboard(_, user_id, is_admin)
+            reply_markup=await kb.get_main_menu_keyboard(locale, user_id, is_admin)
         )
 
 
@@ -89,7 +118,7 @@ async def set_user_language(callback: CallbackQuery, _: Callable, config: BotCon
     is_admin = user_id in config.admin_ids
     await callback.message.answer(
         _new("welcome", user_name=callback.from_user.first_name),
-        reply_markup=await kb.get_main_menu_keyboard(_new, user_id, is_admin)
+        reply_markup=await kb.get_main_menu_keyboard(new_locale, user_id, is_admin)
     )
 
     await callback.answer()
@@ -97,7 +126,7 @@ async def set_user_language(callback: CallbackQuery, _: Callable, config: BotCon
 
 @router.message(Command("help"))
 @router.message(MagicI18nFilter("button_help"))
-async def cmd_help(message: Message, _: Callable, config: BotConfig):
+async def cmd_help(message: Message, _: Callable, locale: str, config: BotConfig):
     user_id = message.from_user.id
 
     # Обновляем данные (на случай, если юзер сменил имя в TG)
@@ -120,5 +149,5 @@ async def cmd_help(message: Message, _: Callable, config: BotConfig):
     is_admin = user_id in config.admin_ids
     await message.answer(
         help_text,
-        reply_markup=await kb.get_main_menu_keyboard(_, user_id, is_admin)
+        reply_markup=await kb.get_main_menu_keyboard(locale, user_id, is_admin)
     )
@@ -9,12 +9,7 @@ from middlewares.locales_manager import i18n as i18n_obj
 
 router = Router()
 
-_BUTTON_KEYS = ["button_start_shift", "button_end_shift", "button_my_stats", "button_help"]
-_BUTTON_TEXTS = frozenset(
-    i18n_obj.get(key, locale=lang)
-    for lang in ["ru", "sr", "en"]
-    for key in _BUTTON_KEYS
-)
+_BUTTON_KEYS = frozenset({"button_start_shift", "button_end_shift", "button_my_stats", "button_help"})
 
 # Этот фильтр ловит ВСЕ сообщения в группах
 router.message.filter(F.chat.type.in_({"group", "supergroup"}))
@@ -48,5 +43,5 @@ async def any_message_in_group(message: Message, _: Callable):
     if not message.text:
         return
 
-    if message.text in _BUTTON_TEXTS:
+    if i18n_obj.button_key(message.text) in _BUTTON_KEYS:
         await message.reply(_("group_please_go_to_private"))
\ No newline at end of file
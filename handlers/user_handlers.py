@@ -42,7 +42,7 @@ async def setup_toggle_role(callback: CallbackQuery, state: FSMContext, _: Calla
 
 
 @router.callback_query(UserSetup.waiting_for_role_selection, F.data == "setup_finish_roles")
-async def setup_finish_roles(callback: CallbackQuery, state: FSMContext, _: Callable, config: BotConfig):
+async def setup_finish_roles(callback: CallbackQuery, state: FSMContext, _: Callable, locale: str, config: BotConfig):
     user_id = callback.from_user.id
     data = await state.get_data()
     selected_roles = data.get("selected_roles", [])
@@ -57,7 +57,7 @@ async def setup_finish_roles(callback: CallbackQuery, state: FSMContext, _: Call
     is_admin = user_id in config.admin_ids
     await callback.message.edit_text(_("setup_success"), reply_markup=None)
 
-    main_kb = await kb.get_main_menu_keyboard(_, user_id, is_admin)
+    main_kb = await kb.get_main_menu_keyboard(locale, user_id, is_admin)
     await callback.message.answer(
         _("welcome", user_name=callback.from_user.first_name),
         reply_markup=main_kb
@@ -68,8 +68,8 @@ async def setup_finish_roles(callback: CallbackQuery, state: FSMContext, _: Call
 # --- ЛОГИКА СМЕНЫ (АВТОМАТИЧЕСКАЯ) ---
 
 # handlers/user_handlers.py
-@router.message(lambda m, _: m.text == _("button_start_shift"))
-async def handle_start(message: Message, _: Callable, config: BotConfig):
+@router.message(MagicI18nFilter("button_start_shift"))
+async def handle_start(message: Message, _: Callable, locale: str, config: BotConfig):
     user_id = message.from_user.id
     now = get_now()
 
@@ -93,7 +93,7 @@ async def handle_start(message: Message, _: Callable, config: BotConfig):
         role_id, role_name, _role_rate = available_roles[0]
         await db.record_shift_start(user_id, role_id)
         is_admin = user_id in config.admin_ids
-        reply_kb = await kb.get_main_menu_keyboard(_, user_id, is_admin)
+        reply_kb = await kb.get_main_menu_keyboard(locale, user_id, is_admin)
         await message.answer(f"✅ Смена ({role_name}) открыта в {now.strftime('%H:%M')}", reply_markup=reply_kb)
     else:
         await message.answer(
@@ -108,7 +108,7 @@ async def handle_start(message: Message, _: Callable, config: BotConfig):
 
 # Хэндлер для выбора роли при старте
 @router.callback_query(F.data.startswith("start_with_role:"))
-async def process_role_choice(callback: CallbackQuery, _: Callable, config: BotConfig):
+async def process_role_choice(callback: CallbackQuery, _: Callable, locale: str, config: BotConfig):
     role_id = int(callback.data.split(":")[1])
     user_id = callback.from_user.id
 
@@ -121,7 +121,7 @@ async def process_role_choice(callback: CallbackQuery, _: Callable, config: BotC
     role_name = next((r[1] for r in user_roles if r[0] == role_id), "???")
 
     is_admin = user_id in config.admin_ids
-    reply_kb = await kb.get_main_menu_keyboard(_, user_id, is_admin)
+    reply_kb = await kb.get_main_menu_keyboard(locale, user_id, is_admin)
 
     await callback.message.edit_text(
         f"✅ Смена открыта!\n🎭 Должность: <b>{role_name}</b>\n⏰ Время: {get_now().strftime('%H:%M')}",
@@ -131,8 +131,8 @@ async def process_role_choice(callback: CallbackQuery, _: Callable, config: BotC
     await callback.answer()
 
 
-@router.message(lambda m, _: m.text == _("button_end_shift"))
-async def handle_end(message: Message, _: Callable, config: BotConfig):
+@router.message(MagicI18nFilter("button_end_shift"))
+async def handle_end(message: Message, _: Callable, locale: str, config: BotConfig):
     user_id = message.from_user.id
     result = await db.close_shift(user_id)
 
@@ -140,7 +140,7 @@ async def handle_end(message: Message, _: Callable, config: BotConfig):
         mins, t_start, t_end = result
         h, m = divmod(mins, 60)
         is_admin = user_id in config.admin_ids
-        reply_kb = await kb.get_main_menu_keyboard(_, user_id, is_admin)
+        reply_kb = await kb.get_main_menu_keyboard(locale, user_id, is_admin)
         await message.answer(
             f"🏁 Смена закрыта! Отработано: {h} ч. {m} м.\n"
             f"⏰ Время: <code>{t_start}</code> — <code>{t_end}</code>\n", reply_markup=reply_kb
@@ -151,20 +151,17 @@ async def handle_end(message: Message, _: Callable, config: BotConfig):
 
 # --- СТАТИСТИКА ПОЛЬЗОВАТЕЛЯ ---
 
-@router.message(lambda m, _: m.text == _("button_my_stats"))
-async def show_stats_menu(message: Message, _: Callable):
+@router.message(MagicI18nFilter("button_my_stats"))
+async def show_stats_menu(message: Message, _: Callable, locale: str):
     await message.answer(
         _("stats_select_period"),
-        reply_markup=kb.get_user_stats_keyboard(_)
+        reply_markup=kb.get_user_stats_keyboard(locale)
     )
 
 
-@router.callback_query(F.data.startswith("usr_st:"))
-async def process_user_stats(callback: CallbackQuery):
-    period = callback.data.split(":")[1]
-    user_id = callback.from_user.id
+async def _user_stats_page(_: Callable, user_id: int, period: str, direction: str = None, shift_id: str = None):
+    """Текст и клавиатура одной страницы статистики. (None, None), если смен нет."""
     today = get_today()
-
     if period == "week":
         start_date = today - timedelta(days=today.weekday())
         period_name = "неделю"
@@ -172,13 +169,16 @@ async def process_user_stats(callback: CallbackQuery):
         start_date = today.replace(day=1)
         period_name = "месяц"
 
-    minutes, money, shifts_list = await db.get_user_shifts_report(user_id, start_date, today)
-
-    if not shifts_list:
-        await callback.message.edit_text(f"❌ За {period_name} смен не найдено.")
-        await callback.answer()
-        return
+    page = None
+    if direction:
+        cursor = {"before": int(shift_id)} if direction == "p" else {"after": int(shift_id)}
+        page = await db.get_user_shifts_page(user_id, start_date, today, **cursor)
+    if page is None or not page.shifts:
+        page = await db.get_user_shifts_page(user_id, start_date, today)
+    if not page.shifts:
+        return f"❌ За {period_name} смен не найдено.", None
 
+    minutes, money, unused, unused = await db.get_user_period_totals(user_id, start_date, today)
     h, m = divmod(minutes, 60)
     report = [
         f"📊 <b>Статистика за {period_name}:</b>",
@@ -186,14 +186,29 @@ async def process_user_stats(callback: CallbackQuery):
         f"💰 Итого: <b>{money} RSD</b>",
         "---"
     ]
-    report.extend(shifts_list)
-    await callback.message.edit_text("\n".join(report))
+    report.extend(text for unused, text in page.shifts)
+    return "\n".join(report), kb.get_shifts_page_keyboard(_, page, f"my_sh:{period}")
+
+
+@router.callback_query(F.data.startswith("usr_st:"))
+async def process_user_stats(callback: CallbackQuery, _: Callable):
+    period = callback.data.split(":")[1]
+    text, markup = await _user_stats_page(_, callback.from_user.id, period)
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("my_sh:"))
+async def process_user_stats_page(callback: CallbackQuery, _: Callable):
+    unused, period, direction, shift_id = callback.data.split(":")
+    text, markup = await _user_stats_page(_, callback.from_user.id, period, direction, shift_id)
+    await callback.message.edit_text(text, reply_markup=markup)
     await callback.answer()
 
 
 # --- СПРАВКА ---
 
-@router.message(lambda m, _: m.text == _("button_help"))
+@router.message(MagicI18nFilter("button_help"))
 async def handle_help(message: Message, _: Callable):
     await message.answer(
         "📖 <b>Справка:</b>\n\n- Нажать 'Начать' можно с 08:30.\n- Если забудете закрыть, в 20:30 бот сделает это сам.")
@@ -1,16 +1,56 @@
 # keyboards.py
+from types import MappingProxyType
 from aiogram.types import (
-    InlineKeyboardMarkup, InlineKeyboardButton
+    InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
-from typing import List, Tuple, Callable
+from typing import List, Optional, Tuple, Callable
 import database as db
+from middlewares.locales_manager import i18n as i18n_obj, LocaleManager
 
+SHIFT_STATUSES = ("active", "none", "finished_all")
 
-# --- Главное меню (Reply) ---
-async def get_main_menu_keyboard(i18n: Callable, user_id: int, is_admin: bool = False):
+
+# --- Готовые клавиатуры ---
+class KeyboardRegistry:
+    """
+    Все клавиатуры, которые не зависят от данных пользователя, собираются один раз
+    при старте на каждый язык и потом только переиспользуются.
+    Разметку из реестра не изменяем — она общая для всех пользователей.
+    """
+
+    def __init__(self, i18n: LocaleManager):
+        self.default_locale = i18n.default_locale
+        main, admin, stats = {}, {}, {}
+        for locale in i18n.bundles:
+            def _(key, **kwargs):
+                return i18n.get(key, locale=locale, **kwargs)
+
+            for status in SHIFT_STATUSES:
+                for is_admin in (False, True):
+                    main[(locale, status, is_admin)] = _build_main_menu(_, status, is_admin)
+            admin[locale] = _build_admin_panel(_)
+            stats[locale] = _build_user_stats(_)
+        self._main = MappingProxyType(main)
+        self._admin = MappingProxyType(admin)
+        self._stats = MappingProxyType(stats)
+        self.language = _build_language()
+
+    def _locale(self, locale: str) -> str:
+        return locale if locale in self._admin else self.default_locale
+
+    def main_menu(self, locale: str, status: str, is_admin: bool) -> ReplyKeyboardMarkup:
+        return self._main[(self._locale(locale), status, bool(is_admin))]
+
+    def admin_panel(self, locale: str) -> InlineKeyboardMarkup:
+        return self._admin[self._locale(locale)]
+
+    def user_stats(self, locale: str) -> InlineKeyboardMarkup:
+        return self._stats[self._locale(locale)]
+
+
+def _build_main_menu(i18n: Callable, status: str, is_admin: bool) -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
-    status = await db.get_shift_status(user_id)
 
     # Используем i18n как функцию: i18n("key")
     if status == 'active':
@@ -27,6 +67,48 @@ async def get_main_menu_keyboard(i18n: Callable, user_id: int, is_admin: bool =
     return builder.as_markup(resize_keyboard=True)
 
 
+def _build_admin_panel(i18n: Callable) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text=i18n("admin_button_report_day"), callback_data="admin_rep:today"),
+        InlineKeyboardButton(text=i18n("admin_button_report_week"), callback_data="admin_rep:week")
+    )
+    builder.row(
+        InlineKeyboardButton(text=i18n("admin_button_report_month"), callback_data="admin_rep:month"),
+        InlineKeyboardButton(text=i18n("admin_button_report_prev_month"), callback_data="admin_rep:prev_month")
+    )
+    builder.row(InlineKeyboardButton(text=i18n("admin_button_manual_add"), callback_data="admin_manual_add"))
+    builder.row(InlineKeyboardButton(text=i18n("admin_button_delete_user"), callback_data="admin_delete_start"))
+    return builder.as_markup()
+
+
+def _build_user_stats(i18n: Callable) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text=i18n("stats_button_week"), callback_data="usr_st:week"),
+        InlineKeyboardButton(text=i18n("stats_button_month"), callback_data="usr_st:month")
+    )
+    return builder.as_markup()
+
+
+def _build_language() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="🇷🇺 Русский", callback_data="set_lang:ru"),
+        InlineKeyboardButton(text="🇺🇸 English", callback_data="set_lang:en")
+    )
+    return builder.as_markup()
+
+
+registry = KeyboardRegistry(i18n_obj)
+
+
+# --- Главное меню (Reply) ---
+async def get_main_menu_keyboard(locale: str, user_id: int, is_admin: bool = False) -> ReplyKeyboardMarkup:
+    status = await db.get_shift_status(user_id)
+    return registry.main_menu(locale, status, is_admin)
+
+
 # --- Выбор роли (Inline) ---
 def get_role_selection_keyboard(
         i18n: Callable,
@@ -52,39 +134,63 @@ def get_role_selection_keyboard(
 
 
 # --- Админ-панель ---
-def get_admin_panel_keyboard(i18n: Callable) -> InlineKeyboardMarkup:
-    builder = InlineKeyboardBuilder()
-    builder.row(
-        InlineKeyboardButton(text=i18n("admin_button_report_day"), callback_data="admin_rep:today"),
-        InlineKeyboardButton(text=i18n("admin_button_report_week"), callback_data="admin_rep:week")
-    )
-    builder.row(
-        InlineKeyboardButton(text=i18n("admin_button_report_month"), callback_data="admin_rep:month"),
-        InlineKeyboardButton(text=i18n("admin_button_report_prev_month"), callback_data="admin_rep:prev_month")
-    )
-    builder.row(InlineKeyboardButton(text=i18n("admin_button_manual_add"), callback_data="admin_manual_add"))
-    builder.row(InlineKeyboardButton(text=i18n("admin_button_delete_user"), callback_data="admin_delete_start"))
-    return builder.as_markup()
+def get_admin_panel_keyboard(locale: str) -> InlineKeyboardMarkup:
+    return registry.admin_panel(locale)
 
 
 # --- ВЫБОР ЮЗЕРА ДЛЯ ОТЧЕТОВ ---
-def get_users_report_keyboard(i18n: Callable, period: str, users: list) -> InlineKeyboardMarkup:
+def _page_nav_row(i18n: Callable, page, callback_prefix: str) -> List[InlineKeyboardButton]:
+    """
+    Кнопки ◀️ / ▶️ для db.UsersPage / db.ShiftsPage:
+    callback_data = "<prefix>:p|n:<id крайней записи страницы>".
+    """
+    nav = []
+    if page.has_prev:
+        nav.append(InlineKeyboardButton(text=i18n("nav_page_prev"),
+                                        callback_data=f"{callback_prefix}:p:{page.first_id}"))
+    if page.has_next:
+        nav.append(InlineKeyboardButton(text=i18n("nav_page_next"),
+                                        callback_data=f"{callback_prefix}:n:{page.last_id}"))
+    return nav
+
+
+def get_users_report_keyboard(i18n: Callable, period: str, page: db.UsersPage) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     # Заменили хардкод на ключи из .ftl
     builder.row(InlineKeyboardButton(text=i18n("admin_button_total_view"), callback_data=f"total_view:{period}"))
-    for user_id, first_name in users:
+    builder.row(InlineKeyboardButton(text=i18n("admin_button_export_csv"), callback_data=f"export:{period}"))
+    for user_id, first_name in page.users:
         builder.row(InlineKeyboardButton(text=first_name, callback_data=f"view_rep:{period}:{user_id}"))
 
+    nav = _page_nav_row(i18n, page, f"rep_pg:{period}")
+    if nav:
+        builder.row(*nav)
     builder.row(InlineKeyboardButton(text=i18n("admin_button_back"), callback_data="admin_panel"))
     return builder.as_markup()
 
 
+# --- ПОСТРАНИЧНЫЙ ДЕТАЛЬНЫЙ ОТЧЕТ ---
+def get_shifts_page_keyboard(i18n: Callable, page: db.ShiftsPage, nav_prefix: str,
+                             back_callback: Optional[str] = None) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    nav = _page_nav_row(i18n, page, nav_prefix)
+    if nav:
+        builder.row(*nav)
+    if back_callback:
+        builder.row(InlineKeyboardButton(text=i18n("admin_button_back"), callback_data=back_callback))
+    return builder.as_markup()
+
+
 # --- ВЫБОР ЮЗЕРА ДЛЯ КОРРЕКТИРОВКИ / УДАЛЕНИЯ ---
-def get_user_selection_keyboard(i18n: Callable, users: list[tuple[int, str]], prefix: str) -> InlineKeyboardMarkup:
+def get_user_selection_keyboard(i18n: Callable, page: db.UsersPage, prefix: str) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for user_id, first_name in users:
+    for user_id, first_name in page.users:
         builder.row(InlineKeyboardButton(text=first_name, callback_data=f"{prefix}_{user_id}"))
 
+    # "users_pg:", а не "<prefix>_": иначе листание поймают обработчики выбора сотрудника
+    nav = _page_nav_row(i18n, page, f"users_pg:{prefix}")
+    if nav:
+        builder.row(*nav)
     builder.row(InlineKeyboardButton(text=i18n("admin_button_back"), callback_data="admin_panel"))
     return builder.as_markup()
 
@@ -101,19 +207,9 @@ def get_delete_confirmation_keyboard(i18n: Callable, user_id_to_delete: int) ->
 
 
 # --- Статистика пользователя ---
-def get_user_stats_keyboard(i18n: Callable):
-    builder = InlineKeyboardBuilder()
-    builder.row(
-        InlineKeyboardButton(text=i18n("stats_button_week"), callback_data="usr_st:week"),
-        InlineKeyboardButton(text=i18n("stats_button_month"), callback_data="usr_st:month")
-    )
-    return builder.as_markup()
+def get_user_stats_keyboard(locale: str) -> InlineKeyboardMarkup:
+    return registry.user_stats(locale)
 
 
-def get_language_keyboard():
-    builder = InlineKeyboardBuilder()
-    builder.row(
-        InlineKeyboardButton(text="🇷🇺 Русский", callback_data="set_lang:ru"),
-        InlineKeyboardButton(text="🇺🇸 English", callback_data="set_lang:en")
-    )
-    return builder.as_markup()
+def get_language_keyboard() -> InlineKeyboardMarkup:
+    return registry.language
@@ -85,6 +85,7 @@ shift_entry_adjustment = • { $date }: [Adj.] ({ $hours } h.)
 
 # --- Admin Panel ---
 admin_button_total_view = 📊 TOTAL (ALL)
+admin_button_export_csv = 📥 Payroll CSV
 admin_panel_welcome = Welcome to the Admin Panel.
 admin_button_report_day = Report for Today
 admin_button_report_week = Weekly Report
@@ -92,6 +93,8 @@ admin_button_report_month = Monthly Report
 admin_button_report_prev_month = Report for PREVIOUS month
 admin_button_manual_add = Adjust Hours
 admin_button_delete_user = ☠️ Delete Employee
+nav_page_prev = ◀️ Prev
+nav_page_next = Next ▶️
 admin_no_users_in_db = There are no users in the database yet.
 menu_updated_admin = Menu updated. # Can keep or remove
 
@@ -216,4 +219,9 @@ language_changed_text = ✅ Language changed successfully!
 
 menu_start = Main Menu 🏠
 menu_help = Help 📖
-menu_lang = Change Language 🌍
\ No newline at end of file
+menu_lang = Change Language 🌍
+
+# --- Locations ---
+location_set = 📍 Your location: <b>{ $location }</b>
+location_unknown = ❌ There is no such location. Ask an administrator for an up-to-date link.
+location_switch_active_shift = ⚠️ Please end your current shift before switching to another location.
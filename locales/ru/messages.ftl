@@ -87,6 +87,7 @@ shift_entry_adjustment = • { $date }: [Корр.] ({ $hours } ч.)
 
 # --- Админ-панель ---
 admin_button_total_view = 📊 ОБЩИЙ ИТОГ (ВСЕ)
+admin_button_export_csv = 📥 Ведомость CSV
 admin_panel_welcome = Добро пожаловать в Админ-панель.
 admin_button_report_day = Сегодня
 admin_button_report_week = Эта неделя
@@ -94,6 +95,8 @@ admin_button_report_month = Этот месяц
 admin_button_report_prev_month = Прошлый месяц
 admin_button_manual_add = ✏️ Корректировка
 admin_button_delete_user = ☠️ Удалить сотрудника
+nav_page_prev = ◀️ Пред.
+nav_page_next = След. ▶️
 admin_no_users_in_db = В базе данных пока нет пользователей.
 menu_updated_admin = Меню обновлено. # Можно оставить или удалить
 
@@ -197,4 +200,9 @@ language_changed_text = ✅ Язык успешно изменен!
 
 menu_start = Главное меню 🏠
 menu_help = Справка 📖
-menu_lang = Сменить язык 🌍
\ No newline at end of file
+menu_lang = Сменить язык 🌍
+
+# --- Точки ---
+location_set = 📍 Ваша точка: <b>{ $location }</b>
+location_unknown = ❌ Такой точки нет. Попросите у администратора актуальную ссылку.
+location_switch_active_shift = ⚠️ Сначала завершите текущую смену, потом переходите на другую точку.
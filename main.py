@@ -1,20 +1,24 @@
 # main.py
 import asyncio
 import logging
+from typing import Optional
 from aiogram import Bot, Dispatcher, F, Router
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-import pytz
 
-from config import load_config, BotConfig
-from database import init_db
+from config import load_config, BotConfig, Config
+from fsm_storage import SQLiteStorage
+import database as db
 from handlers import common, user_handlers, admin_handlers, group_handlers
+import metrics
+from middlewares.location import LocationMiddleware
 from middlewares.simple_i18n import SimpleI18nMiddleware
 from middlewares.locales_manager import i18n as i18n_obj
 
-from scheduler.jobs import cron_auto_close_shifts, remind_end_shift
+from scheduler.jobs import cron_auto_close_shifts, remind_end_shift, wal_checkpoint
+from webhook import run_webhook
 from aiogram.types import BotCommand, BotCommandScopeAllPrivateChats, BotCommandScopeDefault
 
 
@@ -42,23 +46,15 @@ async def set_commands(bot: Bot):
     logging.info(f"📊 API Telegram подтвердил установку команд: {current_commands}")
 
 
-async def main():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    )
-    config = load_config()
-    await init_db()
-    bot = Bot(
-        token=config.bot.token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+def build_dispatcher(bot_config: BotConfig, storage: Optional[BaseStorage] = None) -> Dispatcher:
+    """Dispatcher со всеми роутерами и middleware — один и тот же для polling и webhook."""
+    dp = Dispatcher(storage=storage or SQLiteStorage())
+    metrics.setup_dispatcher(dp)
+    dp.update.middleware(LocationMiddleware())
     dp.update.middleware(SimpleI18nMiddleware())
 
     # --- Pass config ---
-    dp["config"] = config.bot
+    dp["config"] = bot_config
 
     # --- Register Routers ---
     dp.include_router(group_handlers.router)
@@ -66,41 +62,82 @@ async def main():
     dp.include_router(user_handlers.router)
     admin_router = Router()
     admin_router.include_router(admin_handlers.router)
-    admin_router.message.filter(F.from_user.id.in_(config.bot.admin_ids))
-    admin_router.callback_query.filter(F.from_user.id.in_(config.bot.admin_ids))
+    admin_router.message.filter(F.from_user.id.in_(bot_config.admin_ids))
+    admin_router.callback_query.filter(F.from_user.id.in_(bot_config.admin_ids))
     dp.include_router(admin_router)
+    return dp
+
+
+def build_scheduler(bot: Bot, config: Config) -> AsyncIOScheduler:
+    scheduler = AsyncIOScheduler(timezone=db.TZ)
+    # У каждой точки свое время и свой часовой пояс
+    for shard in db.locations():
+        scheduler.add_job(
+            remind_end_shift,
+            trigger='cron',
+            hour=shard.remind_at.hour,
+            minute=shard.remind_at.minute,
+            timezone=shard.tz,
+            kwargs={"bot": bot, "i18n": i18n_obj, "location": shard.code}
+        )
+        scheduler.add_job(
+            cron_auto_close_shifts,
+            trigger='cron',
+            hour=shard.close_at.hour,
+            minute=shard.close_at.minute,
+            timezone=shard.tz,
+            kwargs={"bot": bot, "i18n": i18n_obj, "location": shard.code}
+        )
+    if db.is_wal_enabled():
+        scheduler.add_job(
+            wal_checkpoint,
+            trigger='interval',
+            minutes=config.db.checkpoint_minutes,
+        )
+    return scheduler
 
-    # --- Scheduler ---
-    timezone = pytz.timezone('Europe/Belgrade')
-    scheduler = AsyncIOScheduler(timezone=timezone)
-    scheduler.add_job(
-        remind_end_shift,
-        trigger='cron',
-        hour=20,
-        minute=0,
-        kwargs={"bot": bot, "i18n": i18n_obj}
+
+async def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
     )
-    # Добавляем задачу: каждый день в 20:30
-    scheduler.add_job(
-        cron_auto_close_shifts,
-        trigger='cron',
-        hour=20,
-        minute=30,
-        kwargs={"bot": bot, "i18n": i18n_obj}
+    config = load_config()
+    metrics.instrument_database()
+    db.use_storage_profile(config.db.profile)
+    db.configure_locations(config.locations)
+    await db.init_db()
+    await db.init_pool(size=config.db.pool_size, acquire_timeout=config.db.acquire_timeout)
+    await db.load_user_locations()
+    await db.gather_locations(db.load_day_prefix)
+    bot = Bot(
+        token=config.bot.token,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
+    storage = SQLiteStorage(ttl=config.db.fsm_ttl_hours * 3600, flush_interval=config.db.fsm_flush_seconds)
+    dp = build_dispatcher(config.bot, storage)
+    scheduler = build_scheduler(bot, config)
+    metrics_runner = await metrics.start_metrics_server(config.metrics) if config.metrics.enabled else None
 
     # --- Start ---
     try:
         await set_commands(bot)
         scheduler.start()
         logging.info("Scheduler started.")
-        await bot.delete_webhook(drop_pending_updates=True)
+        if not config.webhook.enabled:
+            await bot.delete_webhook(drop_pending_updates=True)
         for admin_id in config.bot.admin_ids:
             await bot.send_message(admin_id, "✅ Бот запущен")
-        await dp.start_polling(bot)
+        if config.webhook.enabled:
+            await run_webhook(bot, dp, config.webhook)
+        else:
+            await dp.start_polling(bot)
     finally:
         scheduler.shutdown()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await bot.session.close()
+        await db.close_pool()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,70 @@
+# manage.py
+"""
+Служебные команды для базы бота.
+
+    python manage.py rebuild-totals [--from 2024-01-01] [--to 2024-01-31] [--location main]
+    python manage.py check-totals [--from ...] [--to ...] [--location ...]
+
+rebuild-totals пересчитывает и дневные итоги (user_day_totals), и накопленные
+(user_day_prefix). check-totals сверяет оба и завершается с кодом 1, если итоги
+разошлись со сменами. Без --location команда выполняется для каждой точки.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import date
+from typing import List, Optional
+
+import database
+from config import load_locations
+
+
+def _parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="manage.py", description="Обслуживание базы бота")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (
+            ("rebuild-totals", "пересчитать дневные и накопленные итоги из смен"),
+            ("check-totals", "сверить дневные итоги со сменами"),
+    ):
+        cmd = commands.add_parser(name, help=help_text)
+        cmd.add_argument("--from", dest="start", type=date.fromisoformat, default=None)
+        cmd.add_argument("--to", dest="end", type=date.fromisoformat, default=None)
+        cmd.add_argument("--location", default=None, help="код точки (по умолчанию — все)")
+    return parser.parse_args(argv)
+
+
+async def _run(args: argparse.Namespace, location: str) -> int:
+    if args.command == "rebuild-totals":
+        rows = await database.rebuild_day_totals(args.start, args.end)
+        logging.info(f"✅ [{location}] Дневные итоги пересчитаны: {rows} строк")
+        return 0
+
+    mismatches = await database.check_day_totals(args.start, args.end)
+    mismatches += await database.check_day_prefix()
+    for key, stored, expected in mismatches:
+        logging.warning(f"❌ [{location}] {key}: в итогах {stored}, по сменам {expected}")
+    if mismatches:
+        logging.warning(f"[{location}] Расхождений: {len(mismatches)}. "
+                        f"Исправить: python manage.py rebuild-totals --location {location}")
+        return 1
+    logging.info(f"✅ [{location}] Дневные итоги совпадают со сменами")
+    return 0
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    database.configure_locations(load_locations())
+    await database.init_db()
+
+    codes = [args.location] if args.location else [shard.code for shard in database.locations()]
+    status = 0
+    for code in codes:
+        with database.use_location(code):
+            status = max(status, await _run(args, code))
+    return status
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,381 @@
+# metrics.py
+"""
+Метрики бота в текстовом формате Prometheus на локальном GET /metrics.
+
+- хендлеры: время обработки обновления и ошибки по (роутер, хендлер) —
+  MetricsMiddleware снаружи, HandlerLabelMiddleware сообщает, какой хендлер сработал;
+- база: время каждой публичной функции database.py и выдача соединений из
+  пулов точек (instrument_database), заполненность пулов и кэшей;
+- планировщик: длительность задач и итоги их рассылок (timed_job).
+
+Формат собираем сами: метрик немного, а prometheus_client был бы еще одной
+зависимостью ради пары сотен строк текста.
+"""
+import functools
+import inspect
+import logging
+import math
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from aiohttp import web
+from aiogram import Dispatcher
+
+import database as db
+from config import MetricsConfig
+from scheduler.broadcast import DeliveryReport
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Секунды: от быстрого запроса по индексу до отчета за год
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+
+    def register(self, metric: "_Metric"):
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                # Сломанный сборщик не должен отнимать у Prometheus остальные метрики
+                logging.error(f"Metrics: не удалось собрать {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, names, values, value in samples:
+                lines.append(f"{metric.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 func: Optional[Callable[[], Iterable[Tuple[Labels, float]]]] = None,
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # func — значения берутся в момент запроса /metrics (размеры кэшей, пулов)
+        self._func = func
+        self._values: Dict[Labels, float] = {}
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Sequence[Any]) -> Labels:
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name}: ожидались метки {self.labels}, получено {tuple(labels)}")
+        return tuple(str(v) for v in labels)
+
+    def get(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        items = self._func() if self._func is not None else self._values.items()
+        for labels, value in items:
+            yield "", self.labels, labels, value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional[Registry] = REGISTRY):
+        super().__init__(name, help, labels, registry=registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # метки → [число наблюдений в каждой корзине (не накопленное), сумма]
+        self._series: Dict[Labels, list] = {}
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        names = self.labels + ("le",)
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield "_bucket", names, labels + (_format_value(bound),), cumulative
+            yield "_sum", self.labels, labels, total
+            yield "_count", self.labels, labels, cumulative
+
+
+# --- Хендлеры ---
+
+HANDLER_SECONDS = Histogram("coffee_bot_handler_seconds", "Время обработки обновления",
+                            ("router", "handler"))
+HANDLER_ERRORS = Counter("coffee_bot_handler_errors_total", "Необработанные исключения в хендлерах",
+                         ("router", "handler", "error"))
+
+
+class _HandlerLabels:
+    def __init__(self):
+        self.router = ""
+        self.handler = "unhandled"
+
+
+class MetricsMiddleware:
+    """Внешняя middleware обновлений: время и ошибки всей обработки, включая другие middleware."""
+
+    async def __call__(self, handler, event, data):
+        labels = data["metrics_labels"] = _HandlerLabels()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(labels.router, labels.handler, type(e).__name__)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, labels.router, labels.handler)
+
+
+class HandlerLabelMiddleware:
+    """Внутренняя middleware: запоминает, какой хендлер выбран для обновления."""
+
+    async def __call__(self, handler, event, data):
+        labels = data.get("metrics_labels")
+        if labels is not None:
+            callback = data["handler"].callback
+            labels.router = callback.__module__.rsplit(".", 1)[-1]
+            labels.handler = callback.__name__
+        return await handler(event, data)
+
+
+_dispatcher: Optional[Dispatcher] = None
+
+
+def setup_dispatcher(dp: Dispatcher):
+    global _dispatcher
+    _dispatcher = dp
+    dp.update.outer_middleware(MetricsMiddleware())
+    labeler = HandlerLabelMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(labeler)
+
+
+# --- База ---
+
+DB_QUERY_SECONDS = Histogram("coffee_bot_db_query_seconds", "Время функций database.py",
+                             ("query", "location"))
+DB_QUERY_ERRORS = Counter("coffee_bot_db_query_errors_total", "Исключения в функциях database.py",
+                          ("query", "location", "error"))
+DB_CONNECTIONS = Counter("coffee_bot_db_connections_total", "Выданные соединения с базой", ("location",))
+DB_CONNECTION_WAIT = Histogram("coffee_bot_db_connection_wait_seconds",
+                               "Ожидание свободного соединения из пула", ("location",))
+
+
+def _pool_connections():
+    for shard in db.locations():
+        if shard.pool is not None:
+            yield (shard.code, "in_use"), shard.pool.in_use
+            yield (shard.code, "size"), shard.pool.size
+
+
+DB_POOL = Gauge("coffee_bot_db_pool_connections", "Соединения пула: размер и сколько выдано",
+                ("location", "state"), func=_pool_connections)
+
+
+def _timed_query(func):
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        location = db.current_shard().code
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            DB_QUERY_ERRORS.inc(name, location, type(e).__name__)
+            raise
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, name, location)
+
+    wrapper.metrics_wrapped = True
+    return wrapper
+
+
+def _counted_connect(connect):
+    @functools.wraps(connect)
+    @asynccontextmanager
+    async def wrapper():
+        location = db.current_shard().code
+        started = time.perf_counter()
+        async with connect() as conn:
+            DB_CONNECTION_WAIT.observe(time.perf_counter() - started, location)
+            DB_CONNECTIONS.inc(location)
+            yield conn
+
+    wrapper.metrics_wrapped = True
+    return wrapper
+
+
+# Запускают другие функции database в нужной точке, сами в базу не ходят:
+# их время уже посчитано во вложенных вызовах
+NOT_QUERIES = frozenset({"run_in_location", "gather_locations"})
+
+
+def instrument_database():
+    """
+    Подменяет публичные async-функции database.py (кроме NOT_QUERIES) обертками с замером
+    времени, а connect() — счетчиком соединений. Все вызовы идут через атрибуты модуля
+    (db.close_shift и т.п.), поэтому обертки видят и внутренние вызовы. Повторный вызов ничего не меняет.
+    """
+    for name, func in list(vars(db).items()):
+        if name.startswith("_") or name in NOT_QUERIES or getattr(func, "metrics_wrapped", False):
+            continue
+        if inspect.iscoroutinefunction(func) and func.__module__ == db.__name__:
+            setattr(db, name, _timed_query(func))
+    if not getattr(db.connect, "metrics_wrapped", False):
+        db.connect = _counted_connect(db.connect)
+
+
+# --- Кэши ---
+
+def _cache_stats():
+    yield ("locale", ""), db.locale_cache.stats()
+    for shard in db.locations():
+        yield ("reports", shard.code), shard.report_cache.stats()
+    storage = _dispatcher.fsm.storage if _dispatcher is not None else None
+    if hasattr(storage, "stats"):
+        yield ("fsm", ""), storage.stats()
+
+
+def _cache_requests():
+    for (cache, location), stats in _cache_stats():
+        yield (cache, location, "hit"), stats["hits"]
+        yield (cache, location, "miss"), stats["misses"]
+
+
+def _cache_entries():
+    for (cache, location), stats in _cache_stats():
+        yield (cache, location), stats["size"]
+
+
+def _fsm_dirty():
+    storage = _dispatcher.fsm.storage if _dispatcher is not None else None
+    if hasattr(storage, "stats"):
+        yield (), storage.stats()["dirty"]
+
+
+CACHE_REQUESTS = Counter("coffee_bot_cache_requests_total", "Обращения к кэшам",
+                         ("cache", "location", "result"), func=_cache_requests)
+CACHE_ENTRIES = Gauge("coffee_bot_cache_entries", "Записей в кэше", ("cache", "location"), func=_cache_entries)
+FSM_DIRTY = Gauge("coffee_bot_fsm_dirty_states", "Состояния FSM, еще не записанные в базу", func=_fsm_dirty)
+
+
+# --- Планировщик ---
+
+JOB_SECONDS = Histogram("coffee_bot_job_seconds", "Длительность задач планировщика", ("job", "location"))
+JOB_RUNS = Counter("coffee_bot_job_runs_total", "Запуски задач планировщика", ("job", "location", "status"))
+JOB_LAST_SUCCESS = Gauge("coffee_bot_job_last_success_timestamp_seconds",
+                         "Время последнего успешного запуска задачи (Unix)", ("job", "location"))
+JOB_MESSAGES = Counter("coffee_bot_job_messages_total", "Сообщения рассылок задач по итогу отправки",
+                       ("job", "location", "outcome"))
+JOB_RETRIES = Counter("coffee_bot_job_send_retries_total", "Повторы отправки после flood control",
+                      ("job", "location"))
+
+
+def timed_job(job: str):
+    """
+    Декоратор задачи планировщика: длительность, успех/ошибка и, если задача
+    вернула DeliveryReport, итоги рассылки. Точка — текущая на момент запуска.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            location = db.current_shard().code
+            started = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception:
+                JOB_RUNS.inc(job, location, "error")
+                raise
+            finally:
+                JOB_SECONDS.observe(time.perf_counter() - started, job, location)
+            JOB_RUNS.inc(job, location, "ok")
+            JOB_LAST_SUCCESS.set(time.time(), job, location)
+            if isinstance(result, DeliveryReport):
+                for outcome in ("sent", "blocked", "failed"):
+                    JOB_MESSAGES.inc(job, location, outcome, amount=getattr(result, outcome))
+                JOB_RETRIES.inc(job, location, amount=result.retries)
+            return result
+        return wrapper
+    return decorator
+
+
+# --- HTTP ---
+
+def build_metrics_app(registry: Registry = REGISTRY) -> web.Application:
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    return app
+
+
+async def start_metrics_server(config: MetricsConfig) -> web.AppRunner:
+    """Поднимает /metrics на config.host:config.port. Остановка — runner.cleanup()."""
+    runner = web.AppRunner(build_metrics_app())
+    await runner.setup()
+    await web.TCPSite(runner, config.host, config.port).start()
+    logging.info(f"📈 Метрики: http://{config.host}:{config.port}/metrics")
+    return runner
@@ -1,16 +1,35 @@
 # middlewares/locales_manager.py
 from pathlib import Path
+from typing import Any, Dict, FrozenSet, Optional, Tuple
 from fluent.runtime import FluentResource, FluentBundle
+from fluent.syntax import ast
+
+from cache import LRUCache, MISSING
+
+# Ключи reply-кнопок: их текст приходит обратно как обычное сообщение
+BUTTON_PREFIX = "button_"
 
 
 class LocaleManager:
-    def __init__(self, default_locale="ru"):
+    def __init__(self, default_locale="ru", args_cache_size=2048):
         self.default_locale = default_locale
         self.bundles = {}
+        # Текст кнопки (на любом языке) -> ключ кнопки
+        self.button_index: Dict[str, str] = {}
+        self.button_keys: FrozenSet[str] = frozenset()
+        # Готовые тексты: (locale, key) -> str для сообщений без аргументов,
+        # и небольшой LRU для сообщений с аргументами
+        self._static_cache: Dict[Tuple[str, str], str] = {}
+        self._args_cache = LRUCache(maxsize=args_cache_size)
+        self.static_hits = 0
+        self.static_misses = 0
         self.load_locales()
 
     def load_locales(self):
         locales_dir = Path(__file__).parent.parent / "locales"
+        message_ids = {}
+        self._static_cache.clear()
+        self._args_cache.clear()
         for locale in ["ru", "en", "sr"]:  # Список твоих языков
             path = locales_dir / locale / "messages.ftl"
             if path.exists():
@@ -19,16 +38,68 @@ class LocaleManager:
                     bundle = FluentBundle([locale])
                     bundle.add_resource(resource)
                     self.bundles[locale] = bundle
+                    message_ids[locale] = {e.id.name for e in resource.body if isinstance(e, ast.Message)}
                 print(f"✅ Локаль {locale} загружена вручную.")
+        self.button_index = self._build_button_index(message_ids)
+        self.button_keys = frozenset(self.button_index.values())
+
+    def _build_button_index(self, message_ids) -> Dict[str, str]:
+        """Один раз рендерит все кнопки всех языков, чтобы потом узнавать их по тексту."""
+        index = {}
+        for locale, ids in message_ids.items():
+            for key in sorted(ids):
+                if not key.startswith(BUTTON_PREFIX):
+                    continue
+                text = self.get(key, locale=locale)
+                if index.setdefault(text, key) != key:
+                    print(f"⚠️ Текст '{text}' используется кнопками '{index[text]}' и '{key}'")
+        return index
+
+    def button_key(self, text: Optional[str]) -> Optional[str]:
+        """Ключ кнопки по ее тексту на любом из языков, либо None."""
+        if not text:
+            return None
+        return self.button_index.get(text)
 
     def get(self, key, locale="ru", **kwargs):
+        # Сообщения без аргументов (кнопки, заголовки) рендерятся один раз на язык
+        if not kwargs:
+            cached = self._static_cache.get((locale, key))
+            if cached is not None:
+                self.static_hits += 1
+                return cached
+            self.static_misses += 1
+            text, ok = self._render(key, locale, kwargs)
+            if ok:
+                self._static_cache[(locale, key)] = text
+            return text
+
+        try:
+            cache_key = (locale, key, frozenset(kwargs.items()))
+            hash(cache_key)
+        except TypeError:
+            # Нехэшируемые аргументы — просто рендерим
+            return self._render(key, locale, kwargs)[0]
+
+        cached = self._args_cache.get(cache_key)
+        if cached is not MISSING:
+            return cached
+        text, ok = self._render(key, locale, kwargs)
+        if ok:
+            self._args_cache.set(cache_key, text)
+        return text
+
+    def _render(self, key, locale, kwargs) -> Tuple[str, bool]:
+        """Форматирует сообщение без кэша. Возвращает (текст, можно ли кэшировать)."""
         bundle = self.bundles.get(locale, self.bundles.get(self.default_locale))
         if not bundle:
-            return key
+            return key, False
 
+        if not bundle.has_message(key):
+            return key, False
         message = bundle.get_message(key)
         if not message or not message.value:
-            return key
+            return key, False
 
         try:
             # Вызываем форматирование
@@ -37,13 +108,21 @@ class LocaleManager:
             # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ:
             # Если результат — это кортеж (текст, ошибки), берем только текст [0]
             if isinstance(result, tuple):
-                return result[0]
+                return result[0], True
 
-            return result
+            return result, True
         except Exception as e:
             print(f"⚠️ Ошибка форматирования ключа '{key}': {e}")
-            return key
+            return key, False
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "static_size": len(self._static_cache),
+            "static_hits": self.static_hits,
+            "static_misses": self.static_misses,
+            "args": self._args_cache.stats(),
+        }
 
 
 # Создаем глобальный объект
-i18n = LocaleManager()
\ No newline at end of file
+i18n = LocaleManager()
@@ -0,0 +1,17 @@
+# middlewares/location.py
+import database as db
+
+
+class LocationMiddleware:
+    """
+    Направляет обработку обновления в базу точки, к которой привязан пользователь:
+    все запросы database внутри хендлера идут в нее. Должен стоять до остальных
+    middleware, которые ходят в базу (например, SimpleI18nMiddleware).
+    """
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        code = await db.get_user_location(user.id) if user else db.DEFAULT_LOCATION
+        with db.use_location(code):
+            data["location"] = code
+            return await handler(event, data)
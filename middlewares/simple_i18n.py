@@ -13,7 +13,7 @@ class SimpleI18nMiddleware:
         user_id = user.id
 
         try:
-            # Пытаемся достать язык из базы
+            # Пытаемся достать язык из базы (в штатном режиме — из db.locale_cache, без запроса)
             locale = await db.get_user_locale(user_id)
         except Exception as e:
             logging.error(f"❌ Ошибка БД в Middleware: {e}")
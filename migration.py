@@ -1,81 +1,425 @@
-import sqlite3
+# migration.py
+"""
+Версионные миграции схемы.
+
+Текущая версия схемы хранится в PRAGMA user_version. При старте init_db()
+читает ее одним запросом и, если все миграции уже применены, больше ничего
+не делает. Неприменённые миграции выполняются по порядку в одной транзакции:
+либо база переходит на последнюю версию целиком, либо остается как была.
+
+Новая миграция — это новая функция с декоратором @migration(N, "..."),
+где N на единицу больше последней. Уже выпущенные миграции не меняем.
+
+Запуск вручную: python migration.py
+"""
+import asyncio
 import logging
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Awaitable, Callable, List, NamedTuple, Optional
+
+import aiosqlite
+import pytz
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[aiosqlite.Connection], Awaitable[None]]
+
 
-DB_NAME = 'coffee_bot.db'
+MIGRATIONS: List[Migration] = []
 
-logging.basicConfig(level=logging.INFO)
 
+def migration(version: int, description: str):
+    def decorator(func):
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Миграция {version} уже зарегистрирована")
+        MIGRATIONS.append(Migration(version, description, func))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return func
+    return decorator
 
-def migrate():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
 
+async def get_schema_version(conn: aiosqlite.Connection) -> int:
+    async with conn.execute("PRAGMA user_version") as c:
+        return (await c.fetchone())[0]
+
+
+async def apply_migrations(conn: aiosqlite.Connection, migrations: List[Migration] = None) -> int:
+    """Применяет недостающие миграции одной транзакцией. Возвращает итоговую версию схемы."""
+    migrations = MIGRATIONS if migrations is None else sorted(migrations, key=lambda m: m.version)
+    current = await get_schema_version(conn)
+    pending = [m for m in migrations if m.version > current]
+    if not pending:
+        return current
+
+    await conn.execute("BEGIN")
     try:
-        logging.info("Начало миграции...")
-
-        # 1. Проверяем, существует ли старая таблица
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='shifts'")
-        if not cursor.fetchone():
-            logging.error("Таблица shifts не найдена. Возможно, миграция уже проведена.")
-            return
-
-        # 2. Переименовываем старую таблицу
-        cursor.execute("ALTER TABLE shifts RENAME TO shifts_old")
-        logging.info("Старая таблица переименована в shifts_old")
-
-        # 3. Создаем новую таблицу (end_time может быть NULL, минуты — INTEGER)
-        cursor.execute('''
-            CREATE TABLE shifts (
-                shift_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL, 
-                role_id INTEGER NOT NULL,
-                shift_date TEXT NOT NULL, 
-                start_time TEXT NOT NULL, 
-                end_time TEXT, 
-                minutes_worked INTEGER DEFAULT 0, 
-                rate_at_time TEXT NOT NULL, 
-                entry_type TEXT NOT NULL DEFAULT 'auto'
-            )
-        ''')
-        logging.info("Новая таблица shifts создана")
+        for m in pending:
+            logging.info(f"Миграция {m.version}: {m.description}")
+            await m.apply(conn)
+        # PRAGMA не принимает параметры, версия — всегда int из реестра
+        await conn.execute(f"PRAGMA user_version = {int(pending[-1].version)}")
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+    logging.info(f"✅ Схема базы обновлена: {current} → {pending[-1].version}")
+    return pending[-1].version
+
+
+async def _columns(conn: aiosqlite.Connection, table: str) -> List[str]:
+    async with conn.execute(f"PRAGMA table_info({table})") as c:
+        return [row[1] for row in await c.fetchall()]
 
-        # 4. Переносим данные с конвертацией
-        # Предполагаем: hours_worked был в часах (float), rate_at_time был в часах (float)
-        # Мы умножаем часы на 60 и округляем. Ставку делим на 60 и храним как строку.
-        cursor.execute('''
+
+def _to_minor(value) -> int:
+    """Денежная сумма (строка или Decimal) → целое число пар, ROUND_HALF_UP."""
+    return int((Decimal(value) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+def _iso_to_ts(value: Optional[str], tz) -> Optional[int]:
+    """ISO-строка времени → секунды Unix. Строки без смещения считаются временем tz."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None  # старые корректировки хранили в start_time слово "manual"
+    if dt.tzinfo is None:
+        dt = tz.localize(dt)
+    return int(dt.timestamp())
+
+
+async def _upsert_roles(conn: aiosqlite.Connection, roles):
+    if "rate_minor" not in await _columns(conn, "roles"):
+        await conn.executemany('''
+            INSERT INTO roles (role_id, name, rate) VALUES (?, ?, ?)
+            ON CONFLICT(role_id) DO UPDATE SET rate = excluded.rate, name = excluded.name
+        ''', roles)
+        return
+    await conn.executemany('''
+        INSERT INTO roles (role_id, name, rate, rate_minor) VALUES (?, ?, ?, ?)
+        ON CONFLICT(role_id) DO UPDATE
+        SET rate = excluded.rate, name = excluded.name, rate_minor = excluded.rate_minor
+    ''', [(rid, name, rate, _to_minor(rate)) for rid, name, rate in roles])
+
+
+# --- РЕЕСТР МИГРАЦИЙ ---
+
+@migration(1, "базовая схема: users, roles, shifts, user_roles")
+async def _m001_baseline(conn: aiosqlite.Connection):
+    # База до появления user_version уже может содержать эти таблицы,
+    # поэтому все шаги этой миграции идемпотентны.
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            locale TEXT DEFAULT 'ru'
+        )
+    ''')
+    if "locale" not in await _columns(conn, "users"):
+        await conn.execute("ALTER TABLE users ADD COLUMN locale TEXT DEFAULT 'ru'")
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS roles (
+            role_id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            rate TEXT NOT NULL
+        )
+    ''')
+
+    # Старый формат shifts хранил часы (hours_worked) и ставку за час
+    shifts_columns = await _columns(conn, "shifts")
+    is_legacy = "hours_worked" in shifts_columns
+    if is_legacy:
+        await conn.execute("ALTER TABLE shifts RENAME TO shifts_old")
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS shifts (
+            shift_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            role_id INTEGER NOT NULL,
+            shift_date TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT,
+            minutes_worked INTEGER DEFAULT 0,
+            rate_at_time TEXT NOT NULL,
+            entry_type TEXT NOT NULL DEFAULT 'auto'
+        )
+    ''')
+    if is_legacy:
+        # Часы → минуты, ставка за час → ставка за минуту
+        await conn.execute('''
             INSERT INTO shifts (
-                user_id, role_id, shift_date, start_time, end_time, 
+                user_id, role_id, shift_date, start_time, end_time,
                 minutes_worked, rate_at_time, entry_type
             )
-            SELECT 
-                user_id, 
-                role_id, 
-                shift_date, 
-                COALESCE(start_time, shift_date || 'T08:30:00'), -- Заглушка, если не было времени
+            SELECT
+                user_id,
+                role_id,
+                shift_date,
+                COALESCE(start_time, shift_date || 'T08:30:00'),
                 end_time,
                 CAST(COALESCE(hours_worked, 0) * 60 AS INTEGER),
                 CAST(ROUND(CAST(rate_at_time AS REAL) / 60, 2) AS TEXT),
                 COALESCE(entry_type, 'auto')
             FROM shifts_old
         ''')
+        await conn.execute("DROP TABLE shifts_old")
+        await conn.execute("DROP TABLE IF EXISTS active_shifts")
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_roles (
+            user_id INTEGER NOT NULL,
+            role_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, role_id)
+        )
+    ''')
+
+
+@migration(2, "индексы под горячие запросы к shifts")
+async def _m002_shifts_indexes(conn: aiosqlite.Connection):
+    # Каждый горячий запрос к shifts должен идти по индексу (см. tests/test_database.py)
+    # Открытые смены: is_shift_active, close_shift, get_users_with_active_shifts
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_shifts_open
+        ON shifts (user_id, role_id, start_time) WHERE end_time IS NULL
+    ''')
+    # Смены сотрудника по дням: get_used_role_ids_today, get_month_hours_for_user, get_user_shifts_report
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_shifts_user_date
+        ON shifts (user_id, shift_date, role_id, end_time, minutes_worked)
+    ''')
+    # Диапазон дат по всем сотрудникам: get_total_summary_report
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_shifts_date
+        ON shifts (shift_date, user_id, minutes_worked, rate_at_time, entry_type, end_time, start_time)
+    ''')
+
+
+@migration(3, "справочник должностей и ставок")
+async def _m003_roles(conn: aiosqlite.Connection):
+    # СТАВКА ЗА 1 МИНУТУ (Например: 11.0 RSD).
+    # Чтобы поменять ставки, добавьте новую миграцию с _upsert_roles.
+    await _upsert_roles(conn, [
+        (1, 'Помощник повара', "6.7"),
+        (2, 'Повар', "6.7"),
+        (3, 'Бариста', "6.2"),
+    ])
+
+
+@migration(4, "деньги в целых парах: roles.rate_minor, shifts.rate_minor, shifts.earned_minor")
+async def _m004_integer_money(conn: aiosqlite.Connection):
+    # rate_minor — пар за минуту, earned_minor — пар за смену (NULL, пока смена идет).
+    # Текстовые rate / rate_at_time остаются для совместимости, но расчеты идут по целым.
+    await conn.execute("ALTER TABLE roles ADD COLUMN rate_minor INTEGER")
+    await conn.execute("ALTER TABLE shifts ADD COLUMN rate_minor INTEGER")
+    await conn.execute("ALTER TABLE shifts ADD COLUMN earned_minor INTEGER")
+
+    async with conn.execute("SELECT role_id, rate FROM roles") as c:
+        roles = await c.fetchall()
+    await conn.executemany("UPDATE roles SET rate_minor = ? WHERE role_id = ?",
+                           [(_to_minor(rate), rid) for rid, rate in roles])
+
+    # Заработок по уже закрытым сменам считаем так же, как считали отчеты:
+    # Decimal(минуты) * ставка, округление до 0.01 по ROUND_HALF_UP
+    updates = []
+    async with conn.execute(
+            "SELECT shift_id, minutes_worked, rate_at_time, end_time, entry_type FROM shifts") as c:
+        async for sid, mins, rate, end_time, entry_type in c:
+            earned = None
+            if end_time is not None or entry_type == 'manual':
+                earned = _to_minor(Decimal(mins or 0) * Decimal(rate))
+            updates.append((_to_minor(rate), earned, sid))
+    await conn.executemany("UPDATE shifts SET rate_minor = ?, earned_minor = ? WHERE shift_id = ?", updates)
+
+    # Сводный отчет теперь читает earned_minor / rate_minor — обновляем покрывающий индекс
+    await conn.execute("DROP INDEX IF EXISTS idx_shifts_date")
+    await conn.execute('''
+        CREATE INDEX idx_shifts_date
+        ON shifts (shift_date, user_id, earned_minor, end_time, entry_type, rate_minor, start_time)
+    ''')
+
+
+@migration(5, "время смен в секундах Unix: shifts.start_ts, shifts.end_ts")
+async def _m005_epoch_timestamps(conn: aiosqlite.Connection):
+    # ISO-строки start_time / end_time остаются, но длительности и фильтры по времени
+    # теперь считаются вычитанием целых чисел. Заполняются все строки, поэтому запросы
+    # читают только start_ts / end_ts, без разбора ISO (пусто только у старых корректировок).
+    # Часовой пояс зафиксирован здесь: в нем бот писал все строки до этой миграции.
+    tz = pytz.timezone('Europe/Belgrade')
+    await conn.execute("ALTER TABLE shifts ADD COLUMN start_ts INTEGER")
+    await conn.execute("ALTER TABLE shifts ADD COLUMN end_ts INTEGER")
+
+    async with conn.execute("SELECT shift_id, start_time, end_time FROM shifts") as c:
+        updates = [(_iso_to_ts(start, tz), _iso_to_ts(end, tz), sid) async for sid, start, end in c]
+    await conn.executemany("UPDATE shifts SET start_ts = ?, end_ts = ? WHERE shift_id = ?", updates)
+
+    # Открытые смены: фильтр "начата после ..." для напоминаний идет по start_ts
+    await conn.execute("DROP INDEX IF EXISTS idx_shifts_open")
+    await conn.execute('''
+        CREATE INDEX idx_shifts_open
+        ON shifts (user_id, role_id, start_ts, start_time) WHERE end_time IS NULL
+    ''')
+    # Сводный отчет считает идущие смены от start_ts
+    await conn.execute("DROP INDEX IF EXISTS idx_shifts_date")
+    await conn.execute('''
+        CREATE INDEX idx_shifts_date
+        ON shifts (shift_date, user_id, earned_minor, end_time, entry_type, rate_minor, start_ts, start_time)
+    ''')
+
+
+@migration(6, "дневные итоги user_day_totals")
+async def _m006_user_day_totals(conn: aiosqlite.Connection):
+    # Итоги по (сотрудник, день, должность) только для закрытых смен и корректировок.
+    # Обновляются в той же транзакции, что и запись смены (см. database._add_to_day_totals).
+    await conn.execute('''
+        CREATE TABLE user_day_totals (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            role_id INTEGER NOT NULL,
+            minutes INTEGER NOT NULL DEFAULT 0,
+            earned_minor INTEGER NOT NULL DEFAULT 0,
+            shifts INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, role_id)
+        ) WITHOUT ROWID
+    ''')
+    # Сводный отчет по всем сотрудникам за период
+    await conn.execute('''
+        CREATE INDEX idx_day_totals_day
+        ON user_day_totals (day, user_id, minutes, earned_minor)
+    ''')
+    await conn.execute('''
+        INSERT INTO user_day_totals (user_id, day, role_id, minutes, earned_minor, shifts)
+        SELECT user_id, shift_date, role_id,
+               SUM(COALESCE(minutes_worked, 0)), SUM(COALESCE(earned_minor, 0)), COUNT(*)
+        FROM shifts
+        WHERE end_time IS NOT NULL OR entry_type = 'manual'
+        GROUP BY user_id, shift_date, role_id
+    ''')
+
+
+@migration(7, "накопленные итоги по дням user_day_prefix")
+async def _m007_user_day_prefix(conn: aiosqlite.Connection):
+    # Для каждого сотрудника и дня — сумма user_day_totals с начала истории по этот день.
+    # Итог за период = значение на конец периода минус значение на день до начала.
+    await conn.execute('''
+        CREATE TABLE user_day_prefix (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            cum_minutes INTEGER NOT NULL,
+            cum_earned_minor INTEGER NOT NULL,
+            cum_shifts INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID
+    ''')
+    await conn.execute('''
+        INSERT INTO user_day_prefix (user_id, day, cum_minutes, cum_earned_minor, cum_shifts)
+        SELECT user_id, day,
+               SUM(SUM(minutes)) OVER w, SUM(SUM(earned_minor)) OVER w, SUM(SUM(shifts)) OVER w
+        FROM user_day_totals
+        GROUP BY user_id, day
+        WINDOW w AS (PARTITION BY user_id ORDER BY day)
+    ''')
+
+
+@migration(8, "индекс users по имени для постраничного списка сотрудников")
+async def _m008_users_name_index(conn: aiosqlite.Connection):
+    # get_users_page: ORDER BY first_name, user_id и курсор по этой же паре
+    await conn.execute("CREATE INDEX idx_users_name ON users (first_name, user_id)")
+
+
+@migration(9, "индекс shifts по (user_id, shift_date, shift_id) для постраничного отчета")
+async def _m009_shifts_user_day_index(conn: aiosqlite.Connection):
+    # get_user_shifts_page листает смены сотрудника по (shift_date, shift_id);
+    # shift_id — это rowid, он и так хранится в конце каждой записи индекса
+    await conn.execute("CREATE INDEX idx_shifts_user_day ON shifts (user_id, shift_date)")
+
+
+@migration(10, "состояния FSM (fsm_states) для SQLiteStorage")
+async def _m010_fsm_states(conn: aiosqlite.Connection):
+    # Ключ — строка DefaultKeyBuilder (бот, чат, пользователь, destiny), data — JSON.
+    # По updated_ts удаляются заброшенные состояния (см. fsm_storage.py)
+    await conn.execute('''
+        CREATE TABLE fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL,
+            updated_ts INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    await conn.execute("CREATE INDEX idx_fsm_states_updated ON fsm_states (updated_ts)")
+
+
+@migration(11, "справочник сотрудник → точка (user_locations)")
+async def _m011_user_locations(conn: aiosqlite.Connection):
+    # Ведется в базе точки по умолчанию (см. database.set_user_location),
+    # в базах остальных точек таблица остается пустой
+    await conn.execute('''
+        CREATE TABLE user_locations (
+            user_id INTEGER PRIMARY KEY,
+            location TEXT NOT NULL
+        )
+    ''')
+
+
+@migration(12, "признак active у сотрудника точки")
+async def _m012_users_active(conn: aiosqlite.Connection):
+    # Сотрудник, перешедший на другую точку, остается в базе прежней со всей историей
+    # (ее смены входят в отчеты за прошлые периоды), но пропадает из ее списков
+    await conn.execute("ALTER TABLE users ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
+
+
+@migration(13, "индексы shifts без дублей: убраны idx_shifts_user_date, сужен idx_shifts_date")
+async def _m013_shifts_indexes_cleanup(conn: aiosqlite.Connection):
+    # idx_shifts_user_date (user_id, shift_date, ...) повторял idx_shifts_user_day: поиски
+    # сотрудника за день и период идут по idx_shifts_user_day, и только он отдает смены
+    # в порядке (shift_date, shift_id) без сортировки
+    await conn.execute("DROP INDEX IF EXISTS idx_shifts_user_date")
+    # Закрытые смены в сводный отчет приходят из user_day_prefix, по датам в shifts ищутся
+    # только идущие смены и пересчет итогов. Широкие колонки лишь переписывались при
+    # каждом закрытии смены
+    await conn.execute("DROP INDEX IF EXISTS idx_shifts_date")
+    await conn.execute("CREATE INDEX idx_shifts_date ON shifts (shift_date)")
+
 
-        logging.info(f"Перенесено {cursor.rowcount} записей")
+@migration(14, "users.first_name NOT NULL")
+async def _m014_users_first_name_not_null(conn: aiosqlite.Connection):
+    # У старых строк first_name бывает NULL, а постраничный список сравнивает кортежи
+    # (first_name, user_id): с NULL сравнение не истинно и не ложно, и сотрудник выпадал
+    # из всех страниц. SQLite не меняет ограничения столбца, поэтому таблица пересоздается
+    await conn.execute('''
+        CREATE TABLE users_new (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT NOT NULL DEFAULT '',
+            locale TEXT DEFAULT 'ru',
+            active INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    await conn.execute('''
+        INSERT INTO users_new (user_id, username, first_name, locale, active)
+        SELECT user_id, username, COALESCE(first_name, ''), locale, active FROM users
+    ''')
+    await conn.execute("DROP TABLE users")
+    await conn.execute("ALTER TABLE users_new RENAME TO users")
+    await conn.execute("CREATE INDEX idx_users_name ON users (first_name, user_id)")
 
-        # 5. Если была таблица active_shifts — её можно просто удалить,
-        # так как теперь активные смены живут в основной таблице
-        cursor.execute("DROP TABLE IF EXISTS active_shifts")
-        logging.info("Удалена старая вспомогательная таблица active_shifts")
 
-        # 6. Финальный коммит
-        conn.commit()
-        logging.info("Миграция успешно завершена! Теперь можно удалять shifts_old вручную.")
+async def main():
+    import database
+    from config import load_locations
 
-    except Exception as e:
-        conn.rollback()
-        logging.error(f"Ошибка при миграции: {e}")
-    finally:
-        conn.close()
+    logging.basicConfig(level=logging.INFO)
+    database.configure_locations(load_locations())
+    for shard in database.locations():
+        with database.use_location(shard.code):
+            async with database.connect() as conn:
+                version = await apply_migrations(conn)
+        logging.info(f"Версия схемы {shard.path}: {version}")
 
 
 if __name__ == "__main__":
-    migrate()
\ No newline at end of file
+    asyncio.run(main())
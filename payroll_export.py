@@ -0,0 +1,129 @@
+# payroll_export.py
+"""
+Зарплатная ведомость за период в CSV (отправляется админу через send_document).
+
+Смены идут из курсора базы (db.iter_payroll_shifts) пачками по EXPORT_BATCH_SIZE,
+каждая пачка сериализуется в отдельном потоке и дописывается в
+SpooledTemporaryFile: в памяти держится не больше SPOOL_MAX_SIZE байт, остальное
+уходит во временный файл. Так память не растет с длиной периода, а цикл событий
+не блокируется ни на csv, ни на диске.
+"""
+import asyncio
+import codecs
+import csv
+import io
+from contextlib import aclosing
+from datetime import date
+from tempfile import SpooledTemporaryFile
+from typing import List, NamedTuple
+
+from aiogram.types import InputFile
+from aiogram.types.input_file import DEFAULT_CHUNK_SIZE
+
+import database as db
+
+EXPORT_BATCH_SIZE = 500
+SPOOL_MAX_SIZE = 1024 * 1024
+
+CSV_HEADER = ("user_id", "name", "date", "start", "end", "role", "type",
+              "minutes", "hours", "rate_rsd", "earned_rsd")
+
+
+class PayrollExport(NamedTuple):
+    file: SpooledTemporaryFile  # CSV в UTF-8 с BOM, указатель в начале
+    users: int
+    shifts: int
+    minutes: int
+    earned_minor: int
+
+
+def format_hours(minutes: int) -> str:
+    """Минуты → "Ч:ММ" для таблицы (корректировки бывают отрицательными)."""
+    h, m = divmod(abs(minutes), 60)
+    return f"{'-' if minutes < 0 else ''}{h}:{m:02d}"
+
+
+def _shift_row(shift: db.PayrollShift) -> tuple:
+    if shift.entry_type == 'manual':
+        kind = "manual"
+    elif shift.end_ts is None:
+        kind = "open"
+    else:
+        kind = "shift"
+    return (
+        shift.user_id, shift.name, shift.shift_date,
+        db.format_ts(shift.start_ts) if shift.start_ts is not None and kind != "manual" else "",
+        db.format_ts(shift.end_ts) if shift.end_ts is not None and kind != "manual" else "",
+        shift.role, kind, shift.minutes, format_hours(shift.minutes),
+        db.minor_to_decimal(shift.rate_minor), db.minor_to_decimal(shift.earned_minor),
+    )
+
+
+def _total_row(user_id, name, kind: str, minutes: int, earned_minor: int) -> tuple:
+    return (user_id, name, "", "", "", "", kind, minutes, format_hours(minutes),
+            "", db.minor_to_decimal(earned_minor))
+
+
+def _write_rows(file: SpooledTemporaryFile, rows: List[tuple]):
+    """Сериализация пачки строк; вызывается в отдельном потоке."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    file.write(buffer.getvalue().encode("utf-8"))
+
+
+async def build_payroll_csv(start_date: date, end_date: date,
+                            batch_size: int = EXPORT_BATCH_SIZE) -> PayrollExport:
+    """
+    Ведомость: строка на смену, после смен сотрудника — его итог ("subtotal"),
+    в конце — общий итог ("total"). Файл закрывает вызывающий.
+    """
+    file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    batch = [CSV_HEADER]
+    users = shifts = total_mins = total_minor = 0
+    current, user_mins, user_minor = None, 0, 0
+
+    async def flush():
+        nonlocal batch
+        rows, batch = batch, []
+        await asyncio.to_thread(_write_rows, file, rows)
+
+    try:
+        await asyncio.to_thread(file.write, codecs.BOM_UTF8)  # чтобы Excel открыл кириллицу
+        async with aclosing(db.iter_payroll_shifts(start_date, end_date)) as stream:
+            async for shift in stream:
+                if current is not None and current[0] != shift.user_id:
+                    batch.append(_total_row(*current, "subtotal", user_mins, user_minor))
+                    user_mins = user_minor = 0
+                if current is None or current[0] != shift.user_id:
+                    current = (shift.user_id, shift.name)
+                    users += 1
+                batch.append(_shift_row(shift))
+                shifts += 1
+                user_mins += shift.minutes
+                user_minor += shift.earned_minor
+                total_mins += shift.minutes
+                total_minor += shift.earned_minor
+                if len(batch) >= batch_size:
+                    await flush()
+        if current is not None:
+            batch.append(_total_row(*current, "subtotal", user_mins, user_minor))
+        batch.append(_total_row("", "", "total", total_mins, total_minor))
+        await flush()
+        await asyncio.to_thread(file.seek, 0)
+    except BaseException:
+        file.close()
+        raise
+    return PayrollExport(file, users, shifts, total_mins, total_minor)
+
+
+class SpooledInputFile(InputFile):
+    """Документ для send_document из PayrollExport.file: отдается кусками, не целиком."""
+
+    def __init__(self, file: SpooledTemporaryFile, filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+
+    async def read(self, bot):
+        await asyncio.to_thread(self.file.seek, 0)
+        while chunk := await asyncio.to_thread(self.file.read, self.chunk_size):
+            yield chunk
@@ -0,0 +1,80 @@
+# prefix_sums.py
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+# (минуты, пары, число смен)
+Totals = Tuple[int, int, int]
+ZERO: Totals = (0, 0, 0)
+
+
+class PrefixSums:
+    """
+    Накопленные итоги по дням для каждого сотрудника (копия таблицы user_day_prefix в памяти).
+    Итог за любой период [start, end] — разность двух накопленных значений,
+    каждое находится бинарным поиском по отсортированному списку дней.
+    Дни хранятся ISO-строками 'YYYY-MM-DD': они сортируются так же, как даты.
+    """
+
+    def __init__(self):
+        self._days: Dict[int, List[str]] = {}
+        self._cum: Dict[int, List[Totals]] = {}
+        self.loaded = False
+        # Растет при каждом изменении: загрузка из базы по нему понимает,
+        # что пока она читала, кто-то успел записать новые итоги
+        self.generation = 0
+
+    def load(self, rows: Iterable[tuple]):
+        """rows: (user_id, day, cum_minutes, cum_earned_minor, cum_shifts), отсортированы по (user_id, day)."""
+        self._days.clear()
+        self._cum.clear()
+        for user_id, day, *cum in rows:
+            self._days.setdefault(user_id, []).append(day)
+            self._cum.setdefault(user_id, []).append(tuple(cum))
+        self.loaded = True
+
+    def clear(self):
+        self._days.clear()
+        self._cum.clear()
+        self.loaded = False
+        self.generation += 1
+
+    def users(self) -> List[int]:
+        return list(self._days)
+
+    def add(self, user_id: int, day: str, minutes: int, earned_minor: int, shifts: int = 1):
+        """Учитывает новую запись за день `day`: сдвигает накопленные итоги этого дня и всех следующих."""
+        self.generation += 1
+        if not self.loaded:
+            return
+        days = self._days.setdefault(user_id, [])
+        cum = self._cum.setdefault(user_id, [])
+        i = bisect_left(days, day)
+        if i == len(days) or days[i] != day:
+            days.insert(i, day)
+            cum.insert(i, cum[i - 1] if i else ZERO)
+        # Записи почти всегда за сегодня, то есть за последний день — цикл из одного шага
+        for j in range(i, len(cum)):
+            m, e, s = cum[j]
+            cum[j] = (m + minutes, e + earned_minor, s + shifts)
+
+    def upto(self, user_id: int, day: str) -> Totals:
+        """Накопленный итог по день `day` включительно."""
+        days = self._days.get(user_id)
+        if not days:
+            return ZERO
+        i = bisect_right(days, day)
+        return self._cum[user_id][i - 1] if i else ZERO
+
+    def before(self, user_id: int, day: str) -> Totals:
+        """Накопленный итог до дня `day` (не включая его)."""
+        days = self._days.get(user_id)
+        if not days:
+            return ZERO
+        i = bisect_left(days, day)
+        return self._cum[user_id][i - 1] if i else ZERO
+
+    def range(self, user_id: int, start: str, end: str) -> Totals:
+        """Итог за [start, end]: два бинарных поиска и вычитание."""
+        hi = self.upto(user_id, end)
+        lo = self.before(user_id, start)
+        return hi[0] - lo[0], hi[1] - lo[1], hi[2] - lo[2]
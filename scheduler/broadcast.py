@@ -0,0 +1,143 @@
+# scheduler/broadcast.py
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramNotFound, TelegramRetryAfter
+
+# Лимиты Telegram: ~30 сообщений в секунду на бота и 1 сообщение в секунду в один чат
+GLOBAL_RATE = 30.0
+PER_CHAT_INTERVAL = 1.0
+CONCURRENCY = 20
+MAX_RETRIES = 3
+
+
+class TokenBucket:
+    """Не больше `rate` операций в секунду, с запасом на всплеск `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Лимит Telegram общий на бота: все рассылки (задачи всех точек, запущенные
+# одновременно) берут токены из одного ведра
+_global_buckets: Dict[Tuple[Any, float], TokenBucket] = {}
+
+
+def global_bucket(bot: Bot, rate: float = GLOBAL_RATE) -> TokenBucket:
+    # У заглушек бота (бенчмарки, тесты) id может не быть — тогда ведро свое у объекта
+    key = (getattr(bot, "id", id(bot)), rate)
+    bucket = _global_buckets.get(key)
+    if bucket is None:
+        bucket = _global_buckets[key] = TokenBucket(rate)
+    return bucket
+
+
+@dataclass
+class DeliveryReport:
+    """Итог одной рассылки."""
+    total: int = 0
+    sent: int = 0
+    blocked: int = 0  # пользователь заблокировал бота или чата больше нет
+    failed: int = 0
+    retries: int = 0
+    duration: float = 0.0
+    errors: Dict[int, str] = field(default_factory=dict)
+
+    def __str__(self):
+        return (f"sent {self.sent}/{self.total}, blocked {self.blocked}, failed {self.failed}, "
+                f"retries {self.retries}, {self.duration:.2f}s")
+
+
+class Broadcaster:
+    """
+    Рассылка сообщений с ограниченным параллелизмом и соблюдением лимитов Telegram.
+    На TelegramRetryAfter ждет указанное время и повторяет отправку.
+    """
+
+    def __init__(self, bot: Bot, concurrency: int = CONCURRENCY, global_rate: float = GLOBAL_RATE,
+                 per_chat_interval: float = PER_CHAT_INTERVAL, max_retries: int = MAX_RETRIES):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self._bucket = global_bucket(bot, global_rate)
+        # Интервал между сообщениями в один чат — только в пределах этой рассылки
+        self._chat_next: Dict[int, float] = {}
+
+    async def send_many(self, messages: Iterable[Tuple[int, str]]) -> DeliveryReport:
+        report = DeliveryReport()
+        started = time.monotonic()
+        queue: asyncio.Queue = asyncio.Queue()
+        for chat_id, text in messages:
+            queue.put_nowait((chat_id, text))
+        report.total = queue.qsize()
+
+        async def worker():
+            while True:
+                try:
+                    chat_id, text = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._deliver(chat_id, text, report)
+
+        workers = min(self.concurrency, report.total)
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        report.duration = time.monotonic() - started
+        return report
+
+    async def _wait_chat_slot(self, chat_id: int):
+        # Резервируем слот без await между чтением и записью, чтобы два
+        # сообщения в один чат не ушли одновременно
+        now = time.monotonic()
+        slot = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = slot + self.per_chat_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _deliver(self, chat_id: int, text: str, report: DeliveryReport):
+        for attempt in range(self.max_retries + 1):
+            await self._wait_chat_slot(chat_id)
+            await self._bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, text)
+                report.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    report.failed += 1
+                    report.errors[chat_id] = str(e)
+                    return
+                report.retries += 1
+                logging.warning(f"Broadcast: flood control for {chat_id}, retry in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+            except (TelegramForbiddenError, TelegramNotFound) as e:
+                logging.warning(f"Broadcast: User {chat_id} blocked the bot.")
+                report.blocked += 1
+                report.errors[chat_id] = str(e)
+                return
+            except Exception as e:
+                logging.error(f"Broadcast: Error sending to {chat_id}: {e}")
+                report.failed += 1
+                report.errors[chat_id] = str(e)
+                return
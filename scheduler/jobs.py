@@ -1,79 +1,100 @@
 # scheduler/jobs.py
 import logging
-from datetime import datetime, time
-import aiosqlite
+from typing import Optional
 from aiogram import Bot
-from aiogram.exceptions import TelegramForbiddenError, TelegramNotFound
 from middlewares.locales_manager import i18n as i18n_obj
 
 import database as db
+from metrics import timed_job
+from scheduler.broadcast import Broadcaster
+
+DEFAULT_LOCALE = "ru"
 
 
 # --- 1. Напоминание о завершении смены ---
-async def remind_end_shift(bot: Bot, i18n=i18n_obj):
-    logging.info("Scheduler: Checking started shifts for reminders.")
+async def remind_end_shift(bot: Bot, i18n=i18n_obj, location: Optional[str] = None):
+    with db.use_location(location):
+        return await _remind_end_shift(bot, i18n)
 
-    active_shifts = await db.get_users_with_active_shifts()
 
-    if not active_shifts:
-        logging.info("Scheduler: No active shifts found.")
-        return
+@timed_job("remind_end_shift")
+async def _remind_end_shift(bot: Bot, i18n):
+    logging.info("Scheduler: Checking started shifts for reminders.")
 
-    today_str = db.get_today().isoformat()
-    users_to_remind = [s[0] for s in active_shifts if s[2].startswith(today_str)]
+    # Только смены, начатые сегодня: фильтр по start_ts выполняет база
+    since = db.day_start(db.get_today())
+    active_shifts = await db.get_users_with_active_shifts(started_since=since)
 
-    if not users_to_remind:
+    if not active_shifts:
         logging.info("Scheduler: No shifts started TODAY found.")
         return
 
-    try:
-        reminder_text = i18n.get("reminder_end_shift", locale="ru")
-    except Exception:
-        reminder_text = "⏰ Напоминание! Пожалуйста, не забудьте завершить текущую смену."
+    users_to_remind = [s[0] for s in active_shifts]
 
-    sent_count = 0
-    for user_id in users_to_remind:
-        try:
-            await bot.send_message(user_id, reminder_text)
-            sent_count += 1
-        except (TelegramForbiddenError, TelegramNotFound):
-            logging.warning(f"Scheduler: User {user_id} blocked the bot.")
-        except Exception as e:
-            logging.error(f"Scheduler: Error sending to {user_id}: {e}")
+    # Текст рендерится один раз на язык, а не на каждого получателя
+    try:
+        locales = await db.get_users_locales(users_to_remind)
+    except Exception as e:
+        logging.error(f"Scheduler: Could not load user locales: {e}")
+        locales = {}
+    texts = {}
+    messages = []
+    for user_id in dict.fromkeys(users_to_remind):
+        locale = locales.get(user_id) or DEFAULT_LOCALE
+        if locale not in texts:
+            try:
+                texts[locale] = i18n.get("reminder_end_shift", locale=locale)
+            except Exception:
+                texts[locale] = "⏰ Напоминание! Пожалуйста, не забудьте завершить текущую смену."
+        messages.append((user_id, texts[locale]))
 
-    logging.info(f"Scheduler: Reminders sent to {sent_count} users.")
+    report = await Broadcaster(bot).send_many(messages)
+    logging.info(f"Scheduler: Reminders: {report}")
+    return report
 
 
 # --- 2. Автоматическое закрытие смен ---
-async def cron_auto_close_shifts(bot: Bot, i18n=i18n_obj):
+async def cron_auto_close_shifts(bot: Bot, i18n=i18n_obj, location: Optional[str] = None):
+    with db.use_location(location):
+        return await _auto_close_shifts(bot, i18n)
+
+
+@timed_job("cron_auto_close_shifts")
+async def _auto_close_shifts(bot: Bot, i18n):
     logging.info("Scheduler: Running auto-close for all active shifts.")
 
-    # 1. Находим всех, у кого не закрыта смена
-    async with aiosqlite.connect(db.DB_NAME) as conn:
-        async with conn.execute("SELECT DISTINCT user_id FROM shifts WHERE end_time IS NULL") as c:
-            users = await c.fetchall()
+    # Все открытые смены закрываются одним запросом на время закрытия точки (20:30),
+    # даже если задача запустилась с опозданием
+    close_at = db.current_shard().close_at
+    closing_time = db.get_now().replace(hour=close_at.hour, minute=close_at.minute, second=0, microsecond=0)
+    closed = await db.close_open_shifts(closing_time)
 
-    if not users:
+    if not closed:
         logging.info("Scheduler: No shifts to auto-close.")
         return
 
-    now_serbia = db.get_now()
-    closing_time = now_serbia.replace(hour=20, minute=30, second=0, microsecond=0, tzinfo=None)
+    messages = []
+    for uid, mins, t_start, t_end in closed:
+        time_display = db.format_minutes_to_str(mins)
 
-    for (uid,) in users:
-        result = await db.close_shift(uid, end_dt=closing_time)
-        if result:
-            mins, t_start, t_end = result
-            time_display = db.format_minutes_to_str(mins)
+        msg = (
+            f"⏰ <b>Ваша смена была автоматически закрыта!</b>\n"
+            f"Период: <code>{t_start}</code> — <code>{t_end}</code>\n"
+            f"Итог: <b>{time_display}</b>"
+        )
+        messages.append((uid, msg))
+
+    report = await Broadcaster(bot).send_many(messages)
+    logging.info(f"Scheduler: Auto-closed {len(closed)} shifts, notifications: {report}")
+    return report
 
-            msg = (
-                f"⏰ <b>Ваша смена была автоматически закрыта!</b>\n"
-                f"Период: <code>{t_start}</code> — <code>{t_end}</code>\n"
-                f"Итог: <b>{time_display}</b>"
-            )
-            try:
-                await bot.send_message(uid, msg)
-            except Exception as e:
-                logging.error(f"Scheduler: Could not notify user {uid} about auto-close: {e}")
 
-    logging.info(f"Scheduler: Auto-closed shifts for {len(users)} users.")
+# --- 3. Периодический checkpoint WAL ---
+async def wal_checkpoint():
+    for shard in db.locations():
+        try:
+            busy, wal_pages, moved = await db.run_in_location(shard.code, db.checkpoint_wal)
+        except Exception as e:
+            logging.error(f"Scheduler: WAL checkpoint failed for {shard.code}: {e}")
+            continue
+        logging.info(f"Scheduler: WAL checkpoint {shard.code} done ({moved}/{wal_pages} pages, busy={busy}).")
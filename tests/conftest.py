@@ -1,8 +1,9 @@
 """
 Shared fixtures for all tests.
 
-The `db` fixture patches database.DB_NAME to a temp file and runs init_db(),
-so every test function gets a clean, isolated SQLite database.
+The `db` fixture patches database.DB_NAME to a temp file, runs init_db() and
+opens the shared connection pool, so every test function gets a clean,
+isolated SQLite database accessed the same way the bot accesses it.
 """
 import pytest
 import sys
@@ -22,6 +23,30 @@ async def db(tmp_path):
         # Re-patch DB_NAME inside the already-imported module too
         original = database.DB_NAME
         database.DB_NAME = db_file
+        database.configure_locations([])
+        database.user_locations.clear()
+        database.locale_cache.clear()
+        database.day_prefix.clear()
+        database.report_cache.clear()
         await database.init_db()
+        await database.init_pool(size=2)
         yield db_file
+        await database.close_pool()
         database.DB_NAME = original
+
+
+@pytest.fixture(scope="session")
+def _bot_dispatcher():
+    # Routers can be attached to a dispatcher only once per process
+    import main
+    from config import BotConfig
+    return main.build_dispatcher(BotConfig(token="42:TEST", admin_ids=[1]))
+
+
+@pytest.fixture
+async def dispatcher(_bot_dispatcher):
+    """The bot's real Dispatcher, with a fresh FSM storage for every test."""
+    from fsm_storage import SQLiteStorage
+    _bot_dispatcher.fsm.storage = SQLiteStorage()
+    yield _bot_dispatcher
+    await _bot_dispatcher.fsm.storage.close()
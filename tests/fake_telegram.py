@@ -0,0 +1,95 @@
+"""
+A local stand-in for api.telegram.org.
+
+FakeTelegram is an aiohttp app that answers Bot API calls with "ok" and records
+them, so a real aiogram Bot (see FakeTelegram.bot()) can talk to it instead of
+Telegram. make_update() builds raw updates the way Telegram posts them to a
+webhook.
+"""
+import asyncio
+import itertools
+import time
+from typing import List, Optional, Tuple
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+TOKEN = "42:TEST"
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.calls: List[Tuple[str, dict]] = []
+        self._message_ids = itertools.count(1)
+        self._changed = asyncio.Condition()
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self.server = TestServer(app)
+
+    async def __aenter__(self) -> "FakeTelegram":
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.server.close()
+
+    def bot(self, **kwargs) -> Bot:
+        api = TelegramAPIServer.from_base(str(self.server.make_url("")).rstrip("/"))
+        return Bot(TOKEN, session=AiohttpSession(api=api), **kwargs)
+
+    def methods(self) -> List[str]:
+        return [method for method, _ in self.calls]
+
+    async def wait_for(self, method: str, count: int = 1, timeout: float = 2.0) -> List[dict]:
+        """Wait until `method` has been called `count` times; return their params."""
+        async def _ready():
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.methods().count(method) >= count)
+        await asyncio.wait_for(_ready(), timeout)
+        return [params for name, params in self.calls if name == method]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        async with self._changed:
+            self.calls.append((method, params))
+            self._changed.notify_all()
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    def _result(self, method: str, params: dict):
+        if method.startswith("send"):
+            return {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "text": params.get("text"),
+            }
+        return True
+
+
+_update_ids = itertools.count(1)
+
+
+def make_update(user_id: int = 1, text: Optional[str] = None, callback_data: Optional[str] = None,
+                first_name: str = "Ana", language_code: str = "ru") -> dict:
+    """Raw webhook update: a private message, or a button press if callback_data is given."""
+    user = {"id": user_id, "is_bot": False, "first_name": first_name, "language_code": language_code}
+    message = {
+        "message_id": next(_update_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": first_name},
+        "from": user,
+        "text": text,
+    }
+    if text and text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    update = {"update_id": next(_update_ids)}
+    if callback_data is None:
+        update["message"] = message
+    else:
+        update["callback_query"] = {"id": str(update["update_id"]), "from": user, "chat_instance": "1",
+                                    "message": message, "data": callback_data}
+    return update
@@ -0,0 +1,105 @@
+"""
+Tests for the benchmark data generator, the regression comparison and the load
+harness in benchmarks/.
+"""
+from datetime import datetime
+
+from aiogram import Bot
+
+import database
+from benchmarks import bench_db, bench_load
+from benchmarks.datagen import DataSpec, generate
+
+SPEC = DataSpec(users=6, roles=4, years=1, seed=7)
+
+
+async def _dump():
+    async with database.connect() as conn:
+        async with conn.execute("SELECT * FROM shifts ORDER BY shift_id") as c:
+            shifts = await c.fetchall()
+        async with conn.execute("SELECT * FROM users ORDER BY user_id") as c:
+            users = await c.fetchall()
+    return shifts, users
+
+
+class TestGenerate:
+    async def test_history_is_consistent_with_rollups(self, db):
+        data = await generate(SPEC)
+        assert len(data.user_ids) == 6 and len(data.open_user_ids) == 2
+        assert data.shifts > 6 * 365 * SPEC.work_share * 0.8 and data.manual > 0
+        assert await database.check_day_totals() == []
+        assert await database.check_day_prefix() == []
+        active = await database.get_users_with_active_shifts()
+        assert sorted(row[0] for row in active) == data.open_user_ids
+        assert len(await database.get_roles()) == 4
+
+    async def test_same_seed_gives_same_data(self, db):
+        await generate(SPEC)
+        first = await _dump()
+        async with database.connect() as conn:
+            for table in ("shifts", "users", "user_roles"):
+                await conn.execute(f"DELETE FROM {table}")
+            await conn.execute("DELETE FROM sqlite_sequence WHERE name = 'shifts'")
+            await conn.commit()
+        await generate(SPEC)
+        assert await _dump() == first
+
+
+def _result(**medians):
+    return {"scales": {"small": {"ops": {op: {"median_ms": ms} for op, ms in medians.items()}}}}
+
+
+class TestCompare:
+    def test_flags_only_slowdowns_above_threshold(self):
+        rows = bench_db.compare(_result(a=1.0, b=1.0, c=0.01, gone=1.0),
+                                _result(a=1.3, b=1.1, c=0.05, new=5.0), threshold=0.2)
+        assert {r["op"]: r["regression"] for r in rows} == {"a": True, "b": False, "c": False}
+
+    def test_regression_sets_exit_code(self, tmp_path, monkeypatch):
+        baseline = tmp_path / "base.json"
+        baseline.write_text('{"scales": {"small": {"ops": {"get_shift_status": {"median_ms": 0.001}}}}}')
+
+        async def fake_run(scales, repeat):
+            return {"meta": {}, "scales": {"small": {
+                "data": {"users": 1, "shifts": 1, "manual": 0, "open_shifts": 0}, "generate_s": 0,
+                "ops": {"get_shift_status": {"median_ms": 1.0, "p95_ms": 1.0}}}}}
+
+        monkeypatch.setattr(bench_db, "run", fake_run)
+        assert bench_db.main(["--scales", "small", "--baseline", str(baseline)]) == 1
+        assert bench_db.main(["--scales", "small", "--baseline", str(baseline), "--threshold", "5000"]) == 0
+
+
+class TestRunScale:
+    async def test_every_operation_completes(self):
+        result = await bench_db.run_scale(DataSpec(users=3, roles=2, years=1, seed=1), repeat=1)
+        assert sorted(result["ops"]) == [
+            "close_shift", "get_shift_status",
+            "get_total_summary_report.month", "get_total_summary_report.year",
+            "get_user_shifts_report.month", "get_user_shifts_report.year",
+            "jobs.cron_auto_close_shifts", "jobs.remind_end_shift",
+        ]
+        assert all(stats["runs"] == 1 for stats in result["ops"].values())
+
+
+class TestLoadRun:
+    async def test_scenarios_reach_handlers_and_are_measured(self, db, dispatcher):
+        bot = Bot(bench_load.TOKEN, session=bench_load.RecordingSession())
+        start = database.TZ.localize(datetime(2024, 1, 15, 9, 0))
+        middlewares = len(dispatcher.message.middleware)
+        try:
+            async with bench_load.instrumented(dispatcher, start):
+                result = await bench_load.LoadRun(dispatcher, bot, concurrency=4).run([2, 3, 4], [1])
+        finally:
+            await bot.session.close()
+
+        assert len(dispatcher.message.middleware) == middlewares
+        assert result["errors"] == {}
+        handlers = result["handlers"]
+        assert "unhandled" not in handlers
+        assert handlers["handle_start"]["count"] == handlers["handle_end"]["count"] == 4
+        assert handlers["admin_total_report_by_period"]["count"] == 2
+        assert handlers["handle_end"]["db_ms_mean"] > 0
+        assert 0 < result["db_share"] <= 1
+        assert result["updates"] == sum(h["count"] for h in handlers.values())
+        assert result["api_calls"]["SendMessage"] >= 4
+        assert await database.get_users_with_active_shifts() == []
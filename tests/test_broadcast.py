@@ -0,0 +1,104 @@
+"""
+Unit tests for scheduler/broadcast.py.
+
+The Bot is an AsyncMock; rate limits are set high enough (or intervals
+short enough) that timing assertions stay fast and stable.
+"""
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from scheduler.broadcast import Broadcaster, TokenBucket
+
+
+def _make_bot():
+    bot = AsyncMock()
+    bot.send_message = AsyncMock()
+    return bot
+
+
+class TestTokenBucket:
+    async def test_burst_then_rate_limited(self):
+        bucket = TokenBucket(rate=50, capacity=1)
+        started = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        # 1 токен сразу, еще 5 — по 20 мс
+        assert time.monotonic() - started >= 0.09
+
+
+class TestBroadcaster:
+    async def test_concurrent_broadcasts_share_global_rate(self):
+        bot = _make_bot()
+        first, second = Broadcaster(bot, global_rate=20), Broadcaster(bot, global_rate=20)
+        assert first._bucket is second._bucket
+        started = time.monotonic()
+        await asyncio.gather(first.send_many([(i, "a") for i in range(15)]),
+                             second.send_many([(100 + i, "b") for i in range(15)]))
+        # 30 сообщений при 20 в секунду и запасе 20: остальные 10 — не раньше чем через 0.5 с
+        assert time.monotonic() - started >= 0.45
+        assert bot.send_message.await_count == 30
+
+    async def test_sends_everything_and_reports(self):
+        bot = _make_bot()
+        report = await Broadcaster(bot, global_rate=1000).send_many([(i, f"t{i}") for i in range(50)])
+        assert bot.send_message.await_count == 50
+        assert (report.total, report.sent, report.failed, report.blocked) == (50, 50, 0, 0)
+
+    async def test_concurrency_is_bounded(self):
+        bot = _make_bot()
+        in_flight, peak = 0, 0
+
+        async def slow_send(chat_id, text):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+        bot.send_message.side_effect = slow_send
+        await Broadcaster(bot, concurrency=4, global_rate=1000).send_many([(i, "x") for i in range(20)])
+        assert peak == 4
+
+    async def test_retry_after_is_honoured(self):
+        bot = _make_bot()
+        bot.send_message.side_effect = [
+            TelegramRetryAfter(method=MagicMock(), message="Too Many Requests", retry_after=0),
+            None,
+        ]
+        report = await Broadcaster(bot, global_rate=1000, per_chat_interval=0).send_many([(1, "x")])
+        assert bot.send_message.await_count == 2
+        assert (report.sent, report.retries) == (1, 1)
+
+    async def test_gives_up_after_max_retries(self):
+        bot = _make_bot()
+        bot.send_message.side_effect = TelegramRetryAfter(method=MagicMock(), message="flood", retry_after=0)
+        report = await Broadcaster(bot, global_rate=1000, per_chat_interval=0, max_retries=2).send_many([(1, "x")])
+        assert bot.send_message.await_count == 3
+        assert report.failed == 1 and 1 in report.errors
+
+    async def test_blocked_and_failed_counted_separately(self):
+        bot = _make_bot()
+
+        async def send(chat_id, text):
+            if chat_id == 1:
+                raise TelegramForbiddenError(method=MagicMock(), message="Forbidden")
+            if chat_id == 2:
+                raise RuntimeError("network")
+
+        bot.send_message.side_effect = send
+        report = await Broadcaster(bot, global_rate=1000).send_many([(1, "x"), (2, "x"), (3, "x")])
+        assert (report.sent, report.blocked, report.failed) == (1, 1, 1)
+
+    async def test_same_chat_messages_are_spaced(self):
+        bot = _make_bot()
+        sent_at = []
+        bot.send_message.side_effect = lambda chat_id, text: sent_at.append(time.monotonic())
+        await Broadcaster(bot, global_rate=1000, per_chat_interval=0.05).send_many([(7, "a"), (7, "b")])
+        assert sent_at[1] - sent_at[0] >= 0.045
+
+    async def test_empty_broadcast(self):
+        report = await Broadcaster(_make_bot()).send_many([])
+        assert report.total == 0
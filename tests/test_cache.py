@@ -0,0 +1,124 @@
+"""
+Unit tests for cache.LRUCache and cache.ReportCache.
+
+A fake clock is injected so TTL behaviour is tested without sleeping.
+"""
+import pytest
+
+from cache import LRUCache, MISSING, ReportCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache:
+    def test_miss_then_hit(self):
+        cache = LRUCache(maxsize=2)
+        assert cache.get("a") is MISSING
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert cache.hit_ratio == 0.5
+
+    def test_none_is_a_cacheable_value(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", None)
+        assert cache.get("a") is None
+        assert cache.hits == 1
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" becomes the oldest
+        cache.set("c", 3)
+        assert cache.get("b") is MISSING
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = LRUCache(maxsize=2, ttl=10, clock=clock)
+        cache.set("a", 1)
+        clock.now = 9.9
+        assert cache.get("a") == 1
+        clock.now = 10.0
+        assert cache.get("a") is MISSING
+        assert len(cache) == 0
+
+    def test_pop_and_clear(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.pop("a")
+        cache.pop("missing")
+        assert cache.get("a") is MISSING
+        cache.clear()
+        assert cache.stats()["misses"] == 0
+
+    def test_invalid_maxsize(self):
+        with pytest.raises(ValueError):
+            LRUCache(maxsize=0)
+
+    def test_per_entry_ttl_overrides_default(self):
+        clock = FakeClock()
+        cache = LRUCache(maxsize=4, ttl=10, clock=clock)
+        cache.set("forever", 1, ttl=None)
+        cache.set("short", 2, ttl=1)
+        clock.now = 5
+        assert cache.get("short") is MISSING
+        clock.now = 1000
+        assert cache.get("forever") == 1
+
+
+TODAY = "2024-01-15"
+
+
+class TestReportCache:
+    def test_closed_period_kept_live_period_expires(self):
+        clock = FakeClock()
+        cache = ReportCache(live_ttl=60, clock=clock)
+        cache.set("total", None, "2023-12-01", "2023-12-31", "closed", TODAY)
+        cache.set("total", None, "2024-01-01", TODAY, "live", TODAY)
+        clock.now = 61
+        assert cache.get("total", None, "2023-12-01", "2023-12-31") == "closed"
+        assert cache.get("total", None, "2024-01-01", TODAY) is MISSING
+
+    def test_invalidate_hits_only_user_and_period(self):
+        cache = ReportCache()
+        cache.set("user", 1, "2024-01-01", "2024-01-31", "u1 jan", TODAY)
+        cache.set("user", 1, "2023-12-01", "2023-12-31", "u1 dec", TODAY)
+        cache.set("user", 2, "2024-01-01", "2024-01-31", "u2 jan", TODAY)
+        cache.set("total", None, "2024-01-01", "2024-01-31", "all jan", TODAY)
+        cache.set("users", None, None, None, "list", TODAY)
+
+        cache.invalidate(1, "2024-01-15")
+
+        assert cache.get("user", 1, "2024-01-01", "2024-01-31") is MISSING
+        assert cache.get("total", None, "2024-01-01", "2024-01-31") is MISSING
+        assert cache.get("user", 1, "2023-12-01", "2023-12-31") == "u1 dec"
+        assert cache.get("user", 2, "2024-01-01", "2024-01-31") == "u2 jan"
+        assert cache.get("users", None) == "list"
+
+    def test_invalidate_without_day_drops_user_and_shared_reports(self):
+        cache = ReportCache()
+        cache.set("user", 1, "2023-12-01", "2023-12-31", "u1 dec", TODAY)
+        cache.set("user", 2, "2023-12-01", "2023-12-31", "u2 dec", TODAY)
+        cache.set("users", None, None, None, "list", TODAY)
+        cache.invalidate(1)
+        assert cache.get("user", 1, "2023-12-01", "2023-12-31") is MISSING
+        assert cache.get("users", None) is MISSING
+        assert cache.get("user", 2, "2023-12-01", "2023-12-31") == "u2 dec"
+
+    def test_result_computed_before_invalidation_is_not_stored(self):
+        cache = ReportCache()
+        generation = cache.generation
+        cache.invalidate(1, TODAY)
+        cache.set("user", 1, TODAY, TODAY, "stale", TODAY, generation)
+        assert cache.get("user", 1, TODAY, TODAY) is MISSING
+        assert cache.hit_ratio == 0.0
@@ -11,6 +11,7 @@ from decimal import Decimal
 from unittest.mock import patch
 
 import database
+from cache import MISSING
 
 
 # ---------------------------------------------------------------------------
@@ -77,6 +78,50 @@ class TestUserManagement:
         assert locale is None
 
 
+# ---------------------------------------------------------------------------
+# Locale cache (read-through, write-through on set_user_locale)
+# ---------------------------------------------------------------------------
+
+class TestLocaleCache:
+    async def test_second_read_served_from_cache(self, db):
+        await database.add_or_update_user(10, "u", "User")
+        assert await database.get_user_locale(10) == "ru"
+        with patch("database.connect", side_effect=AssertionError("DB hit")):
+            assert await database.get_user_locale(10) == "ru"
+        assert database.locale_cache.hits == 1
+
+    async def test_set_user_locale_writes_through(self, db):
+        await database.add_or_update_user(10, "u", "User")
+        await database.get_user_locale(10)
+        await database.set_user_locale(10, "en")
+        with patch("database.connect", side_effect=AssertionError("DB hit")):
+            assert await database.get_user_locale(10) == "en"
+
+    async def test_unknown_user_cached_until_registered(self, db):
+        assert await database.get_user_locale(11) is None
+        with patch("database.connect", side_effect=AssertionError("DB hit")):
+            assert await database.get_user_locale(11) is None
+        await database.add_or_update_user(11, "u", "User")
+        assert await database.get_user_locale(11) == "ru"
+
+    async def test_repeat_registration_keeps_cached_locale(self, db):
+        await database.add_or_update_user(10, "u", "User")
+        await database.get_user_locale(10)
+        await database.add_or_update_user(10, "u", "User")
+        with patch("database.connect", side_effect=AssertionError("DB hit")):
+            assert await database.get_user_locale(10) == "ru"
+
+    async def test_set_locale_for_unknown_user_not_cached(self, db):
+        await database.set_user_locale(12, "en")
+        assert await database.get_user_locale(12) is None
+
+    async def test_delete_user_evicts_locale(self, db):
+        await database.add_or_update_user(13, "u", "User")
+        await database.set_user_locale(13, "en")
+        await database.delete_user(13)
+        assert await database.get_user_locale(13) is None
+
+
 # ---------------------------------------------------------------------------
 # Role management
 # ---------------------------------------------------------------------------
@@ -127,15 +172,15 @@ class TestShiftLifecycle:
 
     async def test_shift_becomes_active_after_start(self, db):
         await self._setup_user_with_role()
-        with patch("database.get_now", return_value=datetime(2024, 1, 15, 9, 0, 0, tzinfo=database.TZ)), \
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 9, 0, 0))), \
              patch("database.get_today", return_value=date(2024, 1, 15)):
             await database.record_shift_start(100, 1)
         assert await database.is_shift_active(100) is True
 
     async def test_close_shift_returns_minutes(self, db):
         await self._setup_user_with_role()
-        start = datetime(2024, 1, 15, 9, 0, 0, tzinfo=database.TZ)
-        end = datetime(2024, 1, 15, 10, 30, 0, tzinfo=database.TZ)
+        start = database.TZ.localize(datetime(2024, 1, 15, 9, 0, 0))
+        end = database.TZ.localize(datetime(2024, 1, 15, 10, 30, 0))
         with patch("database.get_now", return_value=start), \
              patch("database.get_today", return_value=date(2024, 1, 15)):
             await database.record_shift_start(100, 1)
@@ -154,8 +199,8 @@ class TestShiftLifecycle:
 
     async def test_is_shift_inactive_after_close(self, db):
         await self._setup_user_with_role()
-        start = datetime(2024, 1, 15, 9, 0, 0, tzinfo=database.TZ)
-        end = datetime(2024, 1, 15, 11, 0, 0, tzinfo=database.TZ)
+        start = database.TZ.localize(datetime(2024, 1, 15, 9, 0, 0))
+        end = database.TZ.localize(datetime(2024, 1, 15, 11, 0, 0))
         with patch("database.get_now", return_value=start), \
              patch("database.get_today", return_value=date(2024, 1, 15)):
             await database.record_shift_start(100, 1)
@@ -164,6 +209,50 @@ class TestShiftLifecycle:
         assert await database.is_shift_active(100) is False
 
 
+# ---------------------------------------------------------------------------
+# Bulk auto-close
+# ---------------------------------------------------------------------------
+
+class TestCloseOpenShifts:
+    async def _start(self, user_id, hour, minute=0):
+        await database.add_or_update_user(user_id, "u", "U")
+        await database.set_user_roles(user_id, [1])
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, hour, minute, 0))), \
+             patch("database.get_today", return_value=date(2024, 1, 15)):
+            await database.record_shift_start(user_id, 1)
+
+    async def test_closes_all_open_shifts_at_cutoff(self, db):
+        await self._start(1, 9)
+        await self._start(2, 12, 15)
+        cutoff = database.TZ.localize(datetime(2024, 1, 15, 20, 30, 0))
+        # "Сейчас" позже cutoff: минуты все равно считаются до cutoff
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 21, 45, 0))):
+            closed = await database.close_open_shifts(cutoff)
+        assert sorted(closed) == [(1, 690, "09:00:00", "20:30:00"), (2, 495, "12:15:00", "20:30:00")]
+        assert await database.get_users_with_active_shifts() == []
+        assert await database.get_month_hours_for_user(1, date(2024, 1, 1)) == 690
+
+    async def test_closed_shifts_untouched(self, db):
+        await self._start(1, 9)
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 10, 0, 0))):
+            await database.close_shift(1)
+        closed = await database.close_open_shifts(database.TZ.localize(datetime(2024, 1, 15, 20, 30, 0)))
+        assert closed == []
+        assert await database.get_month_hours_for_user(1, date(2024, 1, 1)) == 60
+
+    async def test_cutoff_before_start_counts_zero(self, db):
+        await self._start(1, 21)
+        closed = await database.close_open_shifts(database.TZ.localize(datetime(2024, 1, 15, 20, 30, 0)))
+        assert closed[0][1] == 0
+
+    async def test_close_shift_honours_end_dt(self, db):
+        await self._start(1, 9)
+        end = database.TZ.localize(datetime(2024, 1, 15, 10, 15, 0))
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 23, 0, 0))):
+            mins, _, t_end = await database.close_shift(1, end_dt=end)
+        assert (mins, t_end) == (75, "10:15:00")
+
+
 # ---------------------------------------------------------------------------
 # Shift status
 # ---------------------------------------------------------------------------
@@ -178,18 +267,30 @@ class TestGetShiftStatus:
     async def test_status_active_when_shift_open(self, db):
         await database.add_or_update_user(200, "u", "U")
         await database.set_user_roles(200, [1])
-        with patch("database.get_now", return_value=datetime(2024, 1, 15, 9, 0, 0, tzinfo=database.TZ)), \
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 9, 0, 0))), \
              patch("database.get_today", return_value=date(2024, 1, 15)):
             await database.record_shift_start(200, 1)
         status = await database.get_shift_status(200)
         assert status == "active"
 
+    async def test_status_none_while_another_role_unused(self, db):
+        await database.add_or_update_user(200, "u", "U")
+        await database.set_user_roles(200, [1, 3])
+        today = date(2024, 1, 15)
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 9, 0, 0))), \
+             patch("database.get_today", return_value=today):
+            await database.record_shift_start(200, 1)
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 10, 0, 0))):
+            await database.close_shift(200)
+        with patch("database.get_today", return_value=today):
+            assert await database.get_shift_status(200) == "none"
+
     async def test_status_finished_all_when_all_roles_used(self, db):
         await database.add_or_update_user(200, "u", "U")
         await database.set_user_roles(200, [1])
         today = date(2024, 1, 15)
-        start = datetime(2024, 1, 15, 9, 0, 0, tzinfo=database.TZ)
-        end = datetime(2024, 1, 15, 10, 0, 0, tzinfo=database.TZ)
+        start = database.TZ.localize(datetime(2024, 1, 15, 9, 0, 0))
+        end = database.TZ.localize(datetime(2024, 1, 15, 10, 0, 0))
         with patch("database.get_now", return_value=start), \
              patch("database.get_today", return_value=today):
             await database.record_shift_start(200, 1)
@@ -217,8 +318,8 @@ class TestGetUsedRoleIdsToday:
         await database.add_or_update_user(300, "u", "U")
         await database.set_user_roles(300, [1])
         today = date(2024, 1, 15)
-        start = datetime(2024, 1, 15, 9, 0, 0, tzinfo=database.TZ)
-        end = datetime(2024, 1, 15, 10, 0, 0, tzinfo=database.TZ)
+        start = database.TZ.localize(datetime(2024, 1, 15, 9, 0, 0))
+        end = database.TZ.localize(datetime(2024, 1, 15, 10, 0, 0))
         with patch("database.get_now", return_value=start), \
              patch("database.get_today", return_value=today):
             await database.record_shift_start(300, 1)
@@ -243,8 +344,8 @@ class TestGetMonthHours:
         await database.add_or_update_user(400, "u", "U")
         await database.set_user_roles(400, [1])
         today = date(2024, 1, 15)
-        start = datetime(2024, 1, 15, 9, 0, 0, tzinfo=database.TZ)
-        end = datetime(2024, 1, 15, 10, 0, 0, tzinfo=database.TZ)  # 60 minutes
+        start = database.TZ.localize(datetime(2024, 1, 15, 9, 0, 0))
+        end = database.TZ.localize(datetime(2024, 1, 15, 10, 0, 0))  # 60 minutes
         with patch("database.get_now", return_value=start), \
              patch("database.get_today", return_value=today):
             await database.record_shift_start(400, 1)
@@ -262,7 +363,7 @@ class TestManualAdjustment:
     async def test_manual_entry_recorded(self, db):
         await database.add_or_update_user(500, "u", "U")
         await database.set_user_roles(500, [2])
-        with patch("database.get_now", return_value=datetime(2024, 1, 15, 12, 0, 0, tzinfo=database.TZ)), \
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 12, 0, 0))), \
              patch("database.get_today", return_value=date(2024, 1, 15)):
             await database.add_manual_adjustment(500, 2, 45)
         mins = await database.get_month_hours_for_user(500, date(2024, 1, 1))
@@ -270,12 +371,404 @@ class TestManualAdjustment:
 
     async def test_manual_shift_not_counted_as_active(self, db):
         await database.add_or_update_user(500, "u", "U")
-        with patch("database.get_now", return_value=datetime(2024, 1, 15, 12, 0, 0, tzinfo=database.TZ)), \
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 12, 0, 0))), \
              patch("database.get_today", return_value=date(2024, 1, 15)):
             await database.add_manual_adjustment(500, 1, 30)
         assert await database.is_shift_active(500) is False
 
 
+# ---------------------------------------------------------------------------
+# get_total_summary_report
+# ---------------------------------------------------------------------------
+
+class TestTotalSummaryReport:
+    async def _shift(self, user_id, role_id, day, start_h, end_h=None):
+        start = database.TZ.localize(datetime(2024, 1, day, start_h, 0, 0))
+        with patch("database.get_now", return_value=start), \
+             patch("database.get_today", return_value=date(2024, 1, day)):
+            await database.record_shift_start(user_id, role_id)
+        if end_h is not None:
+            with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, day, end_h, 0, 0))):
+                await database.close_shift(user_id)
+
+    async def test_namesakes_are_reported_separately(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await database.add_or_update_user(2, "b", "Ana")
+        await self._shift(1, 1, 15, 9, 10)
+        await self._shift(2, 3, 15, 9, 11)
+        totals, mins, money = await database.get_total_summary_report(date(2024, 1, 1), date(2024, 1, 31))
+        assert totals[1] == {"name": "Ana", "mins": 60, "money": Decimal("402.00")}
+        assert totals[2] == {"name": "Ana", "mins": 120, "money": Decimal("744.00")}
+        assert (mins, money) == (180, Decimal("1146.00"))
+
+    async def test_groups_across_days_roles_and_adjustments(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await self._shift(1, 1, 10, 9, 10)   # 60 мин * 6.7
+        await self._shift(1, 3, 11, 9, 12)   # 180 мин * 6.2
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 12, 12, 0))), \
+             patch("database.get_today", return_value=date(2024, 1, 12)):
+            await database.add_manual_adjustment(1, 1, -15)  # -15 мин * 6.7
+        totals, mins, money = await database.get_total_summary_report(date(2024, 1, 1), date(2024, 1, 31))
+        assert totals[1]["mins"] == 225
+        assert totals[1]["money"] == Decimal("402.00") + Decimal("1116.00") - Decimal("100.50")
+        assert money == totals[1]["money"]
+
+    async def test_open_shift_counted_live(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await self._shift(1, 1, 15, 9)
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 9, 45, 30))):
+            totals, mins, money = await database.get_total_summary_report(date(2024, 1, 15), date(2024, 1, 15))
+        assert totals[1]["mins"] == 45
+        assert money == Decimal("301.50")
+
+    async def test_period_bounds_respected(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await self._shift(1, 1, 10, 9, 10)
+        totals, mins, money = await database.get_total_summary_report(date(2024, 1, 11), date(2024, 1, 31))
+        assert totals == {} and mins == 0 and money == Decimal("0.00")
+
+
+# ---------------------------------------------------------------------------
+# Integer money (rate_minor / earned_minor)
+# ---------------------------------------------------------------------------
+
+class TestIntegerMoney:
+    async def _earned(self, user_id):
+        async with database.connect() as conn:
+            async with conn.execute(
+                    "SELECT rate_minor, earned_minor FROM shifts WHERE user_id = ? ORDER BY shift_id",
+                    (user_id,)) as c:
+                return await c.fetchall()
+
+    def test_minor_to_decimal(self):
+        assert database.minor_to_decimal(12345) == Decimal("123.45")
+        assert str(database.minor_to_decimal(0)) == "0.00"
+        assert database.minor_to_decimal(-1005) == Decimal("-10.05")
+
+    async def test_close_shift_stores_earned_minor(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await TestTotalSummaryReport()._shift(1, 3, 15, 9, 11)
+        assert await self._earned(1) == [(620, 120 * 620)]
+
+    async def test_open_shift_has_no_earned_minor(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await TestTotalSummaryReport()._shift(1, 1, 15, 9)
+        assert await self._earned(1) == [(670, None)]
+
+    async def test_bulk_close_and_manual_store_earned_minor(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await TestTotalSummaryReport()._shift(1, 1, 15, 9)
+        await database.close_open_shifts(database.TZ.localize(datetime(2024, 1, 15, 10, 30, 0)))
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 12, 0))), \
+             patch("database.get_today", return_value=date(2024, 1, 15)):
+            await database.add_manual_adjustment(1, 3, -15)
+        assert await self._earned(1) == [(670, 90 * 670), (620, -15 * 620)]
+
+    async def test_user_report_totals_from_minor_units(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await TestTotalSummaryReport()._shift(1, 1, 15, 9, 10)
+        await TestTotalSummaryReport()._shift(1, 3, 16, 9, 12)
+        mins, money, lines = await database.get_user_shifts_report(1, date(2024, 1, 1), date(2024, 1, 31))
+        assert (mins, money) == (240, Decimal("1518.00"))
+        assert lines[0].endswith("402.00 RSD")
+
+
+# ---------------------------------------------------------------------------
+# Epoch timestamps (start_ts / end_ts)
+# ---------------------------------------------------------------------------
+
+class TestEpochTimestamps:
+    async def _start(self, user_id, day, hour):
+        await database.add_or_update_user(user_id, "u", "U")
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, day, hour, 0))), \
+             patch("database.get_today", return_value=date(2024, 1, day)):
+            await database.record_shift_start(user_id, 1)
+
+    async def _timestamps(self, user_id):
+        async with database.connect() as conn:
+            async with conn.execute("SELECT start_ts, end_ts FROM shifts WHERE user_id = ?", (user_id,)) as c:
+                return await c.fetchone()
+
+    def test_format_ts_uses_local_time(self):
+        ts = database.to_ts(database.TZ.localize(datetime(2024, 7, 1, 9, 5)))
+        assert database.format_ts(ts) == "09:05"
+        assert database.format_ts(ts, "%H:%M:%S") == "09:05:00"
+
+    async def test_start_and_close_write_timestamps(self, db):
+        await self._start(1, 15, 9)
+        end = database.TZ.localize(datetime(2024, 1, 15, 10, 30))
+        await database.close_shift(1, end_dt=end)
+        start_ts, end_ts = await self._timestamps(1)
+        assert end_ts == database.to_ts(end)
+        assert end_ts - start_ts == 90 * 60
+
+    async def test_active_shifts_started_since(self, db):
+        await self._start(1, 14, 22)
+        await self._start(2, 15, 9)
+        since = database.day_start(date(2024, 1, 15))
+        rows = await database.get_users_with_active_shifts(started_since=since)
+        assert [row[0] for row in rows] == [2]
+        assert len(await database.get_users_with_active_shifts()) == 2
+
+
+# ---------------------------------------------------------------------------
+# Daily rollup (user_day_totals)
+# ---------------------------------------------------------------------------
+
+class TestDayTotals:
+    async def _totals(self):
+        async with database.connect() as conn:
+            async with conn.execute(
+                    "SELECT user_id, day, role_id, minutes, earned_minor, shifts FROM user_day_totals "
+                    "ORDER BY user_id, day, role_id") as c:
+                return await c.fetchall()
+
+    async def _activity(self):
+        await database.add_or_update_user(1, "a", "Ana")
+        await database.add_or_update_user(2, "b", "Bob")
+        await TestTotalSummaryReport()._shift(1, 1, 15, 9, 10)
+        await TestTotalSummaryReport()._shift(1, 1, 15, 11, 13)
+        await TestTotalSummaryReport()._shift(2, 3, 15, 12)
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 14, 0))), \
+             patch("database.get_today", return_value=date(2024, 1, 15)):
+            await database.add_manual_adjustment(1, 1, -10)
+
+    async def test_writes_keep_totals_in_step(self, db):
+        await self._activity()
+        # Открытая смена в итоги не попадает
+        assert await self._totals() == [(1, "2024-01-15", 1, 170, 170 * 670, 3)]
+        await database.close_open_shifts(database.TZ.localize(datetime(2024, 1, 15, 20, 30)))
+        assert (2, "2024-01-15", 3, 510, 510 * 620, 1) in await self._totals()
+        assert await database.check_day_totals() == []
+
+    async def test_check_reports_and_rebuild_fixes_drift(self, db):
+        await self._activity()
+        async with database.connect() as conn:
+            await conn.execute("UPDATE user_day_totals SET minutes = 0")
+            await conn.execute("INSERT INTO user_day_totals VALUES (9, '2024-01-16', 1, 5, 5, 1)")
+            await conn.commit()
+        mismatches = await database.check_day_totals()
+        assert [key for key, _, _ in mismatches] == [(1, "2024-01-15", 1), (9, "2024-01-16", 1)]
+        assert mismatches[1][2] is None
+
+        await database.rebuild_day_totals()
+        assert await database.check_day_totals() == []
+
+    async def test_rebuild_limited_to_period(self, db):
+        await self._activity()
+        async with database.connect() as conn:
+            await conn.execute("INSERT INTO user_day_totals VALUES (9, '2024-02-01', 1, 5, 5, 1)")
+            await conn.commit()
+        await database.rebuild_day_totals(date(2024, 1, 1), date(2024, 1, 31))
+        assert [key for key, _, _ in await database.check_day_totals()] == [(9, "2024-02-01", 1)]
+
+
+# ---------------------------------------------------------------------------
+# Prefix sums (user_day_prefix + in-memory copy)
+# ---------------------------------------------------------------------------
+
+class TestDayPrefix:
+    async def _manual(self, user_id, day, minutes, role_id=1):
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, day, 12, 0))), \
+             patch("database.get_today", return_value=date(2024, 1, day)):
+            await database.add_manual_adjustment(user_id, role_id, minutes)
+
+    async def test_range_totals_after_writes(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await database.load_day_prefix()
+        await TestTotalSummaryReport()._shift(1, 1, 10, 9, 10)
+        await self._manual(1, 12, 30, role_id=3)
+        await TestTotalSummaryReport()._shift(1, 1, 20, 9, 11)
+
+        assert await database.get_range_totals(1, date(2024, 1, 1), date(2024, 1, 31)) == (
+            210, Decimal("1392.00"), 3)
+        assert await database.get_range_totals(1, date(2024, 1, 11), date(2024, 1, 19)) == (
+            30, Decimal("186.00"), 1)
+        assert await database.check_day_prefix() == []
+
+    async def test_memory_matches_fresh_load(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await database.load_day_prefix()
+        await self._manual(1, 20, 60)
+        await self._manual(1, 10, 30)  # задним числом: сдвигает итоги 20-го
+        in_memory = database.day_prefix.upto(1, "2024-01-20")
+
+        await database.load_day_prefix(force=True)
+        assert database.day_prefix.upto(1, "2024-01-20") == in_memory == (90, 90 * 670, 2)
+
+    async def test_rebuild_restores_prefix(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await self._manual(1, 10, 30)
+        await self._manual(1, 11, 45)
+        async with database.connect() as conn:
+            await conn.execute("UPDATE user_day_prefix SET cum_minutes = 0")
+            await conn.commit()
+        assert [key for key, _, _ in await database.check_day_prefix()] == [(1, "2024-01-10"), (1, "2024-01-11")]
+
+        await database.rebuild_day_totals()
+        assert await database.check_day_prefix() == []
+        assert (await database.get_range_totals(1, date(2024, 1, 11), date(2024, 1, 11)))[0] == 45
+
+
+# ---------------------------------------------------------------------------
+# Report cache
+# ---------------------------------------------------------------------------
+
+class TestReportCache:
+    _JAN = (date(2024, 1, 1), date(2024, 1, 31))
+    _DEC = (date(2023, 12, 1), date(2023, 12, 31))
+
+    async def test_repeat_report_served_from_cache(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await TestTotalSummaryReport()._shift(1, 1, 10, 9, 10)
+        first = await database.get_total_summary_report(*self._JAN)
+        statements = []
+        async with database.connect() as a, database.connect() as b:
+            for conn in (a, b):
+                await conn.set_trace_callback(statements.append)
+        assert await database.get_total_summary_report(*self._JAN) == first
+        assert statements == []
+        assert database.cache_stats()["reports"]["hits"] == 1
+
+    async def test_shift_write_invalidates_affected_reports_only(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await database.add_or_update_user(2, "b", "Bob")
+        await TestTotalSummaryReport()._shift(1, 1, 10, 9, 10)
+        await database.get_user_shifts_report(1, *self._JAN)
+        await database.get_user_shifts_report(1, *self._DEC)
+        await database.get_user_shifts_report(2, *self._JAN)
+        await database.get_total_summary_report(*self._JAN)
+
+        await TestTotalSummaryReport()._shift(1, 3, 11, 9, 11)
+
+        cache = database.report_cache
+        assert len(cache) == 2
+        assert cache.get("user_shifts", 1, "2023-12-01", "2023-12-31") is not MISSING
+        assert cache.get("user_shifts", 2, "2024-01-01", "2024-01-31") is not MISSING
+        mins, _, _ = await database.get_user_shifts_report(1, *self._JAN)
+        assert mins == 180
+
+    async def test_user_list_refreshed_on_rename_not_on_repeat(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        assert await database.get_all_users() == [(1, "Ana")]
+        await database.add_or_update_user(1, "a", "Ana")
+        assert database.report_cache.get("users", None) == [(1, "Ana")]
+        await database.add_or_update_user(1, "a", "Anna")
+        assert await database.get_all_users() == [(1, "Anna")]
+
+
+# ---------------------------------------------------------------------------
+# Keyset user paging
+# ---------------------------------------------------------------------------
+
+class TestUsersPage:
+    async def _users(self, names):
+        for uid, name in enumerate(names, start=1):
+            await database.add_or_update_user(uid, "u", name)
+
+    async def test_walk_forward_and_back(self, db):
+        await self._users(["Eve", "Ana", "Dan", "Bob", "Cid"])
+        first = await database.get_users_page(limit=2)
+        assert first == database.UsersPage([(2, "Ana"), (4, "Bob")], has_prev=False, has_next=True)
+        second = await database.get_users_page(after=4, limit=2)
+        assert second == database.UsersPage([(5, "Cid"), (3, "Dan")], has_prev=True, has_next=True)
+        last = await database.get_users_page(after=3, limit=2)
+        assert last == database.UsersPage([(1, "Eve")], has_prev=True, has_next=False)
+        back = await database.get_users_page(before=1, limit=2)
+        assert back == second
+        assert await database.get_users_page(before=5, limit=2) == database.UsersPage(
+            [(2, "Ana"), (4, "Bob")], has_prev=False, has_next=True)
+
+    async def test_namesakes_ordered_by_id(self, db):
+        await self._users(["Ana", "Ana", "Ana"])
+        page = await database.get_users_page(after=1, limit=1)
+        assert page.users == [(2, "Ana")]
+
+    async def test_user_without_name_is_paged(self, db):
+        await self._users(["Bob", None, "Ana"])
+        first = await database.get_users_page(limit=2)
+        assert first.users == [(2, ""), (3, "Ana")]
+        assert (await database.get_users_page(after=3, limit=2)).users == [(1, "Bob")]
+        assert (await database.get_users_page(before=3, limit=2)).users == [(2, "")]
+
+    async def test_deleted_cursor_gives_empty_page(self, db):
+        await self._users(["Ana", "Bob"])
+        await database.delete_user(1)
+        assert (await database.get_users_page(after=1)).users == []
+
+    async def test_page_query_uses_name_index(self, db):
+        await self._users(["Ana", "Bob"])
+        statements = []
+        async with database.connect() as a, database.connect() as b:
+            for conn in (a, b):
+                await conn.set_trace_callback(statements.append)
+        await database.get_users_page(after=1)
+        await database.get_users_page(before=2)
+        async with database.connect() as conn:
+            for sql in statements:
+                async with conn.execute(f"EXPLAIN QUERY PLAN {sql}") as c:
+                    details = [row[3] for row in await c.fetchall()]
+                assert any("idx_users_name" in d for d in details), details
+
+
+# ---------------------------------------------------------------------------
+# Paged detailed report
+# ---------------------------------------------------------------------------
+
+class TestUserShiftsPage:
+    _JAN = (date(2024, 1, 1), date(2024, 1, 31))
+
+    async def _history(self, days):
+        await database.add_or_update_user(1, "a", "Ana")
+        for day in days:
+            await TestTotalSummaryReport()._shift(1, 1, day, 9, 10)
+
+    async def test_pages_cover_full_report_in_order(self, db):
+        await self._history([3, 1, 2, 5, 4])
+        _, _, full = await database.get_user_shifts_report(1, *self._JAN)
+
+        first = await database.get_user_shifts_page(1, *self._JAN, limit=2)
+        second = await database.get_user_shifts_page(1, *self._JAN, after=first.last_id, limit=2)
+        third = await database.get_user_shifts_page(1, *self._JAN, after=second.last_id, limit=2)
+        assert (first.has_prev, first.has_next) == (False, True)
+        assert (third.has_prev, third.has_next) == (True, False)
+        lines = [text for page in (first, second, third) for _, text in page.shifts]
+        assert lines == full
+        assert [text[:12] for text in lines] == [f"📅 2024-01-0{d}" for d in range(1, 6)]
+
+        back = await database.get_user_shifts_page(1, *self._JAN, before=third.first_id, limit=2)
+        assert back == second
+
+    async def test_page_respects_period(self, db):
+        await self._history([1, 20])
+        page = await database.get_user_shifts_page(1, date(2024, 1, 10), date(2024, 1, 31))
+        assert len(page.shifts) == 1 and "2024-01-20" in page.shifts[0][1]
+
+    async def test_period_totals_include_open_shift(self, db):
+        await self._history([10])
+        await TestTotalSummaryReport()._shift(1, 3, 15, 9)
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 9, 30))):
+            totals = await database.get_user_period_totals(1, *self._JAN)
+            full_mins, full_money, _ = await database.get_user_shifts_report(1, *self._JAN)
+        assert totals == (full_mins, full_money, 2, True) == (90, Decimal("588.00"), 2, True)
+
+    async def test_page_query_uses_index_without_sorting(self, db):
+        await self._history([1, 2])
+        statements = []
+        async with database.connect() as a, database.connect() as b:
+            for conn in (a, b):
+                await conn.set_trace_callback(statements.append)
+        first = await database.get_user_shifts_page(1, *self._JAN, limit=1)
+        await database.get_user_shifts_page(1, *self._JAN, after=first.last_id, limit=1)
+        await database.get_user_shifts_page(1, *self._JAN, before=first.last_id + 1, limit=1)
+        async with database.connect() as conn:
+            for sql in [s for s in statements if "LIMIT" in s]:
+                async with conn.execute(f"EXPLAIN QUERY PLAN {sql}") as c:
+                    details = [row[3] for row in await c.fetchall()]
+                assert any("idx_shifts_user_day" in d for d in details), details
+                assert not any("TEMP B-TREE" in d for d in details), details
+
+
 # ---------------------------------------------------------------------------
 # get_users_with_active_shifts
 # ---------------------------------------------------------------------------
@@ -284,7 +777,7 @@ class TestGetUsersWithActiveShifts:
     async def test_returns_open_shifts(self, db):
         await database.add_or_update_user(600, "u", "U")
         await database.set_user_roles(600, [1])
-        with patch("database.get_now", return_value=datetime(2024, 1, 15, 9, 0, 0, tzinfo=database.TZ)), \
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 9, 0, 0))), \
              patch("database.get_today", return_value=date(2024, 1, 15)):
             await database.record_shift_start(600, 1)
         active = await database.get_users_with_active_shifts()
@@ -294,8 +787,8 @@ class TestGetUsersWithActiveShifts:
     async def test_closed_shifts_not_included(self, db):
         await database.add_or_update_user(601, "u2", "U2")
         await database.set_user_roles(601, [1])
-        start = datetime(2024, 1, 15, 9, 0, 0, tzinfo=database.TZ)
-        end = datetime(2024, 1, 15, 11, 0, 0, tzinfo=database.TZ)
+        start = database.TZ.localize(datetime(2024, 1, 15, 9, 0, 0))
+        end = database.TZ.localize(datetime(2024, 1, 15, 11, 0, 0))
         with patch("database.get_now", return_value=start), \
              patch("database.get_today", return_value=date(2024, 1, 15)):
             await database.record_shift_start(601, 1)
@@ -304,3 +797,129 @@ class TestGetUsersWithActiveShifts:
         active = await database.get_users_with_active_shifts()
         user_ids = [row[0] for row in active]
         assert 601 not in user_ids
+
+
+# ---------------------------------------------------------------------------
+# Storage profile (PRAGMA tuning)
+# ---------------------------------------------------------------------------
+
+class TestStorageProfile:
+    async def test_wal_enabled_by_default(self, db):
+        async with database.connect() as conn:
+            async with conn.execute("PRAGMA journal_mode") as c:
+                assert (await c.fetchone())[0] == "wal"
+            async with conn.execute("PRAGMA synchronous") as c:
+                assert (await c.fetchone())[0] == 1  # NORMAL
+            async with conn.execute("PRAGMA temp_store") as c:
+                assert (await c.fetchone())[0] == 2  # MEMORY
+
+    async def test_reader_not_blocked_by_open_write_transaction(self, db):
+        await database.add_or_update_user(1, "u", "Alice")
+        async with database.connect() as writer:
+            await writer.execute("UPDATE users SET first_name = 'Bob' WHERE user_id = 1")
+            assert writer.in_transaction
+            # Второе соединение пула читает последнюю закоммиченную версию
+            assert await database.get_user_by_id(1) == "Alice"
+
+    async def test_checkpoint_returns_counters(self, db):
+        await database.add_or_update_user(1, "u", "Alice")
+        busy, wal_pages, moved = await database.checkpoint_wal()
+        assert busy == 0
+        assert moved <= wal_pages
+
+    def test_unknown_profile_rejected(self):
+        with pytest.raises(ValueError):
+            database.use_storage_profile("turbo")
+
+    def test_profile_pragmas_cover_tuning_knobs(self):
+        pragmas = " ".join(database.STORAGE_PROFILES["wal"].pragmas())
+        for knob in ("journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store", "busy_timeout"):
+            assert knob in pragmas
+
+
+# ---------------------------------------------------------------------------
+# Query plans: hot queries must use indexes, never a full scan of shifts
+# ---------------------------------------------------------------------------
+
+_D = date(2024, 1, 15)
+
+_PLAN_TABLES = ("shifts", "user_day_totals", "user_day_prefix")
+
+async def _drain(stream):
+    return [item async for item in stream]
+
+
+_HOT_QUERIES = {
+    "is_shift_active": lambda: database.is_shift_active(1),
+    "close_shift": lambda: database.close_shift(1),
+    "get_users_with_active_shifts": lambda: database.get_users_with_active_shifts(),
+    "get_users_with_active_shifts_since": lambda: database.get_users_with_active_shifts(
+        started_since=database.day_start(_D)),
+    "get_used_role_ids_today": lambda: database.get_used_role_ids_today(1),
+    "get_month_hours_for_user": lambda: database.get_month_hours_for_user(1, _D),
+    "get_user_shifts_report": lambda: database.get_user_shifts_report(1, _D, _D),
+    "get_total_summary_report": lambda: database.get_total_summary_report(_D, _D),
+    "get_shift_status": lambda: database.get_shift_status(1),
+    "iter_payroll_shifts": lambda: _drain(database.iter_payroll_shifts(_D, _D)),
+    "close_open_shifts": lambda: database.close_open_shifts(database.TZ.localize(datetime(2024, 1, 15, 20, 30))),
+}
+
+
+class TestQueryPlans:
+    async def _seed(self):
+        await database.add_or_update_user(1, "u", "U")
+        await database.set_user_roles(1, [1])
+        start = database.TZ.localize(datetime(2024, 1, 15, 9, 0, 0))
+        end = database.TZ.localize(datetime(2024, 1, 15, 10, 0, 0))
+        with patch("database.get_now", return_value=start), \
+             patch("database.get_today", return_value=_D):
+            await database.record_shift_start(1, 1)
+        with patch("database.get_now", return_value=end):
+            await database.close_shift(1)
+        with patch("database.get_now", return_value=start), \
+             patch("database.get_today", return_value=_D):
+            await database.record_shift_start(1, 1)
+        # Загрузка накопленных итогов в память — разовый полный проход, не горячий путь
+        await database.load_day_prefix()
+
+    async def _capture_statements(self, call):
+        """Runs `call` with SQL tracing enabled on every pooled connection."""
+        statements = []
+        async with database.connect() as a, database.connect() as b:
+            for conn in (a, b):
+                await conn.set_trace_callback(statements.append)
+        try:
+            await call()
+        finally:
+            async with database.connect() as a, database.connect() as b:
+                for conn in (a, b):
+                    await conn.set_trace_callback(None)
+        return [s for s in statements
+                if any(t in s for t in _PLAN_TABLES) and s.lstrip().upper().startswith(("SELECT", "UPDATE"))]
+
+    @pytest.mark.parametrize("name", sorted(_HOT_QUERIES))
+    async def test_query_uses_index(self, db, name):
+        await self._seed()
+        with patch("database.get_today", return_value=_D):
+            statements = await self._capture_statements(_HOT_QUERIES[name])
+        assert statements, f"{name} issued no query against shifts or user_day_totals"
+        async with database.connect() as conn:
+            for sql in statements:
+                async with conn.execute(f"EXPLAIN QUERY PLAN {sql}") as c:
+                    details = [row[3] for row in await c.fetchall()]
+                for detail in details:
+                    words = detail.split()
+                    if words[0] in ("SCAN", "SEARCH") and words[1] in _PLAN_TABLES + ("s", "t"):
+                        # У WITHOUT ROWID таблиц поиск по ключу выглядит как "USING PRIMARY KEY"
+                        assert "INDEX" in detail or "PRIMARY KEY" in detail, \
+                            f"{name}: full scan in plan {details!r} for {sql!r}"
+
+    async def test_payroll_reads_all_users_in_one_query(self, db):
+        await self._seed()
+        await database.add_or_update_user(2, "v", "V")  # без смен
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 12, 0))):
+            statements = await self._capture_statements(
+                lambda: _drain(database.iter_payroll_shifts(_D, _D)))
+            shifts = await _drain(database.iter_payroll_shifts(_D, _D))
+        assert len(statements) == 1
+        assert [s.user_id for s in shifts] == [1, 1]
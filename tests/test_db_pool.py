@@ -0,0 +1,84 @@
+"""
+Tests for db_pool.ConnectionPool.
+
+Every test opens a small pool on a temp SQLite file; no bot or network needed.
+"""
+import asyncio
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+@pytest.fixture
+async def pool(tmp_path):
+    p = ConnectionPool(str(tmp_path / "pool.db"), size=2, acquire_timeout=0.1,
+                       pragmas=("PRAGMA foreign_keys = ON",))
+    await p.open()
+    yield p
+    await p.close()
+
+
+class TestConnectionPool:
+    async def test_connections_are_reused(self, pool):
+        async with pool.acquire() as first:
+            pass
+        async with pool.acquire() as second:
+            pass
+        async with pool.acquire() as third:
+            pass
+        assert len({id(first), id(second), id(third)}) <= 2
+
+    async def test_pragmas_applied_to_every_connection(self, pool):
+        async with pool.acquire() as a, pool.acquire() as b:
+            for conn in (a, b):
+                async with conn.execute("PRAGMA foreign_keys") as c:
+                    assert (await c.fetchone())[0] == 1
+
+    async def test_in_use_counter(self, pool):
+        assert pool.in_use == 0
+        async with pool.acquire():
+            assert pool.in_use == 1
+        assert pool.in_use == 0
+
+    async def test_acquire_timeout_when_exhausted(self, pool):
+        async with pool.acquire(), pool.acquire():
+            with pytest.raises(PoolTimeoutError):
+                async with pool.acquire():
+                    pass
+
+    async def test_waiter_gets_released_connection(self, pool):
+        pool.acquire_timeout = 1.0
+
+        async def hold():
+            async with pool.acquire(), pool.acquire():
+                await asyncio.sleep(0.05)
+
+        async def wait():
+            async with pool.acquire() as conn:
+                return conn
+
+        _, conn = await asyncio.gather(hold(), wait())
+        assert conn is not None
+
+    async def test_uncommitted_transaction_rolled_back_on_release(self, pool):
+        async with pool.acquire() as conn:
+            await conn.execute("CREATE TABLE t (x INTEGER)")
+            await conn.commit()
+        async with pool.acquire() as conn:
+            await conn.execute("INSERT INTO t VALUES (1)")
+            assert conn.in_transaction
+        async with pool.acquire() as a, pool.acquire() as b:
+            for conn in (a, b):
+                assert not conn.in_transaction
+                async with conn.execute("SELECT COUNT(*) FROM t") as c:
+                    assert (await c.fetchone())[0] == 0
+
+    async def test_acquire_on_closed_pool_raises(self, tmp_path):
+        p = ConnectionPool(str(tmp_path / "closed.db"), size=1)
+        with pytest.raises(RuntimeError):
+            async with p.acquire():
+                pass
+
+    def test_invalid_size(self, tmp_path):
+        with pytest.raises(ValueError):
+            ConnectionPool(str(tmp_path / "x.db"), size=0)
@@ -57,3 +57,31 @@ class TestMagicI18nFilter:
         t = self._translator("value")
         await f(msg, t)
         t.assert_called_once_with("some_key")
+
+
+class TestMagicI18nFilterButtonIndex:
+    """Button keys are matched through LocaleManager's reverse text index."""
+
+    def _make_message(self, text):
+        msg = MagicMock()
+        msg.text = text
+        return msg
+
+    async def test_matches_button_text_without_translating(self):
+        f = MagicI18nFilter("button_start_shift")
+        t = MagicMock(side_effect=AssertionError("translator must not be called"))
+        assert await f(self._make_message("🚀 Начать смену"), t) is True
+
+    async def test_matches_button_text_in_any_locale(self):
+        f = MagicI18nFilter("button_start_shift")
+        t = MagicMock()
+        assert await f(self._make_message("🚀 Start Shift"), t) is True
+        t.assert_not_called()
+
+    async def test_other_button_text_does_not_match(self):
+        f = MagicI18nFilter("button_start_shift")
+        assert await f(self._make_message("🏁 Закончить смену"), MagicMock()) is False
+
+    async def test_plain_text_does_not_match(self):
+        f = MagicI18nFilter("button_admin_panel")
+        assert await f(self._make_message("привет"), MagicMock()) is False
@@ -0,0 +1,138 @@
+"""
+Tests for the SQLite-backed FSM storage in fsm_storage.py.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+from aiogram.fsm.storage.base import StorageKey
+
+import database
+from fsm_storage import SQLiteStorage
+from states import AdminManualAdd
+
+KEY = StorageKey(bot_id=42, chat_id=7, user_id=7)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def _rows():
+    async with database.connect() as conn:
+        async with conn.execute("SELECT key, state, data FROM fsm_states") as c:
+            return await c.fetchall()
+
+
+class TestSQLiteStorage:
+    async def test_state_and_data_round_trip(self, db):
+        storage = SQLiteStorage()
+        await storage.set_state(KEY, AdminManualAdd.waiting_for_hours)
+        await storage.update_data(KEY, {"user_id": 5, "user_name": "Ана"})
+        assert await storage.get_state(KEY) == AdminManualAdd.waiting_for_hours.state
+        assert await storage.get_data(KEY) == {"user_id": 5, "user_name": "Ана"}
+        assert await storage.get_state(StorageKey(bot_id=42, chat_id=8, user_id=8)) is None
+        await storage.close()
+
+    async def test_writes_are_batched_until_flush_and_survive_restart(self, db):
+        storage = SQLiteStorage(flush_interval=3600)
+        await storage.set_state(KEY, AdminManualAdd.waiting_for_role)
+        await storage.set_data(KEY, {"user_id": 5})
+        assert await _rows() == []
+        assert await storage.flush() == 1
+        assert await _rows() == [("fsm:42:7:7:default", "AdminManualAdd:waiting_for_role", '{"user_id": 5}')]
+        await storage.close()
+
+        restarted = SQLiteStorage()
+        assert await restarted.get_state(KEY) == "AdminManualAdd:waiting_for_role"
+        assert await restarted.get_data(KEY) == {"user_id": 5}
+
+    async def test_flush_loop_runs_in_background(self, db):
+        storage = SQLiteStorage(flush_interval=0.01)
+        await storage.set_state(KEY, "S:one")
+        await asyncio.sleep(0.1)
+        assert [row[1] for row in await _rows()] == ["S:one"]
+        await storage.close()
+
+    async def test_close_flushes_pending_writes(self, db):
+        storage = SQLiteStorage(flush_interval=3600)
+        await storage.set_state(KEY, "S:one")
+        await storage.close()
+        assert len(await _rows()) == 1
+
+    async def test_cleared_state_deletes_row(self, db):
+        storage = SQLiteStorage()
+        await storage.set_state(KEY, "S:one")
+        await storage.set_data(KEY, {"a": 1})
+        await storage.flush()
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        await storage.flush()
+        assert await _rows() == []
+        await storage.close()
+
+    async def test_reads_are_served_from_memory(self, db):
+        storage = SQLiteStorage()
+        with patch.object(storage, "_load", wraps=storage._load) as load:
+            for _ in range(5):
+                assert await storage.get_state(KEY) is None
+            await storage.set_state(KEY, "S:one")
+            await storage.flush()
+            assert await storage.get_state(KEY) == "S:one"
+        assert load.await_count == 1
+        assert storage.stats()["hits"] >= 5
+
+    async def test_evicted_entries_are_read_back(self, db):
+        storage = SQLiteStorage(maxsize=1)
+        other = StorageKey(bot_id=42, chat_id=8, user_id=8)
+        await storage.set_state(KEY, "S:one")
+        await storage.set_state(other, "S:two")
+        await storage.flush()
+        assert await storage.get_state(KEY) == "S:one"
+        assert await storage.get_state(other) == "S:two"
+        await storage.close()
+
+    async def test_key_evicted_during_flush_is_not_read_stale(self, db):
+        storage = SQLiteStorage(maxsize=1, flush_interval=3600)
+        other = StorageKey(bot_id=42, chat_id=8, user_id=8)
+        await storage.set_state(KEY, "S:one")
+        await storage.flush()
+        await storage.set_state(KEY, "S:two")
+
+        connect, writing, resume = storage._connect, asyncio.Event(), asyncio.Event()
+
+        @asynccontextmanager
+        async def paused_connect():
+            writing.set()
+            await resume.wait()
+            async with connect() as conn:
+                yield conn
+
+        with patch.object(storage, "_connect", paused_connect):
+            flush = asyncio.create_task(storage.flush())
+            await writing.wait()
+        # Пока пачка пишется, KEY вытесняется из кэша, а в базе еще "S:one"
+        await storage.set_state(other, "S:other")
+        assert await storage.get_state(KEY) == "S:two"
+        resume.set()
+        assert await flush == 1
+        assert await storage.get_state(KEY) == "S:two"
+        await storage.close()
+
+    async def test_idle_states_expire_and_are_purged(self, db):
+        clock = FakeClock()
+        storage = SQLiteStorage(ttl=3600, clock=clock)
+        await storage.set_state(KEY, "S:one")
+        await storage.set_data(KEY, {"a": 1})
+        await storage.flush()
+
+        clock.now += 3601
+        assert await storage.get_state(KEY) is None
+        assert await storage.get_data(KEY) == {}
+        assert await storage.purge_expired() == 1
+        assert await _rows() == []
+        await storage.close()
@@ -0,0 +1,78 @@
+"""
+Unit tests for keyboards.py.
+
+The keyboard registry is built from the real locale files; the main menu
+test patches the single status query, so no database is needed.
+"""
+from unittest.mock import AsyncMock, patch
+
+import database
+import keyboards as kb
+from middlewares.locales_manager import i18n
+
+
+def _texts(markup):
+    rows = markup.keyboard if hasattr(markup, "keyboard") else markup.inline_keyboard
+    return [button.text for row in rows for button in row]
+
+
+class TestKeyboardRegistry:
+    def test_every_variant_prebuilt(self):
+        for locale in i18n.bundles:
+            for status in kb.SHIFT_STATUSES:
+                for is_admin in (False, True):
+                    assert kb.registry.main_menu(locale, status, is_admin) is \
+                        kb.registry.main_menu(locale, status, is_admin)
+
+    def test_active_status_shows_end_button(self):
+        texts = _texts(kb.registry.main_menu("ru", "active", False))
+        assert i18n.get("button_end_shift", locale="ru") in texts
+        assert i18n.get("button_start_shift", locale="ru") not in texts
+
+    def test_admin_button_only_for_admins(self):
+        admin_text = i18n.get("button_admin_panel", locale="en")
+        assert admin_text in _texts(kb.registry.main_menu("en", "none", True))
+        assert admin_text not in _texts(kb.registry.main_menu("en", "none", False))
+
+    def test_unknown_locale_falls_back_to_default(self):
+        assert kb.get_admin_panel_keyboard("xx") is kb.get_admin_panel_keyboard(i18n.default_locale)
+
+    def test_static_keyboards_are_shared(self):
+        assert kb.get_user_stats_keyboard("ru") is kb.get_user_stats_keyboard("ru")
+        assert kb.get_language_keyboard() is kb.get_language_keyboard()
+
+
+class TestMainMenuKeyboard:
+    async def test_uses_single_status_query(self):
+        with patch("database.get_shift_status", new=AsyncMock(return_value="active")) as status:
+            markup = await kb.get_main_menu_keyboard("ru", 1, is_admin=False)
+        status.assert_awaited_once_with(1)
+        assert markup is kb.registry.main_menu("ru", "active", False)
+
+
+class TestPagedUserKeyboards:
+    def _callbacks(self, markup):
+        return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+    def test_middle_page_has_both_arrows(self):
+        page = database.UsersPage([(5, "Ana"), (7, "Bob")], has_prev=True, has_next=True)
+        callbacks = self._callbacks(kb.get_users_report_keyboard(lambda key: key, "month", page))
+        assert "rep_pg:month:p:5" in callbacks
+        assert "rep_pg:month:n:7" in callbacks
+
+    def test_single_page_has_no_arrows(self):
+        page = database.UsersPage([(5, "Ana")], has_prev=False, has_next=False)
+        callbacks = self._callbacks(kb.get_user_selection_keyboard(lambda key: key, page, "delete_user"))
+        assert callbacks == ["delete_user_5", "admin_panel"]
+
+    def test_selection_paging_does_not_look_like_a_pick(self):
+        page = database.UsersPage([(5, "Ana")], has_prev=False, has_next=True)
+        callbacks = self._callbacks(kb.get_user_selection_keyboard(lambda key: key, page, "manual_user"))
+        assert "users_pg:manual_user:n:5" in callbacks
+        assert [c for c in callbacks if c.startswith("manual_user_")] == ["manual_user_5"]
+
+    def test_shifts_page_keyboard(self):
+        page = database.ShiftsPage([(11, "a"), (12, "b")], has_prev=True, has_next=False)
+        callbacks = self._callbacks(
+            kb.get_shifts_page_keyboard(lambda key: key, page, "rep_sh:month:7", back_callback="admin_rep:month"))
+        assert callbacks == ["rep_sh:month:7:p:11", "admin_rep:month"]
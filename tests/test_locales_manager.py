@@ -0,0 +1,63 @@
+"""
+Unit tests for middlewares/locales_manager.py.
+
+They load the real .ftl files from locales/, so a renamed or missing
+button key shows up here first.
+"""
+from unittest.mock import patch
+
+from middlewares.locales_manager import LocaleManager, i18n
+
+
+class TestButtonIndex:
+    def test_every_button_of_every_locale_is_indexed(self):
+        for locale in i18n.bundles:
+            for key in ("button_start_shift", "button_end_shift", "button_my_stats",
+                        "button_help", "button_admin_panel"):
+                assert i18n.button_key(i18n.get(key, locale=locale)) == key
+
+    def test_non_button_messages_are_not_indexed(self):
+        assert i18n.button_key(i18n.get("admin_panel_welcome")) is None
+        assert "admin_panel_welcome" not in i18n.button_keys
+
+    def test_unknown_or_empty_text(self):
+        assert i18n.button_key("какой-то текст") is None
+        assert i18n.button_key(None) is None
+        assert i18n.button_key("") is None
+
+    def test_index_built_on_load(self):
+        manager = LocaleManager()
+        assert manager.button_index == i18n.button_index
+
+
+class TestRenderCache:
+    def test_static_message_rendered_once(self):
+        manager = LocaleManager()
+        first = manager.get("button_start_shift", locale="ru")
+        with patch.object(manager, "_render", side_effect=AssertionError("re-rendered")):
+            assert manager.get("button_start_shift", locale="ru") == first
+        assert manager.cache_stats()["static_hits"] >= 1
+
+    def test_static_cache_is_per_locale(self):
+        manager = LocaleManager()
+        assert manager.get("button_start_shift", locale="ru") != manager.get("button_start_shift", locale="en")
+
+    def test_parameterised_message_cached_per_arguments(self):
+        manager = LocaleManager()
+        alice = manager.get("welcome", locale="ru", user_name="Alice")
+        bob = manager.get("welcome", locale="ru", user_name="Bob")
+        assert "Alice" in alice and "Bob" in bob
+        assert manager.get("welcome", locale="ru", user_name="Alice") == alice
+        assert manager.cache_stats()["args"]["hits"] == 1
+
+    def test_unhashable_arguments_bypass_cache(self):
+        manager = LocaleManager()
+        text = manager.get("welcome", locale="ru", user_name=["x"])
+        assert isinstance(text, str)
+        assert manager.cache_stats()["args"]["size"] == 0
+
+    def test_missing_key_not_cached(self):
+        manager = LocaleManager()
+        size = manager.cache_stats()["static_size"]
+        assert manager.get("no_such_key") == "no_such_key"
+        assert manager.cache_stats()["static_size"] == size
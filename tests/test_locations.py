@@ -0,0 +1,214 @@
+"""
+Tests for multi-location sharding: one SQLite file, timezone, schedule and set
+of caches per coffee bar (database.configure_locations and friends).
+"""
+import asyncio
+import os
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import database
+import main
+from config import LocationConfig
+from handlers.admin_handlers import total_report_text
+from middlewares.location import LocationMiddleware
+from scheduler.jobs import cron_auto_close_shifts
+from tests.fake_telegram import FakeTelegram, make_update
+
+
+def _location(code, db_path="", tz="Europe/Belgrade", close_at=time(20, 30)):
+    return LocationConfig(code=code, title=code.title(), db_path=db_path, tz=tz,
+                          remind_at=time(20, 0), close_at=close_at)
+
+
+@pytest.fixture
+async def nis(db, tmp_path):
+    """A second location "nis" (Moscow time, closes at 21:00) next to the default one."""
+    database.configure_locations([
+        _location("main"),
+        _location("nis", str(tmp_path / "nis.db"), tz="Europe/Moscow", close_at=time(21, 0)),
+    ])
+    await database.init_db()
+    await database.init_pool(size=2)
+    yield database.locations()[1]
+    await database.close_pool()
+    database.configure_locations([])
+
+
+async def _open_shift(user_id, location, start):
+    with database.use_location(location), \
+         patch("database.get_now", return_value=start), \
+         patch("database.get_today", return_value=start.date()):
+        await database.add_or_update_user(user_id, "u", f"User{user_id}")
+        await database.record_shift_start(user_id, 1)
+
+
+class TestShards:
+    async def test_data_goes_to_the_current_location_only(self, nis):
+        with database.use_location("nis"):
+            await database.add_or_update_user(1, "a", "Ana")
+            await database.add_manual_adjustment(1, 1, 30)
+            assert await database.get_all_users() == [(1, "Ana")]
+        assert await database.get_all_users() == []
+        assert database.current_shard().code == "main"
+        assert os.path.exists(nis.path) and nis.path != database.DB_NAME
+
+    async def test_each_location_has_its_own_timezone(self, nis):
+        assert database.format_ts(0) == "01:00"
+        with database.use_location("nis"):
+            assert database.format_ts(0) == "03:00"
+            assert database.get_now().utcoffset().total_seconds() == 3 * 3600
+
+    async def test_unknown_location_is_rejected(self, nis):
+        with pytest.raises(ValueError):
+            with database.use_location("nowhere"):
+                pass
+
+    async def test_gather_runs_locations_concurrently(self, nis):
+        started, both = [], asyncio.Event()
+
+        async def probe():
+            started.append(database.current_shard().code)
+            if len(started) == 2:
+                both.set()
+            await asyncio.wait_for(both.wait(), 1)   # ждет, пока запустится вторая точка
+            return database.current_shard().code
+
+        assert await database.gather_locations(probe) == {"main": "main", "nis": "nis"}
+
+    async def test_totals_and_caches_are_per_location(self, nis):
+        with database.use_location("nis"):
+            await database.add_or_update_user(2, "b", "Bob")
+            await database.add_manual_adjustment(2, 1, 60)
+        await database.add_or_update_user(1, "a", "Ana")
+        await database.add_manual_adjustment(1, 1, 30)
+
+        today = database.get_today()
+        results = await database.gather_locations(database.get_total_summary_report, today, today)
+        assert {code: list(totals) for code, (totals, _, _) in results.items()} == {"main": [1], "nis": [2]}
+        assert results["main"][1:] == (30, database.minor_to_decimal(30 * 670))
+        assert results["nis"][1] == 60
+        # Кэш отчета точки по умолчанию не видит вторую точку
+        assert database.report_cache.get("total_summary", None, today.isoformat(), today.isoformat()) == results["main"]
+
+
+class TestUserLocations:
+    async def test_assignment_persists_and_defaults_to_main(self, nis):
+        assert await database.get_user_location(5) == "main"
+        await database.set_user_location(5, "nis")
+        database.user_locations.clear()
+        assert await database.get_user_location(5) == "nis"
+        with pytest.raises(ValueError):
+            await database.set_user_location(5, "nowhere")
+
+    async def test_removed_location_falls_back_to_default(self, nis):
+        async with database.connect() as conn:
+            await conn.execute("INSERT INTO user_locations (user_id, location) VALUES (5, 'closed_bar')")
+            await conn.commit()
+        assert await database.get_user_location(5) == "main"
+
+    async def test_middleware_routes_update_to_users_location(self, nis):
+        await database.set_user_location(5, "nis")
+        seen = []
+
+        async def handler(event, data):
+            seen.append((database.current_shard().code, data["location"]))
+
+        for user_id in (5, 6):
+            await LocationMiddleware()(handler, None, {"event_from_user": SimpleNamespace(id=user_id)})
+        assert seen == [("nis", "nis"), ("main", "main")]
+        assert database.current_shard().code == "main"
+
+
+class TestRangeReport:
+    async def test_user_range_is_read_from_users_location(self, nis, dispatcher):
+        await database.set_user_location(9, "nis")
+        with database.use_location("nis"):
+            await database.add_or_update_user(9, "ana", "Ana")
+            await database.add_manual_adjustment(9, 1, 90)
+        async with FakeTelegram() as telegram:
+            bot = telegram.bot()
+            for text in ("/range 9 today", "/range 9 2000-01-01 2000-12-31", "/range 9"):
+                await dispatcher.feed_raw_update(bot, make_update(user_id=1, text=text))
+            await bot.session.close()
+        report, empty, usage = (params["text"] for params in await telegram.wait_for("sendMessage", 3))
+        assert "Ana" in report and "1 ч. 30 м." in report and "Записей: 1" in report
+        assert "данных нет" in empty
+        assert "Использование" in usage
+
+
+class TestLocationJobs:
+    async def test_auto_close_uses_locations_close_time_and_base(self, nis):
+        await _open_shift(1, "main", database.TZ.localize(datetime(2024, 1, 15, 9, 0)))
+        await _open_shift(2, "nis", nis.tz.localize(datetime(2024, 1, 15, 9, 0)))
+        bot = AsyncMock()
+        with patch("database.get_now", return_value=nis.tz.localize(datetime(2024, 1, 15, 21, 5))):
+            await cron_auto_close_shifts(bot, location="nis")
+        ((chat_id, text), _), = bot.send_message.call_args_list
+        assert chat_id == 2 and "09:00:00" in text and "21:00:00" in text and "12 ч. 0 м." in text
+        assert await database.is_shift_active(1)
+
+    def test_scheduler_has_jobs_per_location_in_local_time(self, nis):
+        config = SimpleNamespace(db=SimpleNamespace(checkpoint_minutes=15))
+        scheduler = main.build_scheduler(AsyncMock(), config)
+        jobs = {(job.kwargs["location"], job.func.__name__): job for job in scheduler.get_jobs()
+                if "location" in job.kwargs}
+        assert set(jobs) == {(code, name) for code in ("main", "nis")
+                             for name in ("remind_end_shift", "cron_auto_close_shifts")}
+        close_nis = jobs[("nis", "cron_auto_close_shifts")].trigger
+        assert str(close_nis.timezone) == "Europe/Moscow"
+        assert "hour='21'" in str(close_nis) and "minute='0'" in str(close_nis)
+
+
+class TestLocationLink:
+    async def test_start_link_moves_user_to_location(self, nis, dispatcher):
+        async with FakeTelegram() as telegram:
+            bot = telegram.bot()
+            await dispatcher.feed_raw_update(bot, make_update(user_id=9, text="/start loc_nis"))
+            await bot.session.close()
+        assert await database.get_user_location(9) == "nis"
+        with database.use_location("nis"):
+            assert await database.get_user_by_id(9) == "Ana"
+        assert await database.get_user_by_id(9) is None
+        first = telegram.calls[0]
+        assert first[0] == "sendMessage" and "Nis" in first[1]["text"]
+
+    async def test_open_shift_blocks_switching(self, nis, dispatcher):
+        await _open_shift(9, "main", database.get_now())
+        async with FakeTelegram() as telegram:
+            bot = telegram.bot()
+            await dispatcher.feed_raw_update(bot, make_update(user_id=9, text="/start loc_nis"))
+            await bot.session.close()
+        assert await database.get_user_location(9) == "main"
+        assert len(telegram.calls) == 1
+
+    async def test_switch_keeps_history_but_leaves_old_lists(self, nis, dispatcher):
+        today = database.get_today()
+        yesterday = today - timedelta(days=1)
+        await database.add_or_update_user(9, "ana", "Ana")
+        with patch("database.get_today", return_value=yesterday):
+            await database.add_manual_adjustment(9, 1, 30)
+        async with FakeTelegram() as telegram:
+            bot = telegram.bot()
+            await dispatcher.feed_raw_update(bot, make_update(user_id=9, text="/start loc_nis"))
+            await bot.session.close()
+        with database.use_location("nis"):
+            await database.add_manual_adjustment(9, 1, 60)
+
+        assert await database.get_all_users() == []
+        assert (await database.get_users_page()).users == []
+        # За сегодня сотрудник только на новой точке, за два дня — на обеих, без задвоения
+        text = await total_report_text("день", today, today)
+        assert "Nis" in text and "Main" not in text and text.count("Ana") == 1
+        results = await database.gather_locations(database.get_total_summary_report, yesterday, today)
+        assert {code: totals[9]["mins"] for code, (totals, _, _) in results.items()} == {"main": 30, "nis": 60}
+
+        # Вернулся — снова в списках прежней точки
+        await database.set_user_location(9, "main")
+        await database.add_or_update_user(9, "ana", "Ana")
+        assert await database.get_all_users() == [(9, "Ana")]
+        with database.use_location("nis"):
+            assert await database.get_all_users() == []
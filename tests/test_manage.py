@@ -0,0 +1,20 @@
+"""
+Tests for the maintenance commands in manage.py.
+"""
+import database
+import manage
+
+
+class TestTotalsCommands:
+    async def test_check_fails_on_drift_and_rebuild_fixes_it(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await database.add_manual_adjustment(1, 1, 30)
+        assert await manage.main(["check-totals"]) == 0
+
+        async with database.connect() as conn:
+            await conn.execute("DELETE FROM user_day_totals")
+            await conn.commit()
+        assert await manage.main(["check-totals"]) == 1
+
+        assert await manage.main(["rebuild-totals", "--from", "2000-01-01"]) == 0
+        assert await manage.main(["check-totals"]) == 0
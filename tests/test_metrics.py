@@ -0,0 +1,149 @@
+"""
+Tests for the Prometheus metrics in metrics.py.
+"""
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiogram.types import Update
+from aiohttp.test_utils import TestClient, TestServer
+
+import database
+import metrics
+from scheduler.jobs import cron_auto_close_shifts, remind_end_shift
+from tests.fake_telegram import FakeTelegram, make_update
+
+
+class TestRegistry:
+    def test_renders_text_format(self):
+        registry = metrics.Registry()
+        counter = metrics.Counter("c_total", "A counter", ("kind",), registry=registry)
+        gauge = metrics.Gauge("g", "A gauge", func=lambda: [((), 3)], registry=registry)
+        hist = metrics.Histogram("h_seconds", "A histogram", ("op",), buckets=(0.1, 1), registry=registry)
+        counter.inc('a"b')
+        counter.inc('a"b', amount=2)
+        hist.observe(0.05, "x")
+        hist.observe(0.1, "x")
+        hist.observe(3, "x")
+
+        assert registry.render() == (
+            '# HELP c_total A counter\n'
+            '# TYPE c_total counter\n'
+            'c_total{kind="a\\"b"} 3\n'
+            '# HELP g A gauge\n'
+            '# TYPE g gauge\n'
+            'g 3\n'
+            '# HELP h_seconds A histogram\n'
+            '# TYPE h_seconds histogram\n'
+            'h_seconds_bucket{op="x",le="0.1"} 2\n'
+            'h_seconds_bucket{op="x",le="1"} 2\n'
+            'h_seconds_bucket{op="x",le="+Inf"} 3\n'
+            'h_seconds_sum{op="x"} 3.15\n'
+            'h_seconds_count{op="x"} 3\n'
+        )
+        assert gauge.name == "g" and hist.count("x") == 3
+
+    def test_rejects_duplicates_and_wrong_labels(self):
+        registry = metrics.Registry()
+        counter = metrics.Counter("c_total", "A counter", ("kind",), registry=registry)
+        with pytest.raises(ValueError):
+            metrics.Counter("c_total", "Again", registry=registry)
+        with pytest.raises(ValueError):
+            counter.inc()
+
+    def test_broken_collector_is_skipped(self):
+        registry = metrics.Registry()
+        metrics.Gauge("broken", "Fails", func=lambda: 1 / 0, registry=registry)
+        metrics.Gauge("ok", "Works", func=lambda: [((), 1)], registry=registry)
+        assert registry.render() == "# HELP ok Works\n# TYPE ok gauge\nok 1\n"
+
+
+class TestHandlerMetrics:
+    async def test_latency_and_errors_per_handler(self, db, dispatcher):
+        seconds = metrics.HANDLER_SECONDS
+        before = seconds.count("common", "cmd_start"), seconds.count("", "unhandled")
+        async with FakeTelegram() as telegram:
+            bot = telegram.bot()
+            await dispatcher.feed_raw_update(bot, make_update(user_id=7, text="/start"))
+            # Сообщение в канале не подходит ни одному хендлеру
+            raw = make_update(user_id=7, text="hi")
+            raw["message"]["chat"]["type"] = "channel"
+            await dispatcher.feed_update(bot, Update.model_validate(raw, context={"bot": bot}))
+
+            errors = metrics.HANDLER_ERRORS.get("common", "cmd_start", "RuntimeError")
+            with patch("database.add_or_update_user", new=AsyncMock(side_effect=RuntimeError("boom"))):
+                with pytest.raises(RuntimeError):
+                    await dispatcher.feed_raw_update(bot, make_update(user_id=7, text="/start"))
+            await bot.session.close()
+
+        assert seconds.count("common", "cmd_start") == before[0] + 2
+        assert seconds.count("", "unhandled") == before[1] + 1
+        assert metrics.HANDLER_ERRORS.get("common", "cmd_start", "RuntimeError") == errors + 1
+
+
+class TestDatabaseMetrics:
+    @pytest.fixture(autouse=True)
+    def _restore_database(self):
+        with patch.dict(vars(database)):
+            yield
+
+    async def test_queries_and_connections_are_counted(self, db):
+        metrics.instrument_database()
+        metrics.instrument_database()
+        assert not getattr(database.get_shift_status.__wrapped__, "metrics_wrapped", False)
+
+        queries = metrics.DB_QUERY_SECONDS.count("get_shift_status", "main")
+        connections = metrics.DB_CONNECTIONS.get("main")
+        await database.get_shift_status(1)
+        assert metrics.DB_QUERY_SECONDS.count("get_shift_status", "main") == queries + 1
+        assert metrics.DB_CONNECTIONS.get("main") == connections + 1
+
+        errors = metrics.DB_QUERY_ERRORS.get("get_user_by_id", "main", "ProgrammingError")
+        with pytest.raises(Exception):
+            await database.get_user_by_id([1])
+        assert metrics.DB_QUERY_ERRORS.get("get_user_by_id", "main", "ProgrammingError") == errors + 1
+
+    async def test_orchestration_helpers_are_not_queries(self, db):
+        metrics.instrument_database()
+        assert not hasattr(database.gather_locations, "metrics_wrapped")
+        assert not hasattr(database.run_in_location, "metrics_wrapped")
+
+        queries = metrics.DB_QUERY_SECONDS.count("get_shift_status", "main")
+        await database.gather_locations(database.get_shift_status, 1)
+        assert metrics.DB_QUERY_SECONDS.count("get_shift_status", "main") == queries + 1
+        assert metrics.DB_QUERY_SECONDS.count("gather_locations", "main") == 0
+        assert metrics.DB_QUERY_SECONDS.count("run_in_location", "main") == 0
+
+    async def test_endpoint_exposes_pools_and_caches(self, db):
+        async with TestClient(TestServer(metrics.build_metrics_app())) as client:
+            response = await client.get("/metrics")
+            body = await response.text()
+        assert response.status == 200
+        assert response.headers["Content-Type"] == metrics.CONTENT_TYPE
+        assert 'coffee_bot_db_pool_connections{location="main",state="size"} 2' in body
+        assert 'coffee_bot_cache_entries{cache="reports",location="main"} 0' in body
+        assert "# TYPE coffee_bot_handler_seconds histogram" in body
+
+
+class TestJobMetrics:
+    async def test_duration_and_send_outcomes(self):
+        bot = MagicMock()
+        bot.send_message = AsyncMock()
+        i18n = MagicMock()
+        i18n.get = MagicMock(return_value="⏰")
+        runs = metrics.JOB_RUNS.get("remind_end_shift", "main", "ok")
+        sent = metrics.JOB_MESSAGES.get("remind_end_shift", "main", "sent")
+        with patch("database.get_users_with_active_shifts", new=AsyncMock(return_value=[(101,), (102,)])), \
+                patch("database.get_users_locales", new=AsyncMock(return_value={})):
+            await remind_end_shift(bot, i18n)
+        assert metrics.JOB_RUNS.get("remind_end_shift", "main", "ok") == runs + 1
+        assert metrics.JOB_MESSAGES.get("remind_end_shift", "main", "sent") == sent + 2
+        assert metrics.JOB_LAST_SUCCESS.get("remind_end_shift", "main") > 0
+
+    async def test_failed_job_is_counted(self):
+        failed = metrics.JOB_RUNS.get("cron_auto_close_shifts", "main", "error")
+        count = metrics.JOB_SECONDS.count("cron_auto_close_shifts", "main")
+        with patch("database.close_open_shifts", new=AsyncMock(side_effect=RuntimeError("locked"))):
+            with pytest.raises(RuntimeError):
+                await cron_auto_close_shifts(MagicMock())
+        assert metrics.JOB_RUNS.get("cron_auto_close_shifts", "main", "error") == failed + 1
+        assert metrics.JOB_SECONDS.count("cron_auto_close_shifts", "main") == count + 1
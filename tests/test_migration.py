@@ -0,0 +1,195 @@
+"""
+Tests for the versioned schema migrations in migration.py.
+
+Each test works on its own temp SQLite file opened with plain aiosqlite,
+so the migration engine is exercised exactly as init_db() uses it.
+"""
+import sqlite3
+
+import pytest
+import aiosqlite
+
+import migration
+from migration import Migration, apply_migrations, get_schema_version
+
+LATEST = migration.MIGRATIONS[-1].version
+
+
+@pytest.fixture
+async def conn(tmp_path):
+    async with aiosqlite.connect(str(tmp_path / "migrate.db")) as c:
+        yield c
+
+
+async def _tables(conn):
+    async with conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'") as c:
+        return {row[0] for row in await c.fetchall()}
+
+
+class TestApplyMigrations:
+    def test_registry_versions_are_consecutive(self):
+        versions = [m.version for m in migration.MIGRATIONS]
+        assert versions == list(range(1, len(versions) + 1))
+
+    async def test_fresh_db_reaches_latest_version(self, conn):
+        assert await apply_migrations(conn) == LATEST
+        assert await get_schema_version(conn) == LATEST
+        assert {"users", "roles", "shifts", "user_roles"} <= await _tables(conn)
+
+    async def test_up_to_date_boot_only_reads_user_version(self, conn):
+        await apply_migrations(conn)
+        statements = []
+        await conn.set_trace_callback(statements.append)
+        await apply_migrations(conn)
+        await conn.set_trace_callback(None)
+        assert statements == ["PRAGMA user_version"]
+
+    async def test_failed_migration_rolls_back_whole_batch(self, conn):
+        async def create_table(c):
+            await c.execute("CREATE TABLE t1 (x INTEGER)")
+
+        async def broken(c):
+            await c.execute("CREATE TABLE t2 (x INTEGER)")
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await apply_migrations(conn, [Migration(1, "ok", create_table), Migration(2, "broken", broken)])
+        assert await get_schema_version(conn) == 0
+        assert not {"t1", "t2"} & await _tables(conn)
+
+    async def test_only_pending_migrations_run(self, conn):
+        calls = []
+
+        def record(version):
+            async def apply(c):
+                calls.append(version)
+            return apply
+
+        batch = [Migration(1, "a", record(1))]
+        await apply_migrations(conn, batch)
+        batch.append(Migration(2, "b", record(2)))
+        assert await apply_migrations(conn, batch) == 2
+        assert calls == [1, 2]
+
+    async def test_pre_versioning_db_is_adopted(self, conn):
+        """A database created before user_version existed keeps its data."""
+        await conn.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, username TEXT, first_name TEXT)")
+        await conn.execute("INSERT INTO users VALUES (1, 'u', 'Alice')")
+        await conn.commit()
+
+        await apply_migrations(conn)
+
+        async with conn.execute("SELECT first_name, locale FROM users") as c:
+            assert await c.fetchall() == [("Alice", "ru")]
+
+    async def test_legacy_hours_shifts_converted_to_minutes(self, conn):
+        await conn.execute('''
+            CREATE TABLE shifts (
+                shift_id INTEGER PRIMARY KEY, user_id INTEGER, role_id INTEGER,
+                shift_date TEXT, start_time TEXT, end_time TEXT NOT NULL,
+                hours_worked REAL, rate_at_time REAL, entry_type TEXT
+            )
+        ''')
+        await conn.execute(
+            "INSERT INTO shifts VALUES (1, 7, 1, '2024-01-15', NULL, '2024-01-15T17:00:00', 1.5, 402, 'auto')")
+        await conn.commit()
+
+        await apply_migrations(conn)
+
+        async with conn.execute(
+                "SELECT start_time, minutes_worked, rate_at_time, entry_type FROM shifts") as c:
+            assert await c.fetchall() == [("2024-01-15T08:30:00", 90, "6.7", "auto")]
+        assert "shifts_old" not in await _tables(conn)
+
+    async def test_money_backfilled_as_minor_units(self, conn):
+        """Rates and earnings of existing shifts are converted with ROUND_HALF_UP."""
+        await apply_migrations(conn, [m for m in migration.MIGRATIONS if m.version < 4])
+        await conn.executemany(
+            "INSERT INTO shifts (user_id, role_id, shift_date, start_time, end_time, minutes_worked,"
+            " rate_at_time, entry_type) VALUES (1, 1, '2024-01-15', ?, ?, ?, ?, ?)",
+            [
+                ("2024-01-15T09:00:00", "2024-01-15T10:00:00", 60, "6.7", "auto"),
+                ("manual", "manual", -15, "6.25", "manual"),
+                ("2024-01-15T11:00:00", None, 0, "6.2", "auto"),
+            ])
+        await conn.commit()
+
+        await apply_migrations(conn)
+
+        async with conn.execute("SELECT rate_minor, earned_minor FROM shifts ORDER BY shift_id") as c:
+            assert await c.fetchall() == [(670, 40200), (625, -9375), (620, None)]
+        async with conn.execute("SELECT role_id, rate_minor FROM roles ORDER BY role_id") as c:
+            assert await c.fetchall() == [(1, 670), (2, 670), (3, 620)]
+
+    async def test_timestamps_backfilled_from_iso(self, conn):
+        await apply_migrations(conn, [m for m in migration.MIGRATIONS if m.version < 5])
+        await conn.executemany(
+            "INSERT INTO shifts (user_id, role_id, shift_date, start_time, end_time, rate_at_time)"
+            " VALUES (1, 1, '2024-01-15', ?, ?, '6.7')",
+            [
+                ("2024-01-15T09:00:00.123456+01:00", "2024-01-15T10:30:00+01:00"),
+                ("2024-07-15T08:30:00", None),  # без смещения — местное летнее время
+                ("manual", "manual"),
+            ])
+        await conn.commit()
+
+        await apply_migrations(conn)
+
+        async with conn.execute("SELECT start_ts, end_ts FROM shifts ORDER BY shift_id") as c:
+            assert await c.fetchall() == [
+                (1705305600, 1705311000),
+                (1721025000, None),
+                (None, None),
+            ]
+
+    async def test_day_totals_backfilled_from_shifts(self, conn):
+        await apply_migrations(conn, [m for m in migration.MIGRATIONS if m.version < 6])
+        await conn.executemany(
+            "INSERT INTO shifts (user_id, role_id, shift_date, start_time, end_time, minutes_worked,"
+            " rate_at_time, earned_minor, entry_type) VALUES (1, 1, '2024-01-15', 's', ?, ?, '6.7', ?, ?)",
+            [
+                ("e", 60, 40200, "auto"),
+                ("e", 30, 20100, "auto"),
+                ("e", -15, -10050, "manual"),
+                (None, 0, None, "auto"),  # открытая смена в итоги не попадает
+            ])
+        await conn.commit()
+
+        await apply_migrations(conn)
+
+        async with conn.execute("SELECT * FROM user_day_totals") as c:
+            assert await c.fetchall() == [(1, "2024-01-15", 1, 75, 50250, 3)]
+
+    async def test_day_prefix_backfilled_from_totals(self, conn):
+        await apply_migrations(conn, [m for m in migration.MIGRATIONS if m.version < 7])
+        await conn.executemany(
+            "INSERT INTO user_day_totals VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (1, "2024-01-10", 1, 60, 40200, 1),
+                (1, "2024-01-10", 3, 30, 18600, 1),
+                (1, "2024-01-12", 1, -15, -10050, 1),
+                (2, "2024-01-11", 1, 10, 6700, 1),
+            ])
+        await conn.commit()
+
+        await apply_migrations(conn)
+
+        async with conn.execute("SELECT * FROM user_day_prefix ORDER BY user_id, day") as c:
+            assert await c.fetchall() == [
+                (1, "2024-01-10", 90, 58800, 2),
+                (1, "2024-01-12", 75, 48750, 3),
+                (2, "2024-01-11", 10, 6700, 1),
+            ]
+
+    async def test_missing_first_names_become_empty(self, conn):
+        await apply_migrations(conn, [m for m in migration.MIGRATIONS if m.version < 14])
+        await conn.executemany("INSERT INTO users (user_id, username, first_name, active) VALUES (?, 'u', ?, ?)",
+                               [(1, "Ana", 1), (2, None, 0)])
+        await conn.commit()
+
+        await apply_migrations(conn)
+
+        async with conn.execute("SELECT user_id, first_name, locale, active FROM users ORDER BY user_id") as c:
+            assert await c.fetchall() == [(1, "Ana", "ru", 1), (2, "", "ru", 0)]
+        with pytest.raises(sqlite3.IntegrityError):
+            await conn.execute("INSERT INTO users (user_id, first_name) VALUES (3, NULL)")
@@ -0,0 +1,123 @@
+"""
+Tests for the streaming CSV payroll export in payroll_export.py.
+"""
+import csv
+import io
+from datetime import datetime, date
+from decimal import Decimal
+from unittest.mock import patch
+
+import database
+import payroll_export
+
+JAN = (date(2024, 1, 1), date(2024, 1, 31))
+
+
+async def _shift(user_id, role_id, day, start_h, end_h=None):
+    start = database.TZ.localize(datetime(2024, 1, day, start_h, 0, 0))
+    with patch("database.get_now", return_value=start), \
+         patch("database.get_today", return_value=date(2024, 1, day)):
+        await database.record_shift_start(user_id, role_id)
+    if end_h is not None:
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, day, end_h, 0, 0))):
+            await database.close_shift(user_id)
+
+
+def _rows(export):
+    text = export.file.read().decode("utf-8-sig")
+    return list(csv.reader(io.StringIO(text)))
+
+
+class TestFormatHours:
+    def test_positive_and_negative(self):
+        assert payroll_export.format_hours(95) == "1:35"
+        assert payroll_export.format_hours(-15) == "-0:15"
+
+
+class TestBuildPayrollCsv:
+    async def _seed(self):
+        await database.add_or_update_user(1, "a", "Bob")
+        await database.add_or_update_user(2, "b", "Ana")
+        await database.add_or_update_user(3, "c", "Cid")   # без смен за период
+        await _shift(1, 1, 10, 9, 10)    # 60 мин * 6.7
+        await _shift(2, 3, 11, 9, 12)    # 180 мин * 6.2
+        await _shift(2, 1, 12, 9, 10)
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 12, 12, 0))), \
+             patch("database.get_today", return_value=date(2024, 1, 12)):
+            await database.add_manual_adjustment(2, 1, -15)
+
+    async def test_rows_subtotals_and_total(self, db):
+        await self._seed()
+        export = await payroll_export.build_payroll_csv(*JAN)
+        try:
+            rows = _rows(export)
+        finally:
+            export.file.close()
+
+        assert rows[0] == list(payroll_export.CSV_HEADER)
+        assert [(r[1], r[6]) for r in rows[1:]] == [
+            ("Ana", "shift"), ("Ana", "shift"), ("Ana", "manual"), ("Ana", "subtotal"),
+            ("Bob", "shift"), ("Bob", "subtotal"), ("", "total"),
+        ]
+        assert rows[1][2:5] == ["2024-01-11", "09:00", "12:00"]
+        assert rows[3][3:5] == ["", ""]
+        assert rows[4][7:] == ["225", "3:45", "", "1417.50"]
+        assert rows[-1][7:] == ["285", "4:45", "", "1819.50"]
+        assert (export.users, export.shifts, export.minutes, export.earned_minor) == (2, 4, 285, 181950)
+
+    async def test_subtotals_match_detailed_report(self, db):
+        await self._seed()
+        export = await payroll_export.build_payroll_csv(*JAN)
+        try:
+            subtotals = {r[0]: r for r in _rows(export) if r[6] == "subtotal"}
+        finally:
+            export.file.close()
+        for uid in (1, 2):
+            mins, money, _ = await database.get_user_shifts_report(uid, *JAN)
+            assert (int(subtotals[str(uid)][7]), Decimal(subtotals[str(uid)][10])) == (mins, money)
+
+    async def test_open_shift_is_counted_live(self, db):
+        await database.add_or_update_user(1, "a", "Ana")
+        await _shift(1, 1, 15, 9)
+        with patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 9, 45))):
+            export = await payroll_export.build_payroll_csv(*JAN)
+        try:
+            rows = _rows(export)
+        finally:
+            export.file.close()
+        assert rows[1][3:5] == ["09:00", ""]
+        assert rows[1][6:8] == ["open", "45"]
+
+    async def test_small_batches_and_spill_to_disk_give_same_file(self, db):
+        await self._seed()
+        whole = await payroll_export.build_payroll_csv(*JAN)
+        with patch("payroll_export.SPOOL_MAX_SIZE", 64):
+            spilled = await payroll_export.build_payroll_csv(*JAN, batch_size=1)
+        try:
+            assert spilled.file._rolled and not whole.file._rolled
+            assert spilled.file.read() == whole.file.read()
+        finally:
+            whole.file.close()
+            spilled.file.close()
+
+    async def test_empty_period(self, db):
+        export = await payroll_export.build_payroll_csv(*JAN)
+        try:
+            assert export.shifts == 0
+            assert [r[6] for r in _rows(export)] == ["type", "total"]
+        finally:
+            export.file.close()
+
+
+class TestSpooledInputFile:
+    async def test_reads_in_chunks_from_start(self, db):
+        await TestBuildPayrollCsv()._seed()
+        export = await payroll_export.build_payroll_csv(*JAN)
+        try:
+            expected = export.file.read()
+            document = payroll_export.SpooledInputFile(export.file, "payroll.csv", chunk_size=100)
+            chunks = [chunk async for chunk in document.read(bot=None)]
+        finally:
+            export.file.close()
+        assert all(len(chunk) <= 100 for chunk in chunks) and len(chunks) > 1
+        assert b"".join(chunks) == expected
@@ -0,0 +1,46 @@
+"""
+Tests for the in-memory per-user prefix sums in prefix_sums.py.
+"""
+from prefix_sums import PrefixSums, ZERO
+
+
+def _loaded(rows=()):
+    sums = PrefixSums()
+    sums.load(rows)
+    return sums
+
+
+class TestPrefixSums:
+    def test_range_is_difference_of_two_lookups(self):
+        sums = _loaded([
+            (1, "2024-01-10", 60, 4020, 1),
+            (1, "2024-01-12", 180, 12180, 3),
+            (1, "2024-02-01", 200, 13520, 4),
+        ])
+        assert sums.range(1, "2024-01-01", "2024-01-31") == (180, 12180, 3)
+        assert sums.range(1, "2024-01-11", "2024-01-12") == (120, 8160, 2)
+        assert sums.range(1, "2024-01-13", "2024-01-31") == ZERO
+        assert sums.range(1, "2023-01-01", "2099-12-31") == (200, 13520, 4)
+
+    def test_unknown_user_is_zero(self):
+        assert _loaded().range(42, "2024-01-01", "2024-12-31") == ZERO
+
+    def test_add_appends_new_day(self):
+        sums = _loaded([(1, "2024-01-10", 60, 4020, 1)])
+        sums.add(1, "2024-01-11", 30, 2010)
+        assert sums.upto(1, "2024-01-11") == (90, 6030, 2)
+        assert sums.range(1, "2024-01-11", "2024-01-11") == (30, 2010, 1)
+
+    def test_backdated_add_shifts_later_days(self):
+        sums = _loaded([(1, "2024-01-10", 60, 4020, 1), (1, "2024-01-20", 120, 8040, 2)])
+        sums.add(1, "2024-01-15", -10, -670)
+        assert sums.upto(1, "2024-01-15") == (50, 3350, 2)
+        assert sums.upto(1, "2024-01-20") == (110, 7370, 3)
+        assert sums.range(1, "2024-01-16", "2024-01-31") == (60, 4020, 1)
+
+    def test_add_before_load_only_bumps_generation(self):
+        sums = PrefixSums()
+        sums.add(1, "2024-01-10", 60, 4020)
+        assert sums.generation == 1
+        assert not sums.loaded
+        assert sums.users() == []
@@ -5,7 +5,7 @@ All external dependencies (Bot, database calls, i18n) are mocked with
 AsyncMock / MagicMock so tests run without a real Telegram connection or DB.
 """
 import pytest
-from datetime import datetime
+from datetime import date, datetime
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from aiogram.exceptions import TelegramForbiddenError, TelegramNotFound
@@ -31,6 +31,12 @@ def _make_i18n(text="⏰ Reminder text"):
 # ---------------------------------------------------------------------------
 
 class TestRemindEndShift:
+    @pytest.fixture(autouse=True)
+    def _no_stored_locales(self):
+        """By default nobody has a stored locale, so everyone gets Russian."""
+        with patch("database.get_users_locales", new=AsyncMock(return_value={})) as m:
+            yield m
+
     async def test_no_active_shifts_sends_nothing(self):
         bot = _make_bot()
         i18n = _make_i18n()
@@ -46,27 +52,22 @@ class TestRemindEndShift:
             (101, 1, f"{today}T09:00:00+01:00"),  # today
             (102, 2, f"{today}T10:00:00+01:00"),  # today
         ]
-        with patch("database.get_users_with_active_shifts", new=AsyncMock(return_value=active)), \
-             patch("database.get_today", return_value=MagicMock(isoformat=lambda: today)):
+        with patch("database.get_users_with_active_shifts", new=AsyncMock(return_value=active)):
             await remind_end_shift(bot, i18n)
         assert bot.send_message.call_count == 2
         bot.send_message.assert_any_call(101, "⏰ Завершите смену")
         bot.send_message.assert_any_call(102, "⏰ Завершите смену")
 
-    async def test_skips_shifts_from_previous_days(self):
+    async def test_asks_only_for_shifts_started_today(self):
         bot = _make_bot()
         i18n = _make_i18n()
-        today = "2024-01-15"
-        yesterday = "2024-01-14"
-        active = [
-            (101, 1, f"{today}T09:00:00+01:00"),   # today → remind
-            (102, 2, f"{yesterday}T22:00:00+01:00"), # yesterday → skip
-        ]
-        with patch("database.get_users_with_active_shifts", new=AsyncMock(return_value=active)), \
-             patch("database.get_today", return_value=MagicMock(isoformat=lambda: today)):
+        lookup = AsyncMock(return_value=[])
+        with patch("database.get_users_with_active_shifts", new=lookup), \
+             patch("database.get_today", return_value=date(2024, 1, 15)):
             await remind_end_shift(bot, i18n)
-        assert bot.send_message.call_count == 1
-        bot.send_message.assert_called_once_with(101, i18n.get("reminder_end_shift", locale="ru"))
+        since = lookup.await_args.kwargs["started_since"]
+        assert since == database.TZ.localize(datetime(2024, 1, 15, 0, 0))
+        bot.send_message.assert_not_called()
 
     async def test_forbidden_error_is_swallowed(self):
         bot = _make_bot()
@@ -74,8 +75,7 @@ class TestRemindEndShift:
         today = "2024-01-15"
         active = [(101, 1, f"{today}T09:00:00+01:00")]
         bot.send_message.side_effect = TelegramForbiddenError(method=MagicMock(), message="Forbidden")
-        with patch("database.get_users_with_active_shifts", new=AsyncMock(return_value=active)), \
-             patch("database.get_today", return_value=MagicMock(isoformat=lambda: today)):
+        with patch("database.get_users_with_active_shifts", new=AsyncMock(return_value=active)):
             # Should not raise
             await remind_end_shift(bot, i18n)
 
@@ -85,18 +85,33 @@ class TestRemindEndShift:
         today = "2024-01-15"
         active = [(101, 1, f"{today}T09:00:00+01:00")]
         bot.send_message.side_effect = TelegramNotFound(method=MagicMock(), message="Not Found")
-        with patch("database.get_users_with_active_shifts", new=AsyncMock(return_value=active)), \
-             patch("database.get_today", return_value=MagicMock(isoformat=lambda: today)):
+        with patch("database.get_users_with_active_shifts", new=AsyncMock(return_value=active)):
             await remind_end_shift(bot, i18n)
 
+    async def test_renders_once_per_locale(self, _no_stored_locales):
+        bot = _make_bot()
+        i18n = MagicMock()
+        i18n.get = MagicMock(side_effect=lambda key, locale: f"{key}:{locale}")
+        today = "2024-01-15"
+        active = [(101, 1, f"{today}T09:00:00+01:00"),
+                  (102, 1, f"{today}T09:30:00+01:00"),
+                  (103, 1, f"{today}T10:00:00+01:00")]
+        _no_stored_locales.return_value = {101: "en", 102: None, 103: "en"}
+        with patch("database.get_users_with_active_shifts", new=AsyncMock(return_value=active)):
+            report = await remind_end_shift(bot, i18n)
+        assert i18n.get.call_count == 2
+        bot.send_message.assert_any_call(101, "reminder_end_shift:en")
+        bot.send_message.assert_any_call(102, "reminder_end_shift:ru")
+        bot.send_message.assert_any_call(103, "reminder_end_shift:en")
+        assert report.sent == 3
+
     async def test_i18n_failure_uses_fallback_text(self):
         bot = _make_bot()
         i18n = MagicMock()
         i18n.get = MagicMock(side_effect=Exception("i18n broken"))
         today = "2024-01-15"
         active = [(101, 1, f"{today}T09:00:00+01:00")]
-        with patch("database.get_users_with_active_shifts", new=AsyncMock(return_value=active)), \
-             patch("database.get_today", return_value=MagicMock(isoformat=lambda: today)):
+        with patch("database.get_users_with_active_shifts", new=AsyncMock(return_value=active)):
             await remind_end_shift(bot, i18n)
         # Fallback message contains key Russian text
         call_args = bot.send_message.call_args[0]
@@ -120,53 +135,39 @@ class TestCronAutoCloseShifts:
             await cron_auto_close_shifts(bot, i18n)
         bot.send_message.assert_not_called()
 
-    def _make_aiosqlite_connect_mock(self, rows):
-        """
-        Build a mock for aiosqlite.connect(...) whose conn.execute(...)
-        returns a synchronous async-context-manager yielding `rows`.
-
-        aiosqlite uses:  async with conn.execute("...") as c:
-        so conn.execute must return an object (not a coroutine) that has
-        async __aenter__/__aexit__.
-        """
-        mock_cursor = MagicMock()
-        mock_cursor.fetchall = AsyncMock(return_value=rows)
-        mock_cursor.__aenter__ = AsyncMock(return_value=mock_cursor)
-        mock_cursor.__aexit__ = AsyncMock(return_value=False)
-
-        mock_conn = MagicMock()
-        # execute() must return the cursor synchronously
-        mock_conn.execute = MagicMock(return_value=mock_cursor)
-        mock_conn.__aenter__ = AsyncMock(return_value=mock_conn)
-        mock_conn.__aexit__ = AsyncMock(return_value=False)
-
-        return mock_conn
-
     async def test_closes_open_shifts_and_notifies(self):
         bot = _make_bot()
         i18n = _make_i18n()
-        fake_result = (90, "09:00:00", "10:30:00")
-        mock_conn = self._make_aiosqlite_connect_mock(rows=[(101,)])
-        with patch("database.close_shift", new=AsyncMock(return_value=fake_result)) as mock_close, \
-             patch("database.get_now", return_value=datetime(2024, 1, 15, 20, 30, 0, tzinfo=database.TZ)), \
-             patch("aiosqlite.connect", return_value=mock_conn):
+        closed = [(101, 90, "09:00:00", "20:30:00")]
+        with patch("database.close_open_shifts", new=AsyncMock(return_value=closed)) as mock_close, \
+             patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 20, 31, 5))):
             await cron_auto_close_shifts(bot, i18n)
 
         mock_close.assert_awaited_once()
+        cutoff = mock_close.call_args[0][0]
+        assert (cutoff.hour, cutoff.minute, cutoff.second) == (20, 30, 0)
+        assert cutoff.tzinfo is not None
         bot.send_message.assert_called_once()
         msg_text = bot.send_message.call_args[0][1]
         assert "автоматически закрыта" in msg_text
         assert "09:00:00" in msg_text
-        assert "10:30:00" in msg_text
+        assert "20:30:00" in msg_text
+
+    async def test_every_closed_shift_is_notified(self):
+        bot = _make_bot()
+        i18n = _make_i18n()
+        closed = [(101, 60, "09:00:00", "20:30:00"), (102, 30, "20:00:00", "20:30:00")]
+        with patch("database.close_open_shifts", new=AsyncMock(return_value=closed)), \
+             patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 20, 30, 0))):
+            await cron_auto_close_shifts(bot, i18n)
+        assert [c[0][0] for c in bot.send_message.call_args_list] == [101, 102]
 
-    async def test_close_shift_none_result_skips_notification(self):
-        """If close_shift returns None (already closed), no message is sent."""
+    async def test_nothing_closed_skips_notification(self):
+        """If there was nothing to close, no message is sent."""
         bot = _make_bot()
         i18n = _make_i18n()
-        mock_conn = self._make_aiosqlite_connect_mock(rows=[(101,)])
-        with patch("database.close_shift", new=AsyncMock(return_value=None)), \
-             patch("database.get_now", return_value=datetime(2024, 1, 15, 20, 30, 0, tzinfo=database.TZ)), \
-             patch("aiosqlite.connect", return_value=mock_conn):
+        with patch("database.close_open_shifts", new=AsyncMock(return_value=[])), \
+             patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 20, 30, 0))):
             await cron_auto_close_shifts(bot, i18n)
         bot.send_message.assert_not_called()
 
@@ -175,10 +176,8 @@ class TestCronAutoCloseShifts:
         bot = _make_bot()
         bot.send_message.side_effect = Exception("Network error")
         i18n = _make_i18n()
-        fake_result = (60, "09:00:00", "10:00:00")
-        mock_conn = self._make_aiosqlite_connect_mock(rows=[(101,)])
-        with patch("database.close_shift", new=AsyncMock(return_value=fake_result)), \
-             patch("database.get_now", return_value=datetime(2024, 1, 15, 20, 30, 0, tzinfo=database.TZ)), \
-             patch("aiosqlite.connect", return_value=mock_conn):
+        closed = [(101, 60, "09:00:00", "20:30:00")]
+        with patch("database.close_open_shifts", new=AsyncMock(return_value=closed)), \
+             patch("database.get_now", return_value=database.TZ.localize(datetime(2024, 1, 15, 20, 30, 0))):
             # Should not raise
             await cron_auto_close_shifts(bot, i18n)
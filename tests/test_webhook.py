@@ -0,0 +1,93 @@
+"""
+Tests for webhook mode (webhook.py), driven through a fake Telegram API server.
+"""
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+from aiogram import Dispatcher, Router
+from aiogram.types import Message
+
+import webhook
+from config import WebhookConfig
+from middlewares.locales_manager import i18n
+from tests.fake_telegram import FakeTelegram, make_update
+
+SECRET = "s3cret"
+
+
+def _config(**overrides) -> WebhookConfig:
+    values = dict(url="https://bot.example.com/", path="/tg", host="127.0.0.1", port=0, secret=SECRET,
+                  max_connections=10, max_updates=4, max_body_size=64 * 1024)
+    values.update(overrides)
+    return WebhookConfig(**values)
+
+
+async def _post(client, update, secret=SECRET):
+    return await client.post("/tg", json=update, headers={"X-Telegram-Bot-Api-Secret-Token": secret})
+
+
+class TestWebhookApp:
+    async def test_update_goes_through_bot_dispatcher(self, db, dispatcher):
+        async with FakeTelegram() as telegram:
+            bot = telegram.bot()
+            async with TestClient(TestServer(webhook.build_webhook_app(bot, dispatcher, _config()))) as client:
+                response = await _post(client, make_update(user_id=7, text="/lang"))
+                assert response.status == 200
+                (sent,) = await telegram.wait_for("sendMessage")
+        assert sent["chat_id"] == "7"
+        assert sent["text"] == i18n.get("select_language_text", locale="ru")
+
+    async def test_wrong_secret_is_rejected(self, dispatcher):
+        async with FakeTelegram() as telegram:
+            app = webhook.build_webhook_app(telegram.bot(), dispatcher, _config())
+            async with TestClient(TestServer(app)) as client:
+                response = await _post(client, make_update(text="/lang"), secret="nope")
+                assert response.status == 401
+        assert telegram.calls == []
+
+    async def test_body_size_is_limited(self, dispatcher):
+        async with FakeTelegram() as telegram:
+            app = webhook.build_webhook_app(telegram.bot(), dispatcher, _config(max_body_size=1024))
+            async with TestClient(TestServer(app)) as client:
+                response = await _post(client, make_update(text="x" * 2048))
+                assert response.status == 413
+
+    async def test_concurrent_updates_are_bounded(self):
+        release, running, peak, done = asyncio.Event(), [0], [0], []
+        router = Router()
+
+        @router.message()
+        async def slow(message: Message):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await release.wait()
+            running[0] -= 1
+            done.append(message.message_id)
+
+        dp = Dispatcher()
+        dp.include_router(router)
+        async with FakeTelegram() as telegram:
+            app = webhook.build_webhook_app(telegram.bot(), dp, _config(max_updates=2))
+            async with TestClient(TestServer(app)) as client:
+                posts = [asyncio.create_task(_post(client, make_update(text=str(i)))) for i in range(5)]
+                await asyncio.sleep(0.2)
+                assert running[0] == 2
+                assert sum(task.done() for task in posts) == 2   # остальные ждут свободного места
+                release.set()
+                responses = await asyncio.gather(*posts)
+                await asyncio.sleep(0.05)
+        assert [r.status for r in responses] == [200] * 5
+        assert peak[0] == 2 and len(done) == 5
+
+    async def test_set_webhook_registers_url_secret_and_limits(self, dispatcher):
+        async with FakeTelegram() as telegram:
+            bot = telegram.bot()
+            await webhook.set_webhook(bot, dispatcher, _config())
+            await bot.session.close()
+        ((method, params),) = telegram.calls
+        assert method == "setWebhook"
+        assert params["url"] == "https://bot.example.com/tg"
+        assert params["secret_token"] == SECRET
+        assert params["max_connections"] == "10"
+        assert params["drop_pending_updates"] == "false"
+        assert "callback_query" in params["allowed_updates"]
@@ -0,0 +1,76 @@
+# webhook.py
+"""
+Режим webhook: Telegram сам присылает обновления на встроенный aiohttp-сервер
+(за обратным прокси), вместо long polling. Обновления идут в тот же Dispatcher,
+что и при polling, — роутеры и middleware не меняются.
+
+Включается переменной WEBHOOK_URL (см. config.WebhookConfig).
+"""
+import asyncio
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import WebhookConfig
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик запросов Telegram, у которого в работе не больше max_updates
+    обновлений одновременно. Сверх лимита ответ Telegram задерживается, пока
+    не освободится место, — по занятому соединению Telegram новых не шлет.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_updates: int, **kwargs):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self._slots = asyncio.Semaphore(max_updates)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        await self._slots.acquire()
+        try:
+            return await super()._handle_request_background(bot, request)
+        except BaseException:
+            # Обновление так и не ушло в обработку (битое тело, обрыв соединения)
+            self._slots.release()
+            raise
+
+    async def _background_feed_update(self, bot: Bot, update: dict) -> None:
+        try:
+            await super()._background_feed_update(bot, update)
+        finally:
+            self._slots.release()
+
+
+def build_webhook_app(bot: Bot, dp: Dispatcher, config: WebhookConfig) -> web.Application:
+    app = web.Application(client_max_size=config.max_body_size)
+    handler = BoundedRequestHandler(dp, bot, max_updates=config.max_updates,
+                                    secret_token=config.secret or None)
+    handler.register(app, path=config.path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def set_webhook(bot: Bot, dp: Dispatcher, config: WebhookConfig):
+    # Накопившиеся обновления не сбрасываем: при перезапуске они дождутся нас у Telegram
+    await bot.set_webhook(
+        url=config.url.rstrip("/") + config.path,
+        secret_token=config.secret or None,
+        max_connections=config.max_connections,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=False,
+    )
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, config: WebhookConfig):
+    """Поднимает сервер, регистрирует webhook у Telegram и работает до остановки."""
+    runner = web.AppRunner(build_webhook_app(bot, dp, config))
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, config.host, config.port).start()
+        await set_webhook(bot, dp, config)
+        logging.info(f"🌐 Webhook: {config.host}:{config.port}{config.path} ← {config.url}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()